@@ -0,0 +1,422 @@
+"""Benchmark the communication with the DigOutBox.
+
+This script measures the performance of the `controller` package without any
+hardware attached:
+
+- `query_latency`: round-trip time of a single query, in seconds per query.
+- `sendcmd_throughput`: time to send a batch of commands that do not answer,
+  followed by one query to make sure the device has processed all of them.
+  `ops_per_s` is the number of commands per second.
+- `states_parse`: time to parse the answer of `ALLDOut?` (mode `list`) and of
+  `MASKDOut?` (mode `mask`) into channel states, without any communication.
+- `channel_sweep`: time to turn every channel on, read it back, and turn it off.
+
+All communication benchmarks run for each transport mode (`direct`, `pipelined`,
+`threaded`, `async`, and `binary`, i.e., direct with binary frames) against
+two targets:
+
+- `mock`: a mocked serial device that answers instantly. This measures the
+  overhead of the host side only. The baud rate has no effect and is reported
+  as `null`.
+- `emulator`: the firmware emulator, which delays all bytes as they would be
+  delayed on the wire at the given baud rate.
+
+Results are written as JSON, such that runs of different versions can be
+compared. Run the script from the `controller` folder, e.g.,
+
+`python benchmarks/bench_comm.py --baudrates 9600 115200 --output bench.json`
+
+Pseudo-terminals are required, i.e., the script only runs on Linux and macOS.
+The `async` mode requires `pyserial-asyncio` and the `mock` target requires
+`mock_serial`, both are development dependencies.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Union
+
+from controller.async_comm import serial_asyncio
+from controller.emulator import DigOutBoxEmulator
+
+import controller
+from controller import AsyncDigIOBoxComm, DigIOBoxComm, framing
+
+try:
+    from mock_serial import MockSerial
+except ImportError:  # pragma: no cover
+    MockSerial = None
+
+BAUDRATES = [9600, 57600, 115200]
+MODES = ["direct", "pipelined", "threaded", "async", "binary"]
+TARGETS = ["mock", "emulator"]
+
+NUM_CHANNELS = 16
+
+# number of queries that are pipelined together in the `pipelined` mode
+PIPELINE_BATCH = 8
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    """Return statistics of a list of timings.
+
+    :param timings: Timings in seconds.
+
+    :return: Dictionary with the statistics in seconds.
+    """
+    ordered = sorted(timings)
+    return {
+        "n": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "median": statistics.median(ordered),
+        "min": ordered[0],
+        "max": ordered[-1],
+        "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+def timed(fn: Callable, repeat: int) -> List[float]:
+    """Call a function several times and time every call.
+
+    :param fn: Function without arguments.
+    :param repeat: Number of calls.
+
+    :return: Timings in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def timed_async(fn: Callable, repeat: int) -> List[float]:
+    """Await a coroutine function several times and time every call.
+
+    :param fn: Coroutine function without arguments.
+    :param repeat: Number of calls.
+
+    :return: Timings in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+# TARGETS #
+
+
+@contextlib.contextmanager
+def open_target(target: str, baudrate: Union[int, None]):
+    """Start a target device and return the port to connect to.
+
+    :param target: Name of the target, see `TARGETS`.
+    :param baudrate: Baud rate to emulate, ignored by the mocked device.
+    """
+    if target == "emulator":
+        with DigOutBoxEmulator(num_channels=NUM_CHANNELS, baudrate=baudrate) as emu:
+            yield emu.port
+        return
+
+    if MockSerial is None:
+        raise ImportError("The mock target requires `mock_serial`.")
+
+    mock_dev = MockSerial()
+    stubs = {
+        "*IDN?": "DigIOBox, Hardware v0.1.0, Firmware v0.3.0",
+        "ALLDOut?": ",".join(["0"] * NUM_CHANNELS),
+        "MASKDOut?": "0",
+    }
+    for ch in range(NUM_CHANNELS):
+        stubs[f"DO{ch}?"] = "0"
+        stubs[f"DO{ch} 0"] = None
+        stubs[f"DO{ch} 1"] = None
+    for cmd, answer in stubs.items():
+        mock_dev.stub(
+            receive_bytes=f"{cmd}\n".encode(),
+            send_bytes=b"" if answer is None else f"{answer}\r\n".encode(),
+        )
+
+    # binary mode: the same commands as frames
+    replies = {
+        "*IDN?": framing.encode_frame(framing.OP_IDENTIFY, bytes([0, 1, 0, 0, 3, 0])),
+        "ALLDOut?": framing.encode_frame(
+            framing.OP_GET_ALL_DIG_IO, bytes([0, 0, 0, 0, NUM_CHANNELS])
+        ),
+        "MASKDOut?": framing.encode_frame(framing.OP_GET_MASK_DIG_IO, bytes(4)),
+    }
+    mock_dev.stub(receive_bytes=b"BINary 1\n", send_bytes=b"1\r\n")
+    mock_dev.stub(
+        receive_bytes=framing.encode_frame(framing.OP_EXIT),
+        send_bytes=framing.encode_frame(framing.OP_EXIT),
+    )
+    for cmd in stubs:
+        reply = replies.get(cmd, b"")
+        if cmd.endswith("?") and not reply:
+            reply = framing.encode_frame(framing.OP_GET_DIG_IO, b"\x00")
+        mock_dev.stub(receive_bytes=framing.encode_command(cmd), send_bytes=reply)
+    mock_dev.open()
+    try:
+        yield mock_dev.port
+    finally:
+        mock_dev.close()
+
+
+# BENCHMARKS #
+
+
+def bench_query_latency(dev: DigIOBoxComm, mode: str, repeat: int) -> List[float]:
+    """Time single queries, pipelined queries are timed per batch and averaged."""
+    if mode == "pipelined":
+        batches = timed(
+            lambda: dev.query_many(["DO0?"] * PIPELINE_BATCH),
+            max(repeat // PIPELINE_BATCH, 1),
+        )
+        return [batch / PIPELINE_BATCH for batch in batches]
+    if mode == "threaded":
+        return timed(lambda: dev.submit("DO0?").result(), repeat)
+    return timed(lambda: dev.query("DO0?"), repeat)
+
+
+def bench_sendcmd_throughput(
+    dev: DigIOBoxComm, mode: str, commands: int, repeat: int
+) -> List[float]:
+    """Time batches of commands, each followed by a query to synchronize."""
+    cmds = [f"DO{it % NUM_CHANNELS} {it // NUM_CHANNELS % 2}" for it in range(commands)]
+
+    def send():
+        if mode == "pipelined":
+            with dev.pipeline() as pipe:
+                for cmd in cmds:
+                    pipe.sendcmd(cmd)
+                pipe.query("*IDN?")
+        elif mode == "threaded":
+            for cmd in cmds:
+                dev.submit(cmd, expect_reply=False)
+            dev.submit("*IDN?").result()
+        else:
+            for cmd in cmds:
+                dev.sendcmd(cmd)
+            dev.query("*IDN?")
+
+    return timed(send, repeat)
+
+
+def bench_channel_sweep(dev: DigIOBoxComm, mode: str, repeat: int) -> List[float]:
+    """Time turning every channel on, reading it back, and turning it off."""
+
+    def sweep():
+        if mode == "pipelined":
+            with dev.pipeline() as pipe:
+                for ch in range(NUM_CHANNELS):
+                    pipe.sendcmd(f"DO{ch} 1")
+                    pipe.query(f"DO{ch}?")
+                    pipe.sendcmd(f"DO{ch} 0")
+        elif mode == "threaded":
+            futures = []
+            for ch in range(NUM_CHANNELS):
+                dev.submit(f"DO{ch} 1", expect_reply=False)
+                futures.append(dev.submit(f"DO{ch}?"))
+                dev.submit(f"DO{ch} 0", expect_reply=False)
+            for future in futures:
+                future.result()
+        else:
+            for ch in range(NUM_CHANNELS):
+                channel = dev.channel[ch]
+                channel.state = True
+                _ = channel.state
+                channel.state = False
+
+    return timed(sweep, repeat)
+
+
+def bench_states_parse(repeat: int) -> Dict[str, List[float]]:
+    """Time parsing the states of all channels from canned answers."""
+    dev = DigIOBoxComm(None, dummy=True)
+    dev.num_channels = NUM_CHANNELS
+
+    dev.query = lambda cmd: ",".join(["1", "0"] * (NUM_CHANNELS // 2))
+    list_timings = timed(lambda: dev.states, repeat)
+
+    dev.query = lambda cmd: "A5A5"
+    mask_timings = timed(lambda: dev.state_mask, repeat)
+
+    return {"list": list_timings, "mask": mask_timings}
+
+
+async def bench_async(
+    port: str, baudrate: int, commands: int, repeat: int
+) -> Dict[str, List[float]]:
+    """Run all communication benchmarks with the asyncio interface."""
+    async with await AsyncDigIOBoxComm.open(port, baudrate=baudrate) as dev:
+        dev.num_channels = NUM_CHANNELS
+        cmds = [
+            f"DO{it % NUM_CHANNELS} {it // NUM_CHANNELS % 2}" for it in range(commands)
+        ]
+
+        async def send():
+            for cmd in cmds:
+                await dev.sendcmd(cmd)
+            await dev.query("*IDN?")
+
+        async def sweep():
+            for ch in range(NUM_CHANNELS):
+                channel = dev.channel[ch]
+                await channel.set_state(True)
+                await channel.state
+                await channel.set_state(False)
+
+        return {
+            "query_latency": await timed_async(lambda: dev.query("DO0?"), repeat),
+            "sendcmd_throughput": await timed_async(send, max(repeat // 20, 1)),
+            "channel_sweep": await timed_async(sweep, max(repeat // 20, 1)),
+        }
+
+
+def run_mode(
+    port: str, mode: str, baudrate: int, commands: int, repeat: int
+) -> Dict[str, List[float]]:
+    """Run all communication benchmarks in one transport mode.
+
+    :param port: Port to connect to.
+    :param mode: Transport mode, see `MODES`.
+    :param baudrate: Baud rate to connect with.
+    :param commands: Number of commands per throughput batch.
+    :param repeat: Number of repetitions of the query benchmark. Batches and
+        sweeps are repeated `repeat // 20` times.
+
+    :return: Dictionary with the benchmark names as keys and timings as values.
+    """
+    if mode == "async":
+        return asyncio.run(bench_async(port, baudrate, commands, repeat))
+
+    dev = DigIOBoxComm(
+        port,
+        baudrate=baudrate,
+        threaded=mode == "threaded",
+        binary=mode == "binary",
+    )
+    dev.num_channels = NUM_CHANNELS
+    try:
+        return {
+            "query_latency": bench_query_latency(dev, mode, repeat),
+            "sendcmd_throughput": bench_sendcmd_throughput(
+                dev, mode, commands, max(repeat // 20, 1)
+            ),
+            "channel_sweep": bench_channel_sweep(dev, mode, max(repeat // 20, 1)),
+        }
+    finally:
+        dev.close()
+
+
+def result(
+    benchmark: str,
+    target: Union[str, None],
+    mode: str,
+    baudrate: Union[int, None],
+    timings: List[float],
+    ops: int = None,
+) -> Dict:
+    """Create one entry of the results.
+
+    :param ops: Number of operations per timing, adds the throughput `ops_per_s`.
+    """
+    entry = {
+        "benchmark": benchmark,
+        "target": target,
+        "mode": mode,
+        "baudrate": baudrate,
+        "unit": "s",
+        **summarize(timings),
+    }
+    if ops is not None:
+        entry["ops_per_s"] = ops / entry["median"]
+    return entry
+
+
+def run(
+    targets: List[str],
+    modes: List[str],
+    baudrates: List[int],
+    commands: int,
+    repeat: int,
+) -> Dict:
+    """Run the benchmark suite.
+
+    :return: Dictionary with the metadata of the run and a list of results.
+    """
+    results = []
+    for benchmark, timings in bench_states_parse(repeat).items():
+        results.append(result("states_parse", None, benchmark, None, timings))
+
+    for target in targets:
+        # the mocked device answers instantly, the baud rate does not matter
+        for baudrate in baudrates if target == "emulator" else [None]:
+            with open_target(target, baudrate) as port:
+                for mode in modes:
+                    if mode == "async" and serial_asyncio is None:
+                        print(
+                            "Skipping async mode, install `pyserial-asyncio`.",
+                            file=sys.stderr,
+                        )
+                        continue
+                    print(
+                        f"Running {target} at {baudrate or '-'} baud, {mode} mode.",
+                        file=sys.stderr,
+                    )
+                    bench = run_mode(port, mode, baudrate or 9600, commands, repeat)
+                    for benchmark, timings in bench.items():
+                        ops = commands if benchmark == "sendcmd_throughput" else None
+                        results.append(
+                            result(benchmark, target, mode, baudrate, timings, ops)
+                        )
+
+    return {
+        "controller_version": controller.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "num_channels": NUM_CHANNELS,
+        "results": results,
+    }
+
+
+def main(argv: List[str] = None) -> None:
+    """Parse the command line arguments and run the benchmark suite."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=TARGETS)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--baudrates", nargs="+", type=int, default=BAUDRATES)
+    parser.add_argument(
+        "--commands", type=int, default=64, help="Commands per throughput batch."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=200, help="Repetitions of every query."
+    )
+    parser.add_argument(
+        "--output", default=None, help="File to write the JSON results to."
+    )
+    args = parser.parse_args(argv)
+
+    report = run(args.targets, args.modes, args.baudrates, args.commands, args.repeat)
+
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as fout:
+            json.dump(report, fout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,26 @@
 """Communication package to talk to the DigOutBox via Serial."""
 
+from .async_comm import AsyncDigIOBoxComm
 from .device_comm import DigIOBoxComm
+from .fleet import DigIOBoxFleet
+from .util_fns import (
+    DeviceEvent,
+    DeviceStatus,
+    ProgramProgress,
+    StateMask,
+    StepTiming,
+)
 
-__all__ = ["DigIOBoxComm"]
+__all__ = [
+    "AsyncDigIOBoxComm",
+    "DeviceEvent",
+    "DeviceStatus",
+    "DigIOBoxComm",
+    "DigIOBoxFleet",
+    "ProgramProgress",
+    "StateMask",
+    "StepTiming",
+]
 
 # Package information
 __version__ = "0.2.0"
@@ -0,0 +1,442 @@
+"""Class to communicate with the DigIOBox from asyncio code.
+
+This requires the optional dependency `pyserial-asyncio`.
+"""
+
+import asyncio
+from typing import Dict, List, Tuple, Union
+
+from .device_comm import DigIOBoxComm
+from .util_fns import (
+    DeviceStatus,
+    ProxyList,
+    StateMask,
+    mask_commands,
+    parse_firmware_version,
+    parse_states,
+    parse_status,
+    states_to_mask,
+)
+
+try:
+    import serial_asyncio
+except ImportError:  # pragma: no cover
+    serial_asyncio = None
+
+
+class AsyncDevComm:
+    """Class to communicate with the Arduino using non-blocking serial streams."""
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader = None,
+        writer: asyncio.StreamWriter = None,
+        timeout: float = 3,
+        dummy: bool = False,
+    ) -> None:
+        """Initialize communication with the device over open streams.
+
+        Use the `open` class method to connect to a serial port.
+
+        :param reader: Stream to read answers from.
+        :param writer: Stream to write commands to.
+        :param timeout: Timeout in seconds.
+        :param dummy: Do not communicate over serial but print send and use dummy values
+            for receive.
+        """
+        self.terminator = "\n"
+        self.dummy = dummy
+        self.timeout = timeout
+
+        self._reader = reader
+        self._writer = writer
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        """Enter the async context manager."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Close the connection when leaving the context."""
+        await self.close()
+
+    @classmethod
+    async def open(
+        cls,
+        port: str,
+        baudrate: int = 9600,
+        timeout: float = 3,
+        dummy: bool = False,
+        ready_timeout: float = 5,
+    ):
+        """Open the serial port and return a connected instance.
+
+        :param port: Port to communicate over.
+        :param baudrate: Baud rate to communicate at.
+        :param timeout: Timeout in seconds.
+        :param dummy: Do not communicate over serial but print send and use dummy values
+            for receive.
+        :param ready_timeout: Maximum time in seconds to wait for the device to
+            answer after opening the port. `None` skips the readiness check.
+
+        :return: Connected instance.
+
+        :raises ImportError: `pyserial-asyncio` is not installed.
+        :raises TimeoutError: The device did not answer within `ready_timeout`.
+        """
+        if dummy:
+            return cls(timeout=timeout, dummy=True)
+
+        if serial_asyncio is None:
+            raise ImportError(
+                "The asyncio interface requires `pyserial-asyncio`. "
+                "Install it with `pip install pyserial-asyncio`."
+            )
+
+        reader, writer = await serial_asyncio.open_serial_connection(
+            url=port, baudrate=baudrate
+        )
+        dev = cls(reader, writer, timeout=timeout)
+        if ready_timeout is not None:
+            await dev.wait_until_ready(ready_timeout)
+        return dev
+
+    async def close(self) -> None:
+        """Close the connection to the device."""
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
+
+    async def query(self, cmd: str) -> str:
+        """Query the device by sending a given command and returning the answer.
+
+        Concurrent queries are serialized, such that every answer is matched
+        to the query that caused it.
+
+        :param cmd: Command to start querying.
+
+        :return: Decoded answer.
+
+        :raises asyncio.TimeoutError: The device did not answer in time.
+        """
+        return (await self.query_many([cmd]))[0]
+
+    async def query_many(self, cmds: List[str]) -> List[str]:
+        """Send several queries back-to-back and return all answers.
+
+        :param cmds: Queries to send.
+
+        :return: Decoded answers in the same order as the queries.
+
+        :raises asyncio.TimeoutError: The device did not answer in time. Answers
+            that arrive within another timeout are discarded, such that they are
+            not taken as answers to the next query.
+        """
+        if self.dummy:
+            for cmd in cmds:
+                print(f"Sending: {cmd}")
+            return ["0"] * len(cmds)
+
+        async with self._lock:
+            for cmd in cmds:
+                self._writer.write(f"{cmd}{self.terminator}".encode())
+            await self._writer.drain()
+            replies = []
+            try:
+                for _ in cmds:
+                    replies.append(await self._readline())
+            except asyncio.TimeoutError:
+                await self._discard(len(cmds) - len(replies), self.timeout)
+                raise
+            return replies
+
+    async def sendcmd(self, cmd: str) -> None:
+        """Send a command string to the device.
+
+        :param cmd: Command to send.
+        """
+        await self.sendcmd_many([cmd])
+
+    async def sendcmd_many(self, cmds: List[str]) -> None:
+        """Send several command strings to the device back-to-back.
+
+        :param cmds: Commands to send.
+        """
+        if self.dummy:
+            for cmd in cmds:
+                print(f"Sending: {cmd}")
+            return
+
+        async with self._lock:
+            for cmd in cmds:
+                self._writer.write(f"{cmd}{self.terminator}".encode())
+            await self._writer.drain()
+
+    async def wait_until_ready(self, deadline: float) -> None:
+        """Poll the identity of the device until it answers.
+
+        See `DevComm` for details.
+
+        :param deadline: Maximum time in seconds to wait for an answer.
+
+        :raises TimeoutError: The device did not answer in time.
+        """
+        loop = asyncio.get_running_loop()
+        end = loop.time() + deadline
+        backoff = 0.1
+        attempts = 0
+        async with self._lock:
+            while True:
+                remaining = end - loop.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"Device did not answer within {deadline} s.")
+
+                self._writer.write(f"*IDN?{self.terminator}".encode())
+                await self._writer.drain()
+                attempts += 1
+                try:
+                    line = await asyncio.wait_for(
+                        self._reader.readline(), min(2 * backoff, remaining)
+                    )
+                except asyncio.TimeoutError:
+                    line = b""
+                if line.strip():
+                    break
+                backoff = min(2 * backoff, 0.5)
+
+            # discard late answers to earlier attempts
+            await self._discard(attempts - 1, 2 * backoff)
+
+    async def _discard(self, count: int, timeout: float) -> None:
+        """Read and discard late answers, the caller must hold the lock.
+
+        :param count: Maximum number of answers to discard.
+        :param timeout: Time in seconds to wait for every answer.
+        """
+        for _ in range(count):
+            try:
+                await asyncio.wait_for(self._reader.readline(), timeout)
+            except asyncio.TimeoutError:
+                break
+
+    async def _readline(self) -> str:
+        """Read one line from the device and decode it.
+
+        :return: Decoded line without the terminator.
+        """
+        line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+        return line.decode("utf-8").rstrip()
+
+
+class AsyncDigIOBoxComm(AsyncDevComm):
+    """Communicate with the DigIO Box from asyncio code.
+
+    Properties that read from the box return awaitables, commands are coroutines.
+
+    Example for setting and checking state of channel zero:
+        >>> device = await AsyncDigIOBoxComm.open("/dev/ttyACM0")
+        >>> ch = device.channel[0]
+        >>> await ch.set_state(True)
+        >>> await ch.state
+        True
+    """
+
+    class Channel:
+        """Channel instance."""
+
+        def __init__(self, parent, idx: int) -> None:
+            """Initialize a channel.
+
+            :param parent: Parent class, must be AsyncDigIOBoxComm.
+            :param idx: ID of channel.
+
+            :raises TypeError: If parent is not AsyncDigIOBoxComm.
+            """
+            if not isinstance(parent, AsyncDigIOBoxComm):
+                raise TypeError(
+                    "Channel must be instantiated with class AsyncDigIOBoxComm."
+                )
+
+            self._parent = parent
+            self._idx = idx
+
+        @property
+        def state(self):
+            """Get the state of a channel.
+
+            :return: Awaitable with the state of the channel.
+            """
+            return self._get_state()
+
+        async def set_state(self, value: bool) -> None:
+            """Set the state of a channel.
+
+            :param value: State to set.
+            """
+            await self._parent.sendcmd(f"DO{self._idx} {int(value)}")
+
+        async def _get_state(self) -> bool:
+            """Query the state of the channel."""
+            return bool(int(await self._parent.query(f"DO{self._idx}?")))
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader = None,
+        writer: asyncio.StreamWriter = None,
+        timeout: float = 3,
+        dummy: bool = False,
+    ) -> None:
+        """Initialize the class over open streams.
+
+        Use the `open` class method to connect to a serial port.
+
+        :param reader: Stream to read answers from.
+        :param writer: Stream to write commands to.
+        :param timeout: Timeout in seconds.
+        :param dummy: Do not communicate over serial but print send and use dummy
+            values for receive.
+        """
+        self._num_channels = 16
+        self._firmware_version = None
+
+        super().__init__(reader, writer, timeout=timeout, dummy=dummy)
+
+    # PROPERTIES #
+
+    @property
+    def channel(self):
+        """Return a given channel as an object.
+
+        :return: Channel object.
+        """
+        return ProxyList(self, self.Channel, range(self._num_channels))
+
+    @property
+    def firmware_version(self):
+        """Get the firmware version of the box as a tuple.
+
+        :return: Awaitable with the firmware version, e.g., (0, 3, 0).
+        """
+        return self._get_firmware_version()
+
+    @property
+    def identify(self):
+        """Get firmware version of box.
+
+        :return: Awaitable with the identity string.
+        """
+        return self._get_identify()
+
+    @property
+    def interlock_state(self):
+        """Read if interlock is on.
+
+        :return: Awaitable with the interlock state.
+        """
+        return self._query_bool("INTERLOCKState?")
+
+    @property
+    def num_channels(self) -> int:
+        """Get / Set number of available channels.
+
+        :return: Number of channels
+        """
+        return self._num_channels
+
+    @num_channels.setter
+    def num_channels(self, value: int):
+        self._num_channels = int(value)
+
+    @property
+    def software_lockout(self):
+        """Read if software lockout is on.
+
+        :return: Awaitable with the software lockout state.
+        """
+        return self._query_bool("SWLockout?")
+
+    @property
+    def state_mask(self):
+        """Read the states of all channels as a bitmask.
+
+        :return: Awaitable with a `StateMask`.
+        """
+        return self._get_state_mask()
+
+    @property
+    def states(self):
+        """Read the states of all channels.
+
+        :return: Awaitable with a list of booleans.
+        """
+        return self._get_states()
+
+    # METHODS #
+
+    async def all_off(self) -> None:
+        """Turn all channels off."""
+        await self.sendcmd("ALLOFF")
+
+    async def set_states(self, states: Union[Dict[int, bool], int]) -> None:
+        """Set the states of several channels with one command.
+
+        See `DigIOBoxComm.set_states` for details.
+
+        :param states: Dictionary with channel numbers as keys and states as
+            values, or an integer bitmask with the states of all channels.
+        """
+        values, mask = states_to_mask(states, self._num_channels)
+        if mask == 0:
+            return
+
+        mask_command = await self.firmware_version >= DigIOBoxComm.FW_MASK
+        await self.sendcmd_many(
+            mask_commands(values, mask, self._num_channels, mask_command)
+        )
+
+    async def status(self) -> DeviceStatus:
+        """Read the channel states, the interlock, and the software lockout.
+
+        See `DigIOBoxComm.status` for details.
+
+        :return: Snapshot of the status of the box.
+        """
+        if self.dummy:
+            return DeviceStatus(StateMask(0, self._num_channels), False, False)
+        if await self.firmware_version >= DigIOBoxComm.FW_MASK:
+            replies = [await self.query("STATus?")]
+        else:
+            replies = await self.query_many(
+                ["ALLDOut?", "INTERLOCKState?", "SWLockout?"]
+            )
+        return parse_status(replies, self._num_channels)
+
+    async def _get_firmware_version(self) -> Tuple[int, int, int]:
+        """Read the firmware version once and cache it."""
+        if self._firmware_version is None:
+            if self.dummy:
+                self._firmware_version = DigIOBoxComm.FW_MASK
+            else:
+                self._firmware_version = parse_firmware_version(await self.identify)
+        return self._firmware_version
+
+    async def _get_identify(self) -> str:
+        """Query the identity string."""
+        if self.dummy:
+            return "DigIOBox Dummy"
+        return await self.query("*IDN?")
+
+    async def _get_state_mask(self) -> StateMask:
+        """Query the states of all channels as a bitmask."""
+        if await self.firmware_version >= DigIOBoxComm.FW_MASK:
+            return StateMask.from_hex(await self.query("MASKDOut?"), self._num_channels)
+        return StateMask.from_list((await self.states)[: self._num_channels])
+
+    async def _get_states(self) -> List[bool]:
+        """Query the states of all channels."""
+        return parse_states(await self.query("ALLDOut?"))
+
+    async def _query_bool(self, cmd: str) -> bool:
+        """Query a command that returns 0 or 1."""
+        return bool(int(await self.query(cmd)))
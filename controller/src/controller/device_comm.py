@@ -1,7 +1,26 @@
 """Class to communicate with the DigIOBox."""
 
+import time
+from typing import Dict, List, Tuple, Union
+
+import serial
+
+from . import framing
+from .recorder import TrafficRecorder
 from .serial_comm import DevComm
-from .util_fns import ProxyList
+from .util_fns import (
+    DeviceEvent,
+    DeviceStatus,
+    ProgramProgress,
+    ProxyList,
+    StateMask,
+    StepTiming,
+    mask_commands,
+    parse_firmware_version,
+    parse_states,
+    parse_status,
+    states_to_mask,
+)
 
 
 class DigIOBoxComm(DevComm):
@@ -16,7 +35,13 @@ class DigIOBoxComm(DevComm):
     """
 
     class Channel:
-        """Channel instance."""
+        """Channel instance.
+
+        Channels are created once per channel number, see `channel`. The
+        commands of a channel are built and encoded when it is created.
+        """
+
+        __slots__ = ("_parent", "_idx", "_indices", "_query_cmd", "_set_cmds")
 
         def __init__(self, parent, idx: int) -> None:
             """Initialize a channel.
@@ -31,6 +56,10 @@ class DigIOBoxComm(DevComm):
 
             self._parent = parent
             self._idx = idx
+            self._indices = (idx,)
+            self._query_cmd = f"DO{idx}?"
+            self._set_cmds = (f"DO{idx} 0", f"DO{idx} 1")
+            parent._precompile((self._query_cmd, *self._set_cmds))
 
         @property
         def state(self) -> bool:
@@ -48,14 +77,54 @@ class DigIOBoxComm(DevComm):
                 True
 
             """
-            return bool(int(self._parent.query(f"DO{self._idx}?")))
+            parent = self._parent
+            if parent._cache_timeout is not None:
+                cached = parent._cached_states(self._indices)
+                if cached is not None:
+                    return cached[0]
+
+            state = bool(int(parent.query(self._query_cmd)))
+            if parent._cache_timeout is not None:
+                parent._update_cache({self._idx: state})
+            return state
 
         @state.setter
         def state(self, value: bool) -> None:
-            self._parent.sendcmd(f"DO{self._idx} {int(value)}")
+            parent = self._parent
+            parent.sendcmd(self._set_cmds[bool(value)])
+            if parent._cache_timeout is not None:
+                parent._update_cache({self._idx: bool(value)})
+
+    # Firmware version that introduced a given command
+    FW_MASK = (0, 3, 0)
+    FW_BAUDRATE = (0, 3, 0)
+    FW_BINARY = (0, 3, 0)
+    FW_EVENTS = (0, 3, 0)
+    FW_PROGRAM = (0, 3, 0)
+    FW_ATOMIC = (0, 3, 0)
+
+    # maximum number of steps of a pulse program, see `ProgramMaxLength`
+    PROGRAM_MAX_LENGTH = 32
+    # longest delay of a program step in ms, see `ProgramMaxDelay`
+    PROGRAM_MAX_DELAY = 2_147_483
+
+    # time in seconds after which the firmware reverts an unconfirmed baud rate
+    BAUD_REVERT_TIME = 1.0
+    # time in seconds before a sequence step that is busy-waited instead of slept
+    SEQUENCE_SPIN_TIME = 0.002
 
     def __init__(
-        self, port: str, baudrate: int = 9600, timeout: int = 3, dummy: bool = False
+        self,
+        port: str,
+        baudrate: int = 9600,
+        timeout: int = 3,
+        dummy: bool = False,
+        threaded: bool = False,
+        cache_timeout: float = None,
+        ready_timeout: float = 5,
+        max_baudrate: int = None,
+        binary: bool = False,
+        recorder: TrafficRecorder = None,
     ):
         """Initialize the class.
 
@@ -64,14 +133,77 @@ class DigIOBoxComm(DevComm):
         :param timeout: Timeout in seconds.
         :param dummy: Do not communicate over serial but print send and use dummy
             values for receive.
+        :param threaded: Start a background I/O worker that owns the serial port.
+        :param cache_timeout: Time in seconds for which channel states are served
+            from the state cache. `None` disables the cache. See `cache_timeout`.
+        :param ready_timeout: Maximum time in seconds to wait for the box to answer
+            after connecting. `None` skips the readiness check.
+        :param max_baudrate: If given, switch to the fastest baud rate up to this
+            one that the box supports after connecting. See `negotiate_baudrate`.
+        :param binary: Switch to the binary protocol after connecting if the box
+            supports it. See `enable_binary_mode`.
+        :param recorder: Record all traffic with the box, see `controller.recorder`.
+
+        :raises TimeoutError: The box did not answer within `ready_timeout`.
         """
         self.dummy = dummy
+        self._default_baudrate = baudrate
         self._num_channels = 16
+        self._channels = None
+        self._firmware_version = None
+        self._switching_skew = None
 
-        super().__init__(port, baudrate=baudrate, timeout=timeout, dummy=dummy)
+        self.cache_timeout = cache_timeout
+        self.invalidate_cache()
+
+        super().__init__(
+            port,
+            baudrate=baudrate,
+            timeout=timeout,
+            dummy=dummy,
+            threaded=threaded,
+            ready_timeout=ready_timeout,
+            recorder=recorder,
+        )
+
+        if max_baudrate is not None and not dummy:
+            self.negotiate_baudrate(max_baudrate)
+        if binary:
+            self.enable_binary_mode()
 
     # PROPERTIES #
 
+    @property
+    def baudrate(self) -> int:
+        """Get the baud rate that is currently used to talk to the box.
+
+        :return: Baud rate.
+        """
+        if self.dummy:
+            return self._default_baudrate
+        return self.dev.baudrate
+
+    @property
+    def cache_timeout(self) -> Union[float, None]:
+        """Get / Set the time in seconds for which cached states are valid.
+
+        If set, the state of every channel that is written or read is cached.
+        Reading a channel state within `cache_timeout` seconds after the last
+        write or read is served from the cache without talking to the box. A read
+        of `states` refreshes the cache of all channels at once.
+
+        Note that the cache cannot know about state changes by the remote, the
+        interlock, or the software lockout. Choose the time accordingly.
+        `None` disables the cache.
+
+        :return: Cache timeout in seconds or `None`.
+        """
+        return self._cache_timeout
+
+    @cache_timeout.setter
+    def cache_timeout(self, value: Union[float, None]):
+        self._cache_timeout = None if value is None else float(value)
+
     @property
     def channel(self):
         """Return a given channel as an object.
@@ -84,7 +216,25 @@ class DigIOBoxComm(DevComm):
             >>> ch = device.channel[0]
 
         """
-        return ProxyList(self, self.Channel, range(self._num_channels))
+        if self._channels is None:
+            self._channels = ProxyList(self, self.Channel, range(self._num_channels))
+        return self._channels
+
+    @property
+    def firmware_version(self) -> Tuple[int, int, int]:
+        """Get the firmware version of the box as a tuple.
+
+        The version is read from the identity string once and then cached.
+        In dummy mode, the latest firmware is assumed.
+
+        :return: Firmware version, e.g., (0, 3, 0). (0, 0, 0) if unknown.
+        """
+        if self._firmware_version is None:
+            if self.dummy:
+                self._firmware_version = self.FW_MASK
+            else:
+                self._firmware_version = parse_firmware_version(self.identify)
+        return self._firmware_version
 
     @property
     def identify(self):
@@ -109,20 +259,658 @@ class DigIOBoxComm(DevComm):
     @num_channels.setter
     def num_channels(self, value: int):
         self._num_channels = int(value)
+        self._channels = None
+        self.invalidate_cache()
 
     @property
     def software_lockout(self) -> bool:
         """Read if software lockout is on."""
         return bool(int(self.query("SWLockout?")))
 
+    @property
+    def state_mask(self) -> StateMask:
+        """Read the states of all channels and return them as a bitmask.
+
+        With firmware `v0.3.0` or later, the box answers with a single
+        hexadecimal number, otherwise the list of all states is converted.
+
+        :return: Immutable bitmask of the channel states, bit n is channel n.
+
+        Example:
+        -------
+            >>> device = DigIOBoxComm("/dev/ttyACM0")
+            >>> mask = device.state_mask
+            >>> mask[3], mask.popcount()
+            (True, 1)
+
+        """
+        cached = self._cached_states(range(self._num_channels))
+        if cached is not None:
+            return StateMask.from_list(cached)
+
+        if self.firmware_version >= self.FW_MASK:
+            mask = StateMask.from_hex(self.query("MASKDOut?"), self._num_channels)
+            self._update_cache(dict(enumerate(mask)))
+            return mask
+
+        return StateMask.from_list(self.states[: self._num_channels])
+
     @property
     def states(self):
         """Read the states of all channels and return as a boolean array."""
-        retval = self.query("ALLDOut?")
-        return [bool(int(x)) for x in retval.split(",")]
+        cached = self._cached_states(range(self._num_channels))
+        if cached is not None:
+            return cached
+
+        states = parse_states(self.query("ALLDOut?"))
+        self._update_cache(dict(enumerate(states[: self._num_channels])))
+        return states
+
+    @property
+    def switching_skew(self) -> float:
+        """Get the maximum time between the first and the last switching output.
+
+        This is the bound for channels that are set together with
+        `apply_mask_atomic`. It depends on how the outputs are wired to the
+        ports of the microcontroller and is read from the box once.
+        Requires firmware `v0.3.0` or later.
+
+        :return: Skew in seconds.
+
+        :raises OSError: The firmware cannot switch channels simultaneously.
+        """
+        if self._switching_skew is None:
+            self._require_atomic()
+            self._switching_skew = int(self.query("MASKDOut:SKEW?")) * 1e-9
+        return self._switching_skew
 
     # METHODS #
 
     def all_off(self):
         """Turn all channels off."""
         self.sendcmd("ALLOFF")
+        self._update_cache(dict.fromkeys(range(self._num_channels), False))
+
+    def abort_program(self) -> None:
+        """Stop the pulse program, the channels keep their current states."""
+        self.sendcmd("PROGram:ABORt")
+        self.invalidate_cache()
+
+    def apply_mask_atomic(self, states: Union[Dict[int, bool], int]) -> None:
+        """Switch several channels simultaneously.
+
+        The box writes all outputs with back-to-back port register writes, such
+        that all channels switch within `switching_skew` of each other, taking
+        inverted outputs into account. Unlike `set_states`, this never falls
+        back to one command per channel. Requires firmware `v0.3.0` or later.
+
+        :param states: Dictionary with channel numbers as keys and states as
+            values, or an integer bitmask or `StateMask` with the states of all
+            channels (bit n is channel n).
+
+        :raises IndexError: A channel is out of range.
+        :raises ValueError: A bitmask has bits set above the last channel.
+        :raises OSError: The firmware cannot switch channels simultaneously.
+
+        Example:
+        -------
+            >>> device = DigIOBoxComm("/dev/ttyACM0")
+            >>> device.apply_mask_atomic({0: True, 5: True})
+            >>> device.switching_skew
+            3e-06
+
+        """
+        self._require_atomic()
+        values, mask = states_to_mask(states, self._num_channels)
+        if mask == 0:
+            return
+        self.sendcmd(self._mask_commands(values, mask)[0])
+        self._update_cache(self._mask_states(values, mask))
+
+    def close(self) -> None:
+        """Switch back to text mode and default baud rate and close the connection."""
+        if not self.dummy and self.dev.is_open:
+            if self.events_enabled:
+                self.disable_events()
+            if self.binary_mode:
+                self._call(self._exit_binary)
+            if self._baudrate_negotiated():
+                self._call(self._switch_baudrate, self._default_baudrate)
+        super().close()
+
+    def disable_events(self) -> None:
+        """Stop the box from sending unsolicited events."""
+        if self.events_enabled:
+            self.sendcmd("EVENTs 0")
+            self.events_enabled = False
+
+    def disable_binary_mode(self) -> None:
+        """Switch back from the binary protocol to SCPI text commands."""
+        if self.binary_mode:
+            self._call(self._exit_binary)
+
+    def enable_binary_mode(self) -> bool:
+        """Switch to the binary protocol if the box supports it.
+
+        In binary mode, commands and replies are short frames with one byte
+        opcodes, fixed-size payloads, and a checksum, see `controller.framing`.
+        This saves bytes on the wire and parsing time on the box. All methods
+        and properties work as before: SCPI commands are translated into
+        frames and replies back into text. Commands without binary equivalent,
+        e.g., the baud rate commands, raise a `ValueError` in binary mode.
+
+        A corrupted reply is detected by its checksum and the query is repeated
+        once. If the box does not answer, e.g., because it was reset, the
+        connection falls back to text mode at the default baud rate.
+        Requires firmware `v0.3.0` or later.
+
+        :return: Whether the binary mode is active.
+        """
+        if self.dummy or self.firmware_version < self.FW_BINARY:
+            return False
+        if not self.binary_mode:
+            self._call(self._enter_binary)
+        return self.binary_mode
+
+    def enable_events(self) -> bool:
+        """Let the box report status changes that were not caused by a command.
+
+        The box then sends an event whenever the remote switches channels or
+        toggles the software lockout and whenever the interlock is triggered or
+        released. Every event is passed as a `DeviceEvent` to the callbacks that
+        are registered with `add_event_callback` and refreshes the state cache.
+        Requires firmware `v0.3.0` or later.
+
+        :return: Whether the box sends events.
+
+        Example:
+        -------
+            >>> device = DigIOBoxComm("/dev/ttyACM0", threaded=True)
+            >>> device.add_event_callback(print)
+            >>> device.enable_events()
+            True
+            >>> # press "all off" on the remote
+            DeviceEvent(source='RF', status=DeviceStatus(...))
+
+        """
+        if self.dummy or self.firmware_version < self.FW_EVENTS:
+            return False
+        if not self.events_enabled:
+            self.sendcmd("EVENTs 1")
+            self.events_enabled = True
+        return self.events_enabled
+
+    def negotiate_baudrate(self, max_baudrate: int) -> int:
+        """Switch to the fastest baud rate that the box and the link support.
+
+        The box is asked for its supported baud rates. Starting with the fastest
+        one up to `max_baudrate`, both sides switch and check that the box
+        answers at the new rate. If it does not, both sides fall back to the
+        default rate and the next slower rate is tried. Requires firmware
+        `v0.3.0` or later, older firmware stays at the current rate.
+
+        If the box stops answering at a negotiated rate later on, e.g., because
+        it was reset, the connection falls back to the baud rate it was opened
+        with. Closing the connection switches the box back as well.
+
+        :param max_baudrate: Fastest baud rate to use.
+
+        :return: Baud rate that is used from now on.
+
+        Example:
+        -------
+            >>> device = DigIOBoxComm("/dev/ttyACM0")
+            >>> device.negotiate_baudrate(115200)
+            115200
+
+        """
+        if self.dummy or self.firmware_version < self.FW_BAUDRATE:
+            return self.baudrate
+        return self._call(self._negotiate_baudrate, max_baudrate)
+
+    def status(self) -> DeviceStatus:
+        """Read the channel states, the interlock, and the software lockout.
+
+        With firmware `v0.3.0` or later, this is a single query. Older firmware
+        receives the three individual queries in one pipeline.
+
+        :return: Snapshot of the status of the box.
+
+        Example:
+        -------
+            >>> device = DigIOBoxComm("/dev/ttyACM0")
+            >>> status = device.status()
+            >>> status.states.on_channels(), status.interlock, status.locked
+            ([0, 2], False, False)
+
+        """
+        if self.dummy:
+            return DeviceStatus(StateMask(0, self._num_channels), False, False)
+        if self.firmware_version >= self.FW_MASK:
+            replies = [self.query("STATus?")]
+        else:
+            replies = self.query_many(["ALLDOut?", "INTERLOCKState?", "SWLockout?"])
+
+        status = parse_status(replies, self._num_channels)
+        self._update_cache(dict(enumerate(status.states)))
+        return status
+
+    def invalidate_cache(self) -> None:
+        """Mark all cached channel states as outdated."""
+        self._cache = [(False, None)] * self._num_channels
+
+    def set_states(self, states: Union[Dict[int, bool], int]) -> None:
+        """Set the states of several channels with one command.
+
+        Firmware that does not know the mask command receives a pipelined
+        sequence of individual channel commands instead.
+
+        :param states: Dictionary with channel numbers as keys and states as
+            values, or an integer bitmask or `StateMask` with the states of all
+            channels (bit n is channel n).
+
+        :raises IndexError: A channel is out of range.
+        :raises ValueError: A bitmask has bits set above the last channel.
+
+        Example:
+        -------
+            >>> device = DigIOBoxComm("/dev/ttyACM0")
+            >>> device.set_states({0: True, 3: True, 4: False})
+            >>> device.set_states(0b101)  # channels 0 and 2 on, all others off
+
+        """
+        values, mask = states_to_mask(states, self._num_channels)
+        if mask == 0:
+            return
+
+        cmds = self._mask_commands(values, mask)
+        if len(cmds) == 1:
+            self.sendcmd(cmds[0])
+        else:
+            with self.pipeline() as pipe:
+                for cmd in cmds:
+                    pipe.sendcmd(cmd)
+
+        self._update_cache(self._mask_states(values, mask))
+
+    def run_sequence(
+        self, steps: List[Tuple[float, Union[Dict[int, bool], int]]]
+    ) -> List[StepTiming]:
+        """Set channel states at given times after the start of the sequence.
+
+        All commands are encoded before the sequence starts. Every step is sent
+        at its offset from the start on a monotonic clock, such that delays of
+        one step do not accumulate over the following steps. The sequence owns
+        the serial port until it is finished, other commands wait.
+
+        :param steps: List of tuples with the time offset in seconds from the
+            start and the states to set, as for `set_states`. Offsets must not
+            decrease.
+
+        :return: Planned and actual time of every step.
+
+        :raises ValueError: The offsets decrease, or a bitmask has bits set above
+            the last channel.
+        :raises IndexError: A channel is out of range.
+
+        Example:
+        -------
+            >>> device = DigIOBoxComm("/dev/ttyACM0")
+            >>> steps = [(0, {0: True}), (0.5, {0: False, 1: True}), (1.0, 0)]
+            >>> timings = device.run_sequence(steps)
+            >>> [round(timing.error, 4) for timing in timings]
+            [0.0, 0.0001, 0.0]
+
+        """
+        offsets = [float(offset) for offset, _ in steps]
+        if any(offsets[it + 1] < offsets[it] for it in range(len(offsets) - 1)):
+            raise ValueError("The time offsets of the steps must not decrease.")
+
+        plan = []
+        for offset, states in steps:
+            values, mask = states_to_mask(states, self._num_channels)
+            cmds = self._mask_commands(values, mask) if mask else []
+            plan.append((float(offset), cmds, self._mask_states(values, mask)))
+        return self._call(self._run_sequence, plan)
+
+    def program_progress(self) -> ProgramProgress:
+        """Read the progress of the pulse program on the box.
+
+        :return: Progress of the program.
+
+        Example:
+        -------
+            >>> device = DigIOBoxComm("/dev/ttyACM0")
+            >>> device.upload_program([(0, 0b1), (100, 0b0)], repeat=10)
+            >>> device.start_program()
+            >>> device.program_progress()
+            ProgramProgress(running=True, step=1, cycle=3, length=2, repeat=10)
+
+        """
+        if self.dummy:
+            return ProgramProgress(False, 0, 0, 0, 0)
+        running, step, cycle, length, repeat = self.query("PROGram?").split(",")
+        return ProgramProgress(
+            bool(int(running)), int(step), int(cycle), int(length), int(repeat)
+        )
+
+    def start_program(self) -> None:
+        """Start the uploaded pulse program from its first step.
+
+        The box does not start the program if it is empty, the interlock is
+        triggered, or the software lockout is active. Check with
+        `program_progress` if required. The state cache is invalidated, as the
+        program switches the channels without the host.
+        """
+        self.sendcmd("PROGram:RUN")
+        self.invalidate_cache()
+
+    def upload_program(
+        self, steps: List[Tuple[int, Union[Dict[int, bool], int]]], repeat: int = 1
+    ) -> None:
+        """Upload a pulse program that the box runs on its own.
+
+        The box executes the steps from its main loop with a resolution better
+        than a millisecond, independent of the host and the serial link. Every
+        step is scheduled relative to the planned time of the previous step,
+        such that delays do not accumulate. The interlock, the software lockout,
+        and turning all channels off abort the program. With events enabled, the
+        box sends a `PROGRAM` event when the program finished.
+        Requires firmware `v0.3.0` or later.
+
+        :param steps: List of tuples with the delay in milliseconds after the
+            previous step (the first step: after the start) and the states to
+            set, as for `set_states`. A delay can be at most 2147483 ms (about
+            35.8 min), the longest time the box can schedule.
+        :param repeat: Number of runs, 0 runs the program until it is aborted.
+
+        :raises ValueError: Too many steps, a delay or `repeat` out of range, or a
+            bitmask has bits set above the last channel.
+        :raises IndexError: A channel is out of range.
+        :raises OSError: The box does not support or did not accept the program.
+
+        Example:
+        -------
+            >>> device = DigIOBoxComm("/dev/ttyACM0")
+            >>> steps = [(0, {0: True}), (5, {0: False}), (95, {})]
+            >>> device.upload_program(steps, repeat=100)  # 5 ms pulse at 10 Hz
+            >>> device.start_program()
+
+        """
+        if len(steps) > self.PROGRAM_MAX_LENGTH:
+            raise ValueError(
+                f"A program can have at most {self.PROGRAM_MAX_LENGTH} steps."
+            )
+        if not 0 <= repeat <= 0xFFFF:
+            raise ValueError("The number of runs must be between 0 and 65535.")
+        cmds = []
+        for delay, states in steps:
+            if not 0 <= int(delay) <= self.PROGRAM_MAX_DELAY:
+                raise ValueError(
+                    f"The delay {delay} ms is out of range, the maximum is "
+                    f"{self.PROGRAM_MAX_DELAY} ms."
+                )
+            values, mask = states_to_mask(states, self._num_channels)
+            cmds.append(f"PROGram:ADD {int(delay)},{values:X},{mask:X}")
+        if self.firmware_version < self.FW_PROGRAM:
+            raise OSError("Pulse programs require firmware v0.3.0 or later.")
+
+        with self.pipeline() as pipe:
+            pipe.sendcmd("PROGram:CLEar")
+            for cmd in cmds:
+                pipe.sendcmd(cmd)
+            pipe.sendcmd(f"PROGram:REPeat {repeat}")
+            idx = pipe.query("PROGram?")
+
+        if self.dummy:
+            return
+        _, _, _, length, uploaded_repeat = pipe.results[idx].split(",")
+        if int(length) != len(steps) or int(uploaded_repeat) != repeat:
+            raise OSError("The box did not accept the program.")
+
+    def _baudrate_negotiated(self) -> bool:
+        """Return if the connection runs at another than the default baud rate."""
+        return self.dev.baudrate != self._default_baudrate
+
+    def _enter_binary(self) -> None:
+        """Switch the box and the port to binary mode, the caller must own the port."""
+        if self._query("BINary 1") == "1":
+            self.binary_mode = True
+
+    def _exit_binary(self) -> None:
+        """Switch the box and the port to text mode, the caller must own the port."""
+        self._send(framing.encode_frame(framing.OP_EXIT))
+        try:
+            self._read_reply()
+        except framing.FrameError:
+            self.dev.reset_input_buffer()
+        finally:
+            self.binary_mode = False
+
+    def _fall_back(self) -> None:
+        """Fall back to text mode at the default baud rate and wait for the box.
+
+        The caller must own the port.
+        """
+        self.binary_mode = False
+        self.dev.baudrate = self._default_baudrate
+        self._wait_until_ready(2 * self.BAUD_REVERT_TIME)
+        if self.events_enabled:
+            # a reset box does not send events anymore
+            self._write("EVENTs 1")
+
+    def _mask_commands(self, values: int, mask: int) -> List[str]:
+        """Return the commands that set the channels in the mask.
+
+        :param values: Bitmask with the states.
+        :param mask: Bitmask with the channels to set, not empty.
+
+        :return: One mask command, or one command per channel for firmware that
+            does not know the mask command.
+        """
+        return mask_commands(
+            values, mask, self._num_channels, self.firmware_version >= self.FW_MASK
+        )
+
+    def _mask_states(self, values: int, mask: int) -> Dict[int, bool]:
+        """Return the states of the channels in the mask.
+
+        :param values: Bitmask with the states.
+        :param mask: Bitmask with the channels.
+
+        :return: Dictionary with channel numbers as keys and states as values.
+        """
+        return {
+            ch: bool(values >> ch & 1)
+            for ch in range(self._num_channels)
+            if mask >> ch & 1
+        }
+
+    def _negotiate_baudrate(self, max_baudrate: int) -> int:
+        """Negotiate the baud rate, the caller must own the port.
+
+        The baud rate commands are text only, binary mode is left for the
+        negotiation and entered again afterwards.
+
+        :param max_baudrate: Fastest baud rate to use.
+
+        :return: Baud rate that is used from now on.
+        """
+        binary = self.binary_mode
+        if binary:
+            self._exit_binary()
+        try:
+            return self._negotiate_fastest_baudrate(max_baudrate)
+        finally:
+            if binary:
+                self._enter_binary()
+
+    def _negotiate_fastest_baudrate(self, max_baudrate: int) -> int:
+        """Try all faster baud rates of the box, the caller must own the port.
+
+        :param max_baudrate: Fastest baud rate to use.
+
+        :return: Baud rate that is used from now on.
+        """
+        current = self.dev.baudrate
+        rates = sorted(
+            (int(rate) for rate in self._query("BAUDrate:LIST?").split(",")),
+            reverse=True,
+        )
+        for rate in rates:
+            if rate <= current:
+                break
+            if rate <= max_baudrate and self._switch_baudrate(rate):
+                return rate
+        return current
+
+    def _parse_event(self, event: str) -> Union[DeviceEvent, None]:
+        """Parse an event of the box and update the state cache.
+
+        :param event: Event without prefix, e.g., `RF 5,0,0`.
+
+        :return: Parsed event, `None` if the event is malformed.
+        """
+        source, _, status = event.partition(" ")
+        try:
+            status = parse_status([status], self._num_channels)
+        except ValueError:
+            return None
+
+        self._update_cache(dict(enumerate(status.states)))
+        return DeviceEvent(source, status)
+
+    def _query(self, cmd: str) -> str:
+        """Send a query and read the answer, the caller must own the port.
+
+        If the box does not answer at a negotiated baud rate or in binary mode,
+        the link is assumed to be broken. The connection then falls back to text
+        mode at the default baud rate and the query is repeated once. Corrupted
+        binary replies are repeated once before falling back.
+
+        :param cmd: Command to start querying.
+
+        :return: Decoded answer.
+        """
+        if self.dummy or not (self.binary_mode or self._baudrate_negotiated()):
+            return super()._query(cmd)
+
+        for _ in range(2):
+            try:
+                answer = super()._query(cmd)
+            except framing.FrameError:
+                self.dev.reset_input_buffer()
+                continue
+            except UnicodeDecodeError:
+                answer = ""
+            if answer:
+                return answer
+            break
+
+        self._fall_back()
+        return super()._query(cmd)
+
+    def _require_atomic(self) -> None:
+        """Raise an error if the box cannot switch channels simultaneously.
+
+        :raises OSError: The firmware is older than `FW_ATOMIC`.
+        """
+        if self.firmware_version < self.FW_ATOMIC:
+            raise OSError(
+                "Switching channels simultaneously requires firmware v0.3.0 or later."
+            )
+
+    def _run_sequence(self, plan) -> List[StepTiming]:
+        """Execute a sequence, the caller must own the port.
+
+        :param plan: List of tuples with offset, commands, and resulting states.
+
+        :return: Planned and actual time of every step.
+        """
+        encoded = [
+            (offset, cmds, b"".join(self._encode(cmd) for cmd in cmds), states)
+            for offset, cmds, states in plan
+        ]
+
+        timings = []
+        start = time.monotonic()
+        for offset, cmds, data, states in encoded:
+            target = start + offset
+            remaining = target - time.monotonic()
+            if remaining > self.SEQUENCE_SPIN_TIME:
+                time.sleep(remaining - self.SEQUENCE_SPIN_TIME)
+            while time.monotonic() < target:
+                pass
+
+            timings.append(StepTiming(offset, time.monotonic() - start))
+            if self.dummy:
+                for cmd in cmds:
+                    self._write(cmd)
+            elif cmds:
+                self._timed(cmds[0], self._send, data)
+            self._update_cache(states)
+        return timings
+
+    def _switch_baudrate(self, rate: int) -> bool:
+        """Switch the box and the port to a new baud rate and confirm it.
+
+        The caller must own the port.
+
+        :param rate: Baud rate to switch to.
+
+        :return: Whether the box answered at the new rate. If not, the port is
+            switched back to the default rate.
+        """
+        if super()._query(f"BAUDrate {rate}") != str(rate):
+            return False
+
+        timeout = self.dev.timeout
+        try:
+            self.dev.baudrate = rate
+            self.dev.timeout = min(timeout, self.BAUD_REVERT_TIME)
+            self.dev.reset_input_buffer()
+            confirmed = super()._query("BAUDrate?") == str(rate)
+        except (UnicodeDecodeError, ValueError, serial.SerialException):
+            # garbled answer or rate not supported by the port
+            confirmed = False
+        finally:
+            self.dev.timeout = timeout
+
+        if not confirmed:
+            # the box reverts to its default rate after garbled input or after
+            # the revert time
+            self.dev.baudrate = self._default_baudrate
+            time.sleep(self.BAUD_REVERT_TIME)
+            self.dev.reset_input_buffer()
+        return confirmed
+
+    def _cached_states(self, channels) -> Union[List[bool], None]:
+        """Return the cached states of the given channels if all are valid.
+
+        :param channels: Channel numbers to look up.
+
+        :return: List of cached states or `None` if any of them is outdated.
+        """
+        if self._cache_timeout is None:
+            return None
+
+        oldest = time.monotonic() - self._cache_timeout
+        states = []
+        for ch in channels:
+            state, timestamp = self._cache[ch]
+            if timestamp is None or timestamp < oldest:
+                return None
+            states.append(state)
+        return states
+
+    def _update_cache(self, states: Dict[int, bool]) -> None:
+        """Write channel states to the cache.
+
+        :param states: Dictionary with channel numbers as keys and states as values.
+        """
+        if self._cache_timeout is None:
+            return
+
+        now = time.monotonic()
+        for ch, state in states.items():
+            self._cache[ch] = (state, now)
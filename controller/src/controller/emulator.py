@@ -0,0 +1,741 @@
+"""Emulator of the DigOutBox firmware on a pseudo-terminal.
+
+The emulator answers the SCPI commands of the firmware on a Linux / macOS
+pseudo-terminal, such that the regular `DigIOBoxComm` can talk to it via its
+`port` without any hardware attached.
+
+Example:
+-------
+    >>> from controller import DigIOBoxComm
+    >>> from controller.emulator import DigOutBoxEmulator
+    >>> with DigOutBoxEmulator() as emulator:
+    ...     device = DigIOBoxComm(emulator.port)
+    ...     device.channel[3].state = True
+    ...     emulator.states[3]
+    True
+
+"""
+
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable, List, Tuple, Union
+
+from . import framing
+from .util_fns import scpi_pattern
+
+# Firmware version that is emulated by default
+FW_LATEST = (0, 3, 0)
+
+# Baud rates that the firmware supports, see `BaudRates` in the firmware
+BAUDRATES = [9600, 19200, 38400, 57600, 115200, 250000]
+
+# Sources of events, see `EventRF` etc. in the firmware
+EVENT_RF = 1
+EVENT_INTERLOCK = 2
+EVENT_LOCKOUT = 3
+EVENT_PROGRAM = 4
+
+# Maximum number of entries of a pulse program, see `ProgramMaxLength`
+PROGRAM_MAX_LENGTH = 32
+# Longest delay of a pulse program entry in ms, see `ProgramMaxDelay`
+PROGRAM_MAX_DELAY = 2_147_483
+
+
+class DigOutBoxEmulator:
+    """Protocol-accurate emulator of the DigOutBox firmware on a pseudo-terminal.
+
+    The emulator models the state of all channels, the inverted outputs, the
+    interlock, and the software lockout. Answers are delayed by the time the
+    bytes would need on the wire at the emulated baud rate.
+
+    :param num_channels: Number of channels.
+    :param invert: Output inversion of every channel, see `DOutInvert` in the
+        firmware configuration. Defaults to all channels inverted.
+    :param firmware: Firmware version to emulate. Commands that were introduced
+        later are ignored, as the firmware would do.
+    :param baudrate: Baud rate the firmware starts at, which is also used to
+        emulate the byte timing. `None` starts at 9600 baud and answers without
+        delay.
+    :param boot_time: Time in seconds after starting, during which all input is
+        ignored, as on an Arduino that was reset by opening the port.
+    :param enable_interlock: Whether the interlock is enabled.
+    :param max_link_baudrate: Highest baud rate the emulated cable can carry.
+        All bytes at higher rates are garbled. `None` for no limit.
+
+    Bytes that the host sends at a baud rate that differs from the one of the
+    firmware are garbled as well, as on a real serial link.
+    """
+
+    # bits per byte on the wire: start bit, 8 data bits, stop bit
+    BITS_PER_BYTE = 10
+    # time in seconds to confirm a new baud rate, see `BaudRateRevertTime`
+    BAUD_REVERT_TIME = 1.0
+
+    def __init__(
+        self,
+        num_channels: int = 16,
+        invert: List[int] = None,
+        firmware: Tuple[int, int, int] = FW_LATEST,
+        baudrate: Union[int, None] = 9600,
+        boot_time: float = 0,
+        enable_interlock: bool = False,
+        max_link_baudrate: Union[int, None] = None,
+    ) -> None:
+        """Initialize the emulator and start answering on the pseudo-terminal."""
+        import pty
+        import termios
+        import tty
+
+        self.num_channels = num_channels
+        self.invert = list(invert) if invert is not None else [1] * num_channels
+        self.firmware = tuple(firmware)
+        self.baudrate = 9600 if baudrate is None else baudrate
+        self.default_baudrate = self.baudrate
+        self.max_link_baudrate = max_link_baudrate
+        self.enable_interlock = enable_interlock
+        self._emulate_timing = baudrate is not None
+        self._pending_baudrate = None
+        self._baudrate_deadline = None
+
+        self.hw_version = "v0.1.0"
+        # all channels of a mask command switch at once, see `MASKDOut:SKEW?`
+        self.switching_skew = 0
+        self.terminator = "\n"
+
+        # device state
+        self.states = [False] * num_channels
+        self.interlocked = enable_interlock
+        self.software_lockout = False
+        self.binary_mode = False
+        self.events_enabled = False
+        self._pending_event = 0
+
+        # pulse program: entries of delay in ms, values, and mask
+        self.program = []
+        self.program_repeat = 1
+        self.program_running = False
+        self.program_step = 0
+        self.program_cycle = 0
+        self._program_due = None
+
+        # all received commands, e.g., for tests and benchmarks, binary frames
+        # are stored as bytes
+        self.received = []
+
+        self._commands = []
+        self._register_commands()
+        self._frame_handlers = {
+            framing.OP_IDENTIFY: self._frame_identify,
+            framing.OP_GET_DIG_IO: self._frame_get_dig_io,
+            framing.OP_SET_DIG_IO: self._frame_set_dig_io,
+            framing.OP_GET_ALL_DIG_IO: lambda _: struct.pack(
+                "<IB", self._get_mask(), self.num_channels
+            ),
+            framing.OP_GET_MASK_DIG_IO: lambda _: struct.pack("<I", self._get_mask()),
+            framing.OP_SET_MASK_DIG_IO: self._frame_set_mask_dig_io,
+            framing.OP_SWITCHING_SKEW: lambda _: struct.pack("<I", self.switching_skew),
+            framing.OP_ALL_OFF: lambda _: self._all_off(),
+            framing.OP_INTERLOCK_STATE: lambda _: bytes([self.interlocked]),
+            framing.OP_SW_LOCKOUT: lambda _: bytes([self.software_lockout]),
+            framing.OP_STATUS: lambda _: struct.pack(
+                "<IBB", self._get_mask(), self.interlocked, self.software_lockout
+            ),
+            framing.OP_EVENTS: self._frame_events,
+            framing.OP_EXIT: self._frame_exit,
+            framing.OP_PROGRAM_CLEAR: lambda _: self._clear_program(),
+            framing.OP_PROGRAM_ADD: lambda payload: self._add_program_entry(
+                *struct.unpack("<III", payload)
+            ),
+            framing.OP_PROGRAM_REPEAT: lambda payload: self._set_program_repeat(
+                struct.unpack("<H", payload)[0]
+            ),
+            framing.OP_PROGRAM_RUN: lambda _: self._start_program(),
+            framing.OP_PROGRAM_ABORT: lambda _: self._abort_program(),
+            framing.OP_PROGRAM_STATE: lambda _: struct.pack(
+                "<BBHBH",
+                self.program_running,
+                self.program_step,
+                self.program_cycle,
+                len(self.program),
+                self.program_repeat,
+            ),
+        }
+
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self._port = os.ttyname(self._slave)
+        self._tcgetattr = termios.tcgetattr
+        self._speeds = {
+            getattr(termios, f"B{rate}"): rate
+            for rate in BAUDRATES
+            if hasattr(termios, f"B{rate}")
+        }
+
+        self._lock = threading.RLock()
+        self._ready_at = time.monotonic() + boot_time
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="DigOutBoxEmulator", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self) -> "DigOutBoxEmulator":
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Stop the emulator when leaving the context."""
+        self.close()
+
+    # PROPERTIES #
+
+    @property
+    def identity(self) -> str:
+        """Return the answer to the identity query."""
+        fw = ".".join(str(x) for x in self.firmware)
+        return f"DigIOBox, Hardware {self.hw_version}, Firmware v{fw}"
+
+    @property
+    def outputs(self) -> List[int]:
+        """Return the logic levels of the output pins, taking inversion into account."""
+        return [int(state) ^ self.invert[it] for it, state in enumerate(self.states)]
+
+    @property
+    def port(self) -> str:
+        """Return the port to connect to."""
+        return self._port
+
+    # METHODS #
+
+    def close(self) -> None:
+        """Stop the emulator and close the pseudo-terminal."""
+        if not self._running:
+            return
+        self._running = False
+        self._thread.join(timeout=1)
+        os.close(self._master)
+        os.close(self._slave)
+
+    def press_remote(self, channel: int) -> None:
+        """Emulate a button press on the RF remote.
+
+        :param channel: Channel associated with the button, -1 for all off,
+            -2 for toggling the software lockout.
+        """
+        with self._lock:
+            if channel == -1:
+                self._all_off()
+                self._pending_event = EVENT_RF
+            elif channel == -2:
+                self.software_lockout = not self.software_lockout
+                self._pending_event = EVENT_LOCKOUT
+            elif 0 <= channel < self.num_channels:
+                self._set_channel(channel, not self.states[channel])
+                self._pending_event = EVENT_RF
+
+    def reset(self) -> None:
+        """Emulate a reset of the Arduino, e.g., by a power cycle.
+
+        All channels are turned off, the software lockout is released, events
+        are disabled, the pulse program is cleared, and the serial connection
+        falls back to text mode at the default baud rate.
+        """
+        with self._lock:
+            self._clear_program()
+            self.program_repeat = 1
+            self.software_lockout = False
+            self.binary_mode = False
+            self.events_enabled = False
+            self._pending_event = 0
+            self._all_off()
+            self._pending_baudrate = None
+            self._change_baudrate(self.default_baudrate)
+
+    def set_interlock(self, triggered: bool) -> None:
+        """Trigger or release the interlock.
+
+        :param triggered: Whether the interlock is triggered.
+        """
+        if not self.enable_interlock:
+            return
+        with self._lock:
+            if triggered:
+                self._all_off()
+            self.interlocked = bool(triggered)
+            self._pending_event = EVENT_INTERLOCK
+
+    def transfer_time(self, nbytes: int) -> float:
+        """Return the time it takes to transfer a number of bytes on the wire.
+
+        :param nbytes: Number of bytes.
+
+        :return: Time in seconds.
+        """
+        if not self._emulate_timing:
+            return 0.0
+        return nbytes * self.BITS_PER_BYTE / self.baudrate
+
+    # COMMAND HANDLERS #
+
+    def _register(
+        self, token: str, handler: Callable, since: Tuple[int, int, int] = (0, 0, 0)
+    ) -> None:
+        """Register a command if the emulated firmware knows it.
+
+        :param token: Command as registered in the firmware.
+        :param handler: Function that takes the numeric suffix (or `None`) and the
+            list of parameters and returns the answer or `None`.
+        :param since: Firmware version that introduced the command.
+        """
+        if self.firmware >= since:
+            self._commands.append((scpi_pattern(token), handler))
+
+    def _register_commands(self) -> None:
+        """Register all commands of the firmware, see `setup()` in the firmware."""
+        self._register("*IDN?", lambda _, __: self.identity)
+        self._register("DOut#?", self._get_dig_io)
+        self._register("DOut#", self._set_dig_io)
+        self._register("ALLDOut?", self._get_all_dig_io)
+        self._register("MASKDOut?", self._get_mask_dig_io, since=(0, 3, 0))
+        self._register("MASKDOut", self._set_mask_dig_io, since=(0, 3, 0))
+        self._register(
+            "MASKDOut:SKEW?", lambda _, __: str(self.switching_skew), since=(0, 3, 0)
+        )
+        self._register("ALLOFF", lambda _, __: self._all_off())
+        self._register("INTERLOCKState?", lambda _, __: str(int(self.interlocked)))
+        self._register("SWLockout?", lambda _, __: str(int(self.software_lockout)))
+        self._register("STATus?", self._get_status, since=(0, 3, 0))
+        self._register("BAUDrate?", self._get_baudrate, since=(0, 3, 0))
+        self._register(
+            "BAUDrate:LIST?",
+            lambda _, __: ",".join(str(rate) for rate in BAUDRATES),
+            since=(0, 3, 0),
+        )
+        self._register("BAUDrate", self._set_baudrate, since=(0, 3, 0))
+        self._register("BINary", self._set_binary_mode, since=(0, 3, 0))
+        self._register(
+            "EVENTs?", lambda _, __: str(int(self.events_enabled)), since=(0, 3, 0)
+        )
+        self._register("EVENTs", self._set_events, since=(0, 3, 0))
+        self._register("PROGram?", self._get_program, since=(0, 3, 0))
+        self._register(
+            "PROGram:CLEar", lambda _, __: self._clear_program(), since=(0, 3, 0)
+        )
+        self._register("PROGram:ADD", self._add_program, since=(0, 3, 0))
+        self._register("PROGram:REPeat", self._set_repeat, since=(0, 3, 0))
+        self._register(
+            "PROGram:RUN", lambda _, __: self._start_program(), since=(0, 3, 0)
+        )
+        self._register(
+            "PROGram:ABORt", lambda _, __: self._abort_program(), since=(0, 3, 0)
+        )
+
+    def _get_all_dig_io(self, _, __) -> str:
+        """Answer `ALLDOut?`."""
+        return ",".join(str(int(state)) for state in self.states)
+
+    def _get_baudrate(self, _, __) -> str:
+        """Answer `BAUDrate?`, which confirms a new baud rate."""
+        self._baudrate_deadline = None
+        return str(self.baudrate)
+
+    def _get_dig_io(self, suffix, _) -> Union[str, None]:
+        """Answer `DOut#?`."""
+        if suffix < self.num_channels:
+            return str(int(self.states[suffix]))
+        return None
+
+    def _get_mask(self) -> int:
+        """Return the states of all channels as a bitmask."""
+        return sum(int(state) << it for it, state in enumerate(self.states))
+
+    def _get_mask_dig_io(self, _, __) -> str:
+        """Answer `MASKDOut?`."""
+        return f"{self._get_mask():X}"
+
+    def _get_program(self, _, __) -> str:
+        """Answer `PROGram?`."""
+        return (
+            f"{int(self.program_running)},{self.program_step},{self.program_cycle},"
+            f"{len(self.program)},{self.program_repeat}"
+        )
+
+    def _get_status(self, _, __) -> str:
+        """Answer `STATus?`."""
+        return (
+            f"{self._get_mask():X},{int(self.interlocked)},{int(self.software_lockout)}"
+        )
+
+    def _add_program(self, _, parameters) -> None:
+        """Execute `PROGram:ADD delay,values,mask`."""
+        if len(parameters) < 2:
+            return
+        mask = int(parameters[2], 16) if len(parameters) > 2 else 0xFFFFFFFF
+        self._add_program_entry(int(parameters[0]), int(parameters[1], 16), mask)
+
+    def _set_baudrate(self, _, parameters) -> str:
+        """Execute `BAUDrate rate`, the switch happens after answering."""
+        if not parameters or not parameters[0].isdigit():
+            return str(self.baudrate)
+        rate = int(parameters[0])
+        if rate not in BAUDRATES:
+            return str(self.baudrate)
+        self._pending_baudrate = rate
+        return str(rate)
+
+    def _set_binary_mode(self, _, parameters) -> Union[str, None]:
+        """Execute `BINary 1`, all following input is parsed as frames."""
+        if parameters and parameters[0] == "1":
+            self.binary_mode = True
+            return "1"
+        return None
+
+    def _set_events(self, _, parameters) -> None:
+        """Execute `EVENTs state`."""
+        if parameters and parameters[0] in ("0", "1"):
+            self._enable_events(parameters[0] == "1")
+
+    def _set_repeat(self, _, parameters) -> None:
+        """Execute `PROGram:REPeat runs`."""
+        if parameters and parameters[0].isdigit():
+            self._set_program_repeat(int(parameters[0]))
+
+    def _set_dig_io(self, suffix, parameters) -> None:
+        """Execute `DOut# state`."""
+        if self.software_lockout or not parameters:
+            return
+        if suffix < self.num_channels and parameters[0] in ("0", "1"):
+            self._set_channel(suffix, parameters[0] == "1")
+
+    def _set_mask_dig_io(self, _, parameters) -> None:
+        """Execute `MASKDOut values,mask`."""
+        if self.software_lockout or not parameters:
+            return
+        values = int(parameters[0], 16)
+        mask = (1 << self.num_channels) - 1
+        if len(parameters) > 1:
+            mask = int(parameters[1], 16)
+        self._apply_mask(values, mask)
+
+    # BINARY FRAME HANDLERS #
+
+    def _frame_events(self, payload: bytes) -> None:
+        """Enable or disable events."""
+        self._enable_events(payload[0] == 1)
+
+    def _frame_exit(self, _) -> bytes:
+        """Leave the binary mode after answering."""
+        self.binary_mode = False
+        return b""
+
+    def _frame_get_dig_io(self, payload: bytes) -> Union[bytes, None]:
+        """Answer the state of one channel."""
+        if payload[0] < self.num_channels:
+            return bytes([self.states[payload[0]]])
+        return None
+
+    def _frame_identify(self, _) -> bytes:
+        """Answer hardware and firmware version."""
+        hw_version = [int(x) for x in self.hw_version.lstrip("v").split(".")]
+        return bytes(hw_version) + bytes(self.firmware)
+
+    def _frame_set_dig_io(self, payload: bytes) -> None:
+        """Set the state of one channel."""
+        if not self.software_lockout and payload[0] < self.num_channels:
+            if payload[1] in (0, 1):
+                self._set_channel(payload[0], payload[1] == 1)
+
+    def _frame_set_mask_dig_io(self, payload: bytes) -> None:
+        """Set the states of the channels in the mask."""
+        if not self.software_lockout:
+            self._apply_mask(*struct.unpack("<II", payload))
+
+    # DEVICE LOGIC #
+
+    def _apply_mask(self, values: int, mask: int) -> None:
+        """Set all channels in the mask to the corresponding bit of values."""
+        for it in range(self.num_channels):
+            if mask >> it & 1:
+                self._set_channel(it, bool(values >> it & 1))
+
+    def _all_off(self) -> None:
+        """Turn all channels off, which also aborts the pulse program."""
+        self.program_running = False
+        for it in range(self.num_channels):
+            self._set_channel(it, False)
+
+    def _set_channel(self, ch: int, state: bool) -> None:
+        """Set a channel, unless the box is interlocked."""
+        if not self.interlocked:
+            self.states[ch] = bool(state)
+
+    def _enable_events(self, enable: bool) -> None:
+        """Enable or disable events, enabling discards older changes."""
+        if enable:
+            self._pending_event = 0
+        self.events_enabled = enable
+
+    def _abort_program(self) -> None:
+        """Stop the pulse program, the channels keep their states."""
+        self.program_running = False
+
+    def _add_program_entry(self, delay: int, values: int, mask: int) -> None:
+        """Append an entry to the pulse program.
+
+        Ignored while the program runs, if the program is full, or if the delay
+        is too long to be scheduled.
+        """
+        if (
+            not self.program_running
+            and len(self.program) < PROGRAM_MAX_LENGTH
+            and delay <= PROGRAM_MAX_DELAY
+        ):
+            self.program.append((delay, values, mask))
+
+    def _clear_program(self) -> None:
+        """Abort the pulse program and remove all entries."""
+        self.program_running = False
+        self.program = []
+        self.program_step = 0
+        self.program_cycle = 0
+
+    def _set_program_repeat(self, repeat: int) -> None:
+        """Set the number of runs of the pulse program, unless it runs."""
+        if not self.program_running:
+            self.program_repeat = repeat & 0xFFFF
+
+    def _start_program(self) -> None:
+        """Start the pulse program, unless software cannot switch the channels."""
+        if not self.program or self.interlocked or self.software_lockout:
+            return
+        self.program_step = 0
+        self.program_cycle = 0
+        self._program_due = time.monotonic() + self.program[0][0] / 1000
+        self.program_running = True
+
+    def _step_program(self) -> None:
+        """Execute all entries of the pulse program that are due.
+
+        Entries are scheduled relative to the due time of the previous entry, see
+        `StepProgram()` in the firmware.
+        """
+        with self._lock:
+            while self.program_running:
+                if self.interlocked or self.software_lockout:
+                    self.program_running = False
+                    return
+                if time.monotonic() < self._program_due:
+                    return
+
+                _, values, mask = self.program[self.program_step]
+                self._apply_mask(values, mask)
+                self.program_step += 1
+                if self.program_step >= len(self.program):
+                    self.program_step = 0
+                    self.program_cycle += 1
+                    if self.program_cycle >= self.program_repeat > 0:
+                        self.program_running = False
+                        self._pending_event = EVENT_PROGRAM
+                        return
+                self._program_due += self.program[self.program_step][0] / 1000
+
+    def _change_baudrate(self, rate: int) -> None:
+        """Switch the serial connection to a new baud rate."""
+        self.baudrate = rate
+        self._baudrate_deadline = None
+        if rate != self.default_baudrate:
+            self._baudrate_deadline = time.monotonic() + self.BAUD_REVERT_TIME
+
+    def _serial_error(self) -> None:
+        """Fall back to the default baud rate on input that cannot be parsed."""
+        if self.baudrate != self.default_baudrate:
+            self._change_baudrate(self.default_baudrate)
+
+    # SERIAL HANDLING #
+
+    def _handle(self, line: str) -> Union[str, None]:
+        """Execute one command line and return the answer.
+
+        :param line: Command without terminator.
+
+        :return: Answer or `None` if the command does not answer.
+        """
+        line = line.strip()
+        if not line:
+            return None
+        header, _, params = line.partition(" ")
+        parameters = [param.strip() for param in params.split(",") if param.strip()]
+
+        for pattern, handler in self._commands:
+            match = pattern.match(header.upper())
+            if match is not None:
+                suffix = int(match.group(1)) if match.groups() else None
+                try:
+                    with self._lock:
+                        return handler(suffix, parameters)
+                except ValueError:
+                    # malformed parameters, treated like an unknown command
+                    break
+
+        self._serial_error()
+        return None
+
+    def _run(self) -> None:
+        """Read commands from the pseudo-terminal and answer them."""
+        buffer = b""
+        while self._running:
+            # revert to the default baud rate if a new one is not confirmed
+            deadline = self._baudrate_deadline
+            if deadline is not None and time.monotonic() > deadline:
+                self._change_baudrate(self.default_baudrate)
+            timeout = 0.05
+            if self.program_running:
+                self._step_program()
+                if self.program_running:
+                    timeout = min(timeout, max(self._program_due - time.monotonic(), 0))
+            if self.events_enabled and self._pending_event:
+                self._send_event()
+
+            readable, _, _ = select.select([self._master], [], [], timeout)
+            if not readable:
+                continue
+            try:
+                data = os.read(self._master, 1024)
+            except OSError:
+                return
+
+            # the Arduino ignores everything while booting
+            if time.monotonic() < self._ready_at:
+                continue
+
+            # time for the command to arrive at the emulated baud rate
+            time.sleep(self.transfer_time(len(data)))
+
+            if self._garbled():
+                buffer = b""
+                self._serial_error()
+                continue
+
+            buffer = self._process(buffer + data)
+
+    def _process(self, buffer: bytes) -> bytes:
+        """Execute all complete commands, as text lines or binary frames.
+
+        :param buffer: Received bytes.
+
+        :return: Bytes that are not a complete command yet.
+        """
+        while buffer:
+            if self.binary_mode:
+                buffer = self._process_binary(buffer)
+                if self.binary_mode:
+                    break
+            elif self.terminator.encode() in buffer:
+                line, buffer = buffer.split(self.terminator.encode(), 1)
+                self._respond(line.decode("utf-8", errors="replace"))
+            else:
+                break
+        return buffer
+
+    def _process_binary(self, buffer: bytes) -> bytes:
+        """Execute all complete frames, see `ProcessBinary()` in the firmware.
+
+        :param buffer: Received bytes.
+
+        :return: Bytes that were not processed yet: an incomplete frame, or the
+            input after the binary mode was left.
+        """
+        while buffer:
+            if buffer[0] != framing.SYNC:
+                # any other byte ends the binary mode and is lost
+                self.binary_mode = False
+                return buffer[1:]
+            if len(buffer) < 2:
+                return buffer
+            size = framing.REQUEST_SIZE.get(buffer[1])
+            if size is None:
+                buffer = buffer[2:]
+                continue
+            if len(buffer) < size + 3:
+                return buffer
+
+            frame, buffer = buffer[: size + 3], buffer[size + 3 :]
+            self._execute_frame(frame)
+            if not self.binary_mode:
+                return buffer
+        return buffer
+
+    def _execute_frame(self, frame: bytes) -> None:
+        """Execute one frame and write the reply frame, if any.
+
+        :param frame: Complete frame with sync byte and checksum.
+        """
+        self.received.append(frame)
+        if framing.crc8(frame[1:-1]) != frame[-1]:
+            return
+        with self._lock:
+            reply = self._frame_handlers[frame[1]](frame[2:-1])
+        if reply is None:
+            return
+        data = framing.encode_frame(frame[1], reply)
+        time.sleep(self.transfer_time(len(data)))
+        os.write(self._master, data)
+
+    def _respond(self, line: str) -> None:
+        """Execute a command and write its answer to the pseudo-terminal.
+
+        :param line: Command without terminator.
+        """
+        self.received.append(line)
+        answer = self._handle(line)
+        if answer is None:
+            return
+        data = f"{answer}\r{self.terminator}".encode()
+        time.sleep(self.transfer_time(len(data)))
+        os.write(self._master, data)
+
+        if self._pending_baudrate is not None:
+            self._change_baudrate(self._pending_baudrate)
+            self._pending_baudrate = None
+
+    def _send_event(self) -> None:
+        """Report the last state change that the host did not cause."""
+        with self._lock:
+            source, self._pending_event = self._pending_event, 0
+            if self.binary_mode:
+                payload = struct.pack(
+                    "<IBBB",
+                    self._get_mask(),
+                    self.interlocked,
+                    self.software_lockout,
+                    source,
+                )
+                data = framing.encode_frame(framing.OP_EVENT, payload)
+            else:
+                status = self._get_status(None, None)
+                line = f"!{framing.EVENT_SOURCES[source]} {status}\r{self.terminator}"
+                data = line.encode()
+        time.sleep(self.transfer_time(len(data)))
+        os.write(self._master, data)
+
+    def _garbled(self) -> bool:
+        """Check if the bytes on the link are garbled.
+
+        This is the case if the host uses another baud rate than the firmware, or
+        if the baud rate is above the limit of the link. Host rates that cannot be
+        determined are assumed to match.
+        """
+        if (
+            self.max_link_baudrate is not None
+            and self.baudrate > self.max_link_baudrate
+        ):
+            return True
+        try:
+            speed = self._tcgetattr(self._slave)[5]
+        except OSError:
+            return False
+        host_rate = self._speeds.get(speed)
+        return host_rate is not None and host_rate != self.baudrate
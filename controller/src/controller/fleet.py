@@ -0,0 +1,246 @@
+"""Class to control several DigIOBoxes concurrently."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+from typing import Callable, Dict, Iterator, Tuple, Union
+
+from serial.tools import list_ports
+
+from .device_comm import DigIOBoxComm
+from .util_fns import DeviceStatus, StateMask
+
+
+class DigIOBoxFleet:
+    """Control several DigIO Boxes at once.
+
+    Boxes are addressed by name, channels by a tuple of box name and channel
+    number. Commands that concern several boxes are sent to all boxes in
+    parallel, each box from its own thread. The threads are kept until the fleet
+    is closed.
+
+    Example:
+    -------
+        >>> fleet = DigIOBoxFleet.from_ports({"lasers": "/dev/ttyACM0",
+        ...                                   "shutters": "/dev/ttyACM1"})
+        >>> fleet["lasers", 3].state = True
+        >>> fleet.set_states({("lasers", 0): True, ("shutters", 2): False})
+        >>> fleet.states()
+        {'lasers': [True, False, ...], 'shutters': [False, False, ...]}
+
+    """
+
+    def __init__(self, boxes: Dict[str, DigIOBoxComm] = None) -> None:
+        """Initialize the fleet.
+
+        :param boxes: Dictionary with names as keys and connected boxes as values.
+        """
+        self._boxes = {}
+        self._executor = None
+        self._max_workers = 0
+        self._executor_lock = threading.Lock()
+        for name, box in (boxes or {}).items():
+            self.add(name, box)
+
+    @classmethod
+    def from_ports(cls, ports: Dict[str, str], **kwargs) -> "DigIOBoxFleet":
+        """Connect to several boxes in parallel.
+
+        :param ports: Dictionary with names as keys and ports as values.
+        :param kwargs: Keyword arguments passed on to `DigIOBoxComm`.
+
+        :return: Fleet with all connected boxes.
+
+        :raises Exception: The first exception that occurred while connecting,
+            after the boxes that did connect were closed again.
+        """
+        with ThreadPoolExecutor(max_workers=max(len(ports), 1)) as executor:
+            futures = {
+                name: executor.submit(DigIOBoxComm, port, **kwargs)
+                for name, port in ports.items()
+            }
+
+        boxes = {}
+        errors = []
+        for name, future in futures.items():
+            if future.exception() is None:
+                boxes[name] = future.result()
+            else:
+                errors.append(future.exception())
+        if errors:
+            for box in boxes.values():
+                box.close()
+            raise errors[0]
+        return cls(boxes)
+
+    @classmethod
+    def from_serial_numbers(
+        cls, serial_numbers: Dict[str, str], **kwargs
+    ) -> "DigIOBoxFleet":
+        """Connect to several boxes by the USB serial number of their Arduino.
+
+        :param serial_numbers: Dictionary with names as keys and USB serial
+            numbers as values.
+        :param kwargs: Keyword arguments passed on to `DigIOBoxComm`.
+
+        :return: Fleet with all connected boxes.
+
+        :raises OSError: No port is found for a given serial number.
+        """
+        available = {
+            port.serial_number: port.device
+            for port in list_ports.comports()
+            if port.serial_number is not None
+        }
+
+        ports = {}
+        for name, serial_number in serial_numbers.items():
+            if serial_number not in available:
+                raise OSError(f"No device with serial number {serial_number} found.")
+            ports[name] = available[serial_number]
+        return cls.from_ports(ports, **kwargs)
+
+    def __contains__(self, name: str) -> bool:
+        """Check if a box with the given name is in the fleet."""
+        return name in self._boxes
+
+    def __getitem__(
+        self, key: Union[str, Tuple[str, int]]
+    ) -> Union[DigIOBoxComm, DigIOBoxComm.Channel]:
+        """Get a box by name or a channel by a tuple of box name and channel number.
+
+        :raises KeyError: The box is not in the fleet.
+        :raises IndexError: The channel is out of range.
+        """
+        if isinstance(key, tuple):
+            name, ch = key
+            return self._boxes[name].channel[ch]
+        return self._boxes[key]
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the names of all boxes."""
+        return iter(self._boxes)
+
+    def __len__(self) -> int:
+        """Return the number of boxes."""
+        return len(self._boxes)
+
+    @property
+    def names(self):
+        """Return the names of all boxes."""
+        return list(self._boxes)
+
+    def add(self, name: str, box: DigIOBoxComm) -> None:
+        """Add a connected box to the fleet.
+
+        :param name: Name of the box.
+        :param box: Connected box.
+
+        :raises ValueError: A box with this name is already in the fleet.
+        """
+        if name in self._boxes:
+            raise ValueError(f"A box named {name} is already in the fleet.")
+        self._boxes[name] = box
+
+    def all_off(self) -> None:
+        """Turn all channels of all boxes off."""
+        self.map(lambda box: box.all_off())
+
+    def close(self) -> None:
+        """Close the connections to all boxes and stop the threads."""
+        try:
+            self.map(lambda box: box.close())
+        finally:
+            with self._executor_lock:
+                if self._executor is not None:
+                    self._executor.shutdown()
+                    self._executor = None
+                    self._max_workers = 0
+
+    def map(self, fn: Callable, names=None) -> Dict[str, object]:
+        """Call a function for several boxes in parallel.
+
+        :param fn: Function that takes a box as the only argument.
+        :param names: Names of the boxes to call the function for. Defaults to all.
+
+        :return: Dictionary with names as keys and the return values as values.
+
+        :raises Exception: The first exception that occurred, after all calls
+            have finished.
+        """
+        names = self.names if names is None else names
+        return self._run({name: partial(fn, self._boxes[name]) for name in names})
+
+    def remove(self, name: str) -> DigIOBoxComm:
+        """Remove a box from the fleet without closing it.
+
+        :param name: Name of the box.
+
+        :return: Removed box.
+        """
+        return self._boxes.pop(name)
+
+    def set_states(self, states: Dict[Tuple[str, int], bool]) -> None:
+        """Set the states of channels on several boxes concurrently.
+
+        Every box receives a single `set_states` command.
+
+        :param states: Dictionary with tuples of box name and channel number as
+            keys and states as values.
+
+        :raises KeyError: A box is not in the fleet.
+        """
+        per_box = {}
+        for (name, ch), state in states.items():
+            if name not in self._boxes:
+                raise KeyError(name)
+            per_box.setdefault(name, {})[ch] = state
+
+        self._run(
+            {
+                name: partial(self._boxes[name].set_states, box_states)
+                for name, box_states in per_box.items()
+            }
+        )
+
+    def state_masks(self) -> Dict[str, StateMask]:
+        """Read the states of all boxes in parallel as bitmasks.
+
+        :return: Dictionary with names as keys and state masks as values.
+        """
+        return self.map(lambda box: box.state_mask)
+
+    def states(self) -> Dict[str, list]:
+        """Read the states of all boxes in parallel.
+
+        :return: Dictionary with names as keys and lists of states as values.
+        """
+        return self.map(lambda box: box.states)
+
+    def status(self) -> Dict[str, DeviceStatus]:
+        """Read the status of all boxes in parallel.
+
+        :return: Dictionary with names as keys and status snapshots as values.
+        """
+        return self.map(lambda box: box.status())
+
+    def _run(self, calls: Dict[str, Callable]) -> Dict[str, object]:
+        """Execute functions without arguments in parallel.
+
+        :param calls: Dictionary with names as keys and functions as values.
+
+        :return: Dictionary with names as keys and the return values as values.
+        """
+        if len(calls) <= 1:
+            return {name: fn() for name, fn in calls.items()}
+
+        with self._executor_lock:
+            # one thread per box, start more if boxes were added
+            if self._max_workers < len(calls):
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._max_workers = max(len(calls), len(self._boxes))
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
+            futures = {name: self._executor.submit(fn) for name, fn in calls.items()}
+        wait(futures.values())
+        return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,232 @@
+"""Binary framed protocol of the DigIOBox.
+
+In binary mode, every command and every reply is one frame: the sync byte
+`0xA5`, a one byte opcode, a payload of fixed size that depends on the opcode,
+and a CRC-8 checksum over opcode and payload. Multi-byte values are little
+endian. Replies use the opcode of the command they answer.
+
+The host keeps talking SCPI: commands are translated into frames when they are
+sent and replies are translated back into the text the SCPI command would have
+returned. Commands that have no binary equivalent raise a `ValueError`.
+Unsolicited events are translated into their text form as well.
+"""
+
+import struct
+from functools import lru_cache
+from typing import Tuple, Union
+
+from .util_fns import scpi_pattern
+
+SYNC = 0xA5
+
+OP_IDENTIFY = 0x01
+OP_GET_DIG_IO = 0x10
+OP_SET_DIG_IO = 0x11
+OP_GET_ALL_DIG_IO = 0x12
+OP_GET_MASK_DIG_IO = 0x13
+OP_SET_MASK_DIG_IO = 0x14
+OP_ALL_OFF = 0x15
+OP_INTERLOCK_STATE = 0x16
+OP_SW_LOCKOUT = 0x17
+OP_STATUS = 0x18
+OP_EVENTS = 0x19
+OP_EXIT = 0x1F
+OP_EVENT = 0x20
+OP_PROGRAM_CLEAR = 0x30
+OP_PROGRAM_ADD = 0x31
+OP_PROGRAM_REPEAT = 0x32
+OP_PROGRAM_RUN = 0x33
+OP_PROGRAM_ABORT = 0x34
+OP_PROGRAM_STATE = 0x35
+OP_SWITCHING_SKEW = 0x36
+
+# sources of unsolicited events
+EVENT_SOURCES = {1: "RF", 2: "INTERLOCK", 3: "LOCKOUT", 4: "PROGRAM"}
+
+# payload sizes of commands and replies in bytes
+REQUEST_SIZE = {
+    OP_IDENTIFY: 0,
+    OP_GET_DIG_IO: 1,
+    OP_SET_DIG_IO: 2,
+    OP_GET_ALL_DIG_IO: 0,
+    OP_GET_MASK_DIG_IO: 0,
+    OP_SET_MASK_DIG_IO: 8,
+    OP_ALL_OFF: 0,
+    OP_INTERLOCK_STATE: 0,
+    OP_SW_LOCKOUT: 0,
+    OP_STATUS: 0,
+    OP_EVENTS: 1,
+    OP_EXIT: 0,
+    OP_PROGRAM_CLEAR: 0,
+    OP_PROGRAM_ADD: 12,
+    OP_PROGRAM_REPEAT: 2,
+    OP_PROGRAM_RUN: 0,
+    OP_PROGRAM_ABORT: 0,
+    OP_PROGRAM_STATE: 0,
+    OP_SWITCHING_SKEW: 0,
+}
+REPLY_SIZE = {
+    OP_IDENTIFY: 6,
+    OP_GET_DIG_IO: 1,
+    OP_GET_ALL_DIG_IO: 5,
+    OP_GET_MASK_DIG_IO: 4,
+    OP_INTERLOCK_STATE: 1,
+    OP_SW_LOCKOUT: 1,
+    OP_STATUS: 6,
+    OP_EXIT: 0,
+    OP_EVENT: 7,
+    OP_PROGRAM_STATE: 7,
+    OP_SWITCHING_SKEW: 4,
+}
+
+# SCPI commands with a binary equivalent: opcode and payload from suffix and
+# parameters
+_COMMANDS = [
+    ("*IDN?", OP_IDENTIFY, lambda suffix, params: b""),
+    ("DOut#?", OP_GET_DIG_IO, lambda suffix, params: bytes([suffix])),
+    ("DOut#", OP_SET_DIG_IO, lambda suffix, params: bytes([suffix, int(params[0])])),
+    ("ALLDOut?", OP_GET_ALL_DIG_IO, lambda suffix, params: b""),
+    ("MASKDOut?", OP_GET_MASK_DIG_IO, lambda suffix, params: b""),
+    (
+        "MASKDOut",
+        OP_SET_MASK_DIG_IO,
+        lambda suffix, params: struct.pack(
+            "<II",
+            int(params[0], 16),
+            int(params[1], 16) if len(params) > 1 else 0xFFFFFFFF,
+        ),
+    ),
+    ("MASKDOut:SKEW?", OP_SWITCHING_SKEW, lambda suffix, params: b""),
+    ("ALLOFF", OP_ALL_OFF, lambda suffix, params: b""),
+    ("INTERLOCKState?", OP_INTERLOCK_STATE, lambda suffix, params: b""),
+    ("SWLockout?", OP_SW_LOCKOUT, lambda suffix, params: b""),
+    ("STATus?", OP_STATUS, lambda suffix, params: b""),
+    ("EVENTs", OP_EVENTS, lambda suffix, params: bytes([int(params[0])])),
+    ("PROGram?", OP_PROGRAM_STATE, lambda suffix, params: b""),
+    ("PROGram:CLEar", OP_PROGRAM_CLEAR, lambda suffix, params: b""),
+    (
+        "PROGram:ADD",
+        OP_PROGRAM_ADD,
+        lambda suffix, params: struct.pack(
+            "<III",
+            int(params[0]),
+            int(params[1], 16),
+            int(params[2], 16) if len(params) > 2 else 0xFFFFFFFF,
+        ),
+    ),
+    (
+        "PROGram:REPeat",
+        OP_PROGRAM_REPEAT,
+        lambda suffix, params: struct.pack("<H", int(params[0])),
+    ),
+    ("PROGram:RUN", OP_PROGRAM_RUN, lambda suffix, params: b""),
+    ("PROGram:ABORt", OP_PROGRAM_ABORT, lambda suffix, params: b""),
+]
+_PATTERNS = [(scpi_pattern(token), op, payload) for token, op, payload in _COMMANDS]
+
+
+class FrameError(OSError):
+    """A received frame is incomplete or corrupted."""
+
+
+def crc8(data: bytes) -> int:
+    """Calculate the CRC-8 checksum (polynomial 0x07) of the given bytes.
+
+    :param data: Bytes to calculate the checksum of.
+
+    :return: Checksum.
+    """
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x07 if crc & 0x80 else crc << 1
+        crc &= 0xFF
+    return crc
+
+
+def encode_frame(opcode: int, payload: bytes = b"") -> bytes:
+    """Build a frame from opcode and payload.
+
+    :param opcode: Opcode of the frame.
+    :param payload: Payload of the frame.
+
+    :return: Frame including sync byte and checksum.
+    """
+    body = bytes([opcode]) + payload
+    return bytes([SYNC]) + body + bytes([crc8(body)])
+
+
+@lru_cache(maxsize=256)
+def encode_command(cmd: str) -> bytes:
+    """Translate an SCPI command into a frame.
+
+    :param cmd: SCPI command, e.g., `DO3 1`.
+
+    :return: Frame of the command.
+
+    :raises ValueError: The command has no binary equivalent.
+    """
+    header, _, params = cmd.strip().partition(" ")
+    parameters = [param.strip() for param in params.split(",") if param.strip()]
+    for pattern, opcode, payload in _PATTERNS:
+        match = pattern.match(header.upper())
+        if match is not None:
+            suffix = int(match.group(1)) if match.groups() else None
+            return encode_frame(opcode, payload(suffix, parameters))
+    raise ValueError(f"The command {cmd} is not available in binary mode.")
+
+
+def decode_reply(opcode: int, payload: bytes) -> str:
+    """Translate a reply into the text that the SCPI command returns.
+
+    :param opcode: Opcode of the reply.
+    :param payload: Payload of the reply.
+
+    :return: Decoded answer.
+    """
+    if opcode == OP_IDENTIFY:
+        return "DigIOBox, Hardware v{}.{}.{}, Firmware v{}.{}.{}".format(*payload)
+    if opcode == OP_GET_ALL_DIG_IO:
+        states, num_channels = struct.unpack("<IB", payload)
+        return ",".join(str(states >> ch & 1) for ch in range(num_channels))
+    if opcode == OP_GET_MASK_DIG_IO:
+        return f"{struct.unpack('<I', payload)[0]:X}"
+    if opcode == OP_STATUS:
+        states, interlock, software_lockout = struct.unpack("<IBB", payload)
+        return f"{states:X},{interlock},{software_lockout}"
+    if opcode == OP_SWITCHING_SKEW:
+        return str(struct.unpack("<I", payload)[0])
+    if opcode == OP_PROGRAM_STATE:
+        return "{},{},{},{},{}".format(*struct.unpack("<BBHBH", payload))
+    if opcode == OP_EXIT:
+        return "0"
+    if opcode == OP_EVENT:
+        states, interlock, software_lockout, source = struct.unpack("<IBBB", payload)
+        source = EVENT_SOURCES.get(source, "UNKNOWN")
+        return f"!{source} {states:X},{interlock},{software_lockout}"
+    return str(payload[0])
+
+
+def read_frame(dev) -> Union[Tuple[int, bytes], None]:
+    """Read one reply frame from the device.
+
+    :param dev: Open serial port.
+
+    :return: Opcode and payload, `None` if nothing arrived before the timeout.
+
+    :raises FrameError: The reply is incomplete or corrupted.
+    """
+    header = dev.read(2)
+    if not header:
+        return None
+    if len(header) < 2 or header[0] != SYNC or header[1] not in REPLY_SIZE:
+        raise FrameError(f"Invalid frame header {header.hex()}.")
+
+    size = REPLY_SIZE[header[1]]
+    rest = dev.read(size + 1)
+    if len(rest) < size + 1:
+        raise FrameError("Incomplete frame.")
+    if crc8(header[1:] + rest[:-1]) != rest[-1]:
+        raise FrameError("Wrong checksum.")
+    return header[1], rest[:-1]
@@ -0,0 +1,227 @@
+"""Latency and traffic metrics of the communication with the device.
+
+Every `DevComm` collects metrics in its `metrics` attribute: a latency
+histogram per command name, the number of timeouts and malformed replies, and
+the bytes written and read. Applications can subscribe to the timing of every
+single call with `CommMetrics.add_hook`.
+
+Example:
+-------
+    >>> device = DigIOBoxComm("/dev/ttyACM0")
+    >>> states = device.state_mask
+    >>> device.metrics.latency["MASKDOUT?"].percentile(0.5)
+    0.02
+    >>> device.metrics.add_hook(print)
+    >>> device.channel[0].state = True
+    CallTiming(command='DO0 1', name='DO#', duration=0.0001, outcome='ok', ...)
+
+"""
+
+import bisect
+import re
+import warnings
+from functools import lru_cache
+from typing import Callable, Dict, NamedTuple, Tuple
+
+# upper bounds of the latency buckets in seconds
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.002,
+    0.005,
+    0.01,
+    0.02,
+    0.05,
+    0.1,
+    0.2,
+    0.5,
+    1.0,
+    2.0,
+    5.0,
+)
+
+# outcomes of a call
+OUTCOME_OK = "ok"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_MALFORMED = "malformed"
+OUTCOME_ERROR = "error"
+
+_SUFFIX = re.compile(r"\d+")
+
+
+@lru_cache(maxsize=256)
+def command_name(cmd: str) -> str:
+    """Return the name of a command without numeric suffixes and parameters.
+
+    :param cmd: Command as sent, e.g., `DO3 1`.
+
+    :return: Name of the command, e.g., `DO#`.
+    """
+    header = cmd.strip().partition(" ")[0].upper()
+    return _SUFFIX.sub("#", header)
+
+
+class CallTiming(NamedTuple):
+    """Timing and traffic of one call to the device.
+
+    :param command: Command as sent.
+    :param name: Name of the command, see `command_name`.
+    :param duration: Time in seconds from writing the command until the reply
+        was read, or until the command was written if no reply is expected.
+    :param outcome: `ok`, `timeout`, `malformed`, or `error`.
+    :param bytes_written: Number of bytes written.
+    :param bytes_read: Number of bytes read.
+    """
+
+    command: str
+    name: str
+    duration: float
+    outcome: str
+    bytes_written: int
+    bytes_read: int
+
+
+class LatencyHistogram:
+    """Histogram of latencies with fixed buckets.
+
+    :param buckets: Upper bounds of the buckets in seconds, ascending. Longer
+        latencies are counted in an overflow bucket.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        """Initialize an empty histogram."""
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def __repr__(self) -> str:
+        """Represent the histogram."""
+        return f"LatencyHistogram(count={self.count}, mean={self.mean})"
+
+    @property
+    def mean(self) -> float:
+        """Return the mean latency in seconds, `None` if nothing was recorded."""
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+    def add(self, duration: float) -> None:
+        """Record a latency.
+
+        :param duration: Latency in seconds.
+        """
+        self.counts[bisect.bisect_left(self.buckets, duration)] += 1
+        self.count += 1
+        self.total += duration
+        self.min = duration if self.min is None else min(self.min, duration)
+        self.max = duration if self.max is None else max(self.max, duration)
+
+    def percentile(self, fraction: float) -> float:
+        """Estimate a percentile by the upper bound of its bucket.
+
+        :param fraction: Fraction of the latencies below the percentile, e.g.,
+            0.99 for the 99th percentile.
+
+        :return: Upper bound of the bucket in seconds, or the maximum for the
+            overflow bucket. `None` if nothing was recorded.
+        """
+        if self.count == 0:
+            return None
+        threshold = fraction * self.count
+        cumulative = 0
+        for it, count in enumerate(self.counts[:-1]):
+            cumulative += count
+            if cumulative >= threshold:
+                return min(self.buckets[it], self.max)
+        return self.max
+
+    def to_dict(self) -> Dict[str, object]:
+        """Return the histogram as dictionary, e.g., to export it as JSON."""
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "buckets": list(self.buckets),
+            "counts": list(self.counts),
+        }
+
+
+class CommMetrics:
+    """Latency and traffic metrics of one device.
+
+    Calls are recorded by the device while it owns the serial port.
+    """
+
+    def __init__(self) -> None:
+        """Initialize empty metrics."""
+        self._hooks = []
+        self.reset()
+
+    def add_hook(self, hook: Callable) -> None:
+        """Register a function that is called with the `CallTiming` of every call.
+
+        Hooks are called from the thread that talks to the device while it owns
+        the serial port. They should return quickly.
+
+        :param hook: Function that takes a `CallTiming` as the only argument.
+        """
+        self._hooks.append(hook)
+
+    def record(self, timing: CallTiming) -> None:
+        """Record a call and pass it on to the hooks.
+
+        :param timing: Timing of the call.
+        """
+        if timing.name not in self.latency:
+            self.latency[timing.name] = LatencyHistogram()
+        self.latency[timing.name].add(timing.duration)
+        self.calls += 1
+        if timing.outcome == OUTCOME_TIMEOUT:
+            self.timeouts += 1
+        elif timing.outcome == OUTCOME_MALFORMED:
+            self.malformed += 1
+        elif timing.outcome == OUTCOME_ERROR:
+            self.errors += 1
+
+        for hook in list(self._hooks):
+            try:
+                hook(timing)
+            except Exception as err:
+                warnings.warn(f"Metrics hook failed: {err!r}", stacklevel=2)
+
+    def remove_hook(self, hook: Callable) -> None:
+        """Remove a function that was registered with `add_hook`.
+
+        :param hook: Registered function.
+        """
+        self._hooks.remove(hook)
+
+    def reset(self) -> None:
+        """Clear all recorded metrics, hooks stay registered."""
+        self.latency = {}
+        self.calls = 0
+        self.timeouts = 0
+        self.malformed = 0
+        self.errors = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    def to_dict(self) -> Dict[str, object]:
+        """Return all metrics as dictionary, e.g., to export them as JSON."""
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "malformed": self.malformed,
+            "errors": self.errors,
+            "bytes_written": self.bytes_written,
+            "bytes_read": self.bytes_read,
+            "latency": {
+                name: histogram.to_dict() for name, histogram in self.latency.items()
+            },
+        }
@@ -0,0 +1,5 @@
+"""Handler of `replay://` URLs for `serial.serial_for_url`, see `recorder`."""
+
+from .recorder import ReplaySerial as Serial
+
+__all__ = ["Serial"]
@@ -0,0 +1,275 @@
+"""Record the traffic with the device and replay it later on.
+
+A `TrafficRecorder` captures every line or frame that is written to or read
+from the device, together with a monotonic timestamp, in a ring buffer and
+optionally in a compact log file. A saved session can be fed back into a
+`DigIOBoxComm` by connecting to the URL `replay://<path>`, which is served by
+`ReplaySerial`. This reproduces the timing of a session without hardware, e.g.,
+to investigate timing problems or to run performance regression tests.
+
+Example:
+-------
+    >>> recorder = TrafficRecorder(path="session.digrec")
+    >>> device = DigIOBoxComm("/dev/ttyACM0", recorder=recorder)
+    >>> device.channel[0].state = True
+    >>> device.close()
+    >>> recorder.close()
+    >>> replay = DigIOBoxComm("replay://session.digrec?speed=10")
+    >>> replay.channel[0].state = True  # answered like the box did, 10x faster
+
+"""
+
+import struct
+import time
+from collections import deque
+from typing import List, NamedTuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+from serial.serialutil import PortNotOpenError, SerialBase, SerialException
+
+# directions of the traffic
+WRITE = "w"
+READ = "r"
+
+# header of a log file and header of every entry: timestamp, direction, length
+_MAGIC = b"DIGREC1\n"
+_ENTRY = struct.Struct("<dcI")
+
+
+class TrafficEntry(NamedTuple):
+    """One line or frame of the traffic with the device.
+
+    :param timestamp: Time in seconds since the recording started.
+    :param direction: `w` if written to the device, `r` if read from it.
+    :param data: Bytes on the wire.
+    """
+
+    timestamp: float
+    direction: str
+    data: bytes
+
+
+class TrafficRecorder:
+    """Record the traffic with the device with monotonic timestamps.
+
+    :param maxlen: Number of entries that are kept in memory, older entries are
+        dropped. `None` keeps all entries.
+    :param path: If given, all entries are also appended to this log file.
+    """
+
+    def __init__(self, maxlen: Union[int, None] = 10000, path: str = None) -> None:
+        """Start recording."""
+        self.entries = deque(maxlen=maxlen)
+        self._start = time.monotonic()
+        self._file = None
+        if path is not None:
+            # kept open until `close`, every entry is appended while recording
+            self._file = open(path, "wb")
+            self._file.write(_MAGIC)
+
+    def __enter__(self) -> "TrafficRecorder":
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Close the log file when leaving the context."""
+        self.close()
+
+    def __len__(self) -> int:
+        """Return the number of entries in memory."""
+        return len(self.entries)
+
+    def close(self) -> None:
+        """Close the log file, if any. Entries in memory are kept."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def record(self, direction: str, data: bytes) -> None:
+        """Record a line or frame.
+
+        :param direction: `WRITE` or `READ`.
+        :param data: Bytes on the wire.
+        """
+        entry = TrafficEntry(time.monotonic() - self._start, direction, bytes(data))
+        self.entries.append(entry)
+        if self._file is not None:
+            _write_entry(self._file, entry)
+
+    def save(self, path: str) -> None:
+        """Save the entries in memory to a log file.
+
+        :param path: Path of the log file.
+        """
+        with open(path, "wb") as file:
+            file.write(_MAGIC)
+            for entry in self.entries:
+                _write_entry(file, entry)
+
+
+def load(path: str) -> List[TrafficEntry]:
+    """Load a recorded session from a log file.
+
+    :param path: Path of the log file.
+
+    :return: Recorded entries.
+
+    :raises ValueError: The file is not a log of a recorded session.
+    """
+    entries = []
+    with open(path, "rb") as file:
+        if file.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"{path} is not a recorded session.")
+        while True:
+            header = file.read(_ENTRY.size)
+            if len(header) < _ENTRY.size:
+                break
+            timestamp, direction, length = _ENTRY.unpack(header)
+            data = file.read(length)
+            if len(data) < length:
+                break  # the recording was interrupted while writing
+            entries.append(TrafficEntry(timestamp, direction.decode(), data))
+    return entries
+
+
+def _write_entry(file, entry: TrafficEntry) -> None:
+    """Append an entry to a log file."""
+    file.write(_ENTRY.pack(entry.timestamp, entry.direction.encode(), len(entry.data)))
+    file.write(entry.data)
+
+
+class ReplaySerial(SerialBase):
+    """Serial port that answers like the device did in a recorded session.
+
+    Connect with the URL `replay://<path>[?speed=<factor>][&strict=0]`. Every
+    write is matched to the next recorded write. The reads that followed it in
+    the recording become available after the same delay, divided by `speed`.
+    `speed=0` answers without delay. If a write does not match the recording,
+    a `SerialException` is raised, unless `strict=0` is given.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        """Initialize the port, see `serial.Serial`."""
+        self.entries = []
+        self.speed = 1.0
+        self.strict = True
+        self._cursor = 0
+        self._pending = deque()  # (time when available, data) of future reads
+        self._buffer = bytearray()
+        super().__init__(*args, **kwargs)
+
+    @property
+    def in_waiting(self) -> int:
+        """Return the number of bytes that are available to read."""
+        if not self.is_open:
+            raise PortNotOpenError()
+        self._collect()
+        return len(self._buffer)
+
+    def close(self) -> None:
+        """Close the port."""
+        self.is_open = False
+
+    def open(self) -> None:
+        """Load the recorded session and open the port."""
+        if self.is_open:
+            raise SerialException("Port is already open.")
+        if self._port is None:
+            raise SerialException("Port must be configured before it can be used.")
+        self._from_url(self._port)
+        self._cursor = 0
+        self._pending.clear()
+        self._buffer.clear()
+        self.is_open = True
+        self._schedule(0.0)
+
+    def read(self, size: int = 1) -> bytes:
+        """Read up to `size` bytes, waiting at most for the timeout."""
+        if not self.is_open:
+            raise PortNotOpenError()
+        deadline = None if self._timeout is None else time.monotonic() + self._timeout
+        while True:
+            self._collect()
+            if len(self._buffer) >= size or not self._pending:
+                break
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            due = self._pending[0][0]
+            if deadline is not None:
+                due = min(due, deadline)
+            time.sleep(max(due - now, 0))
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def reset_input_buffer(self) -> None:
+        """Discard all bytes that are available to read."""
+        self._collect()
+        self._buffer.clear()
+
+    def reset_output_buffer(self) -> None:
+        """Nothing to discard, writes are never buffered."""
+
+    def write(self, data: bytes) -> int:
+        """Match the data to the next recorded write and schedule the reads after it.
+
+        :raises SerialException: The data differs from the recording or the
+            recording has ended, in strict mode.
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        data = bytes(data)
+        if self._cursor >= len(self.entries):
+            if self.strict:
+                raise SerialException(f"Replay has ended, cannot write {data!r}.")
+            return len(data)
+
+        entry = self.entries[self._cursor]
+        if self.strict and entry.data != data:
+            raise SerialException(
+                f"Replay diverged at entry {self._cursor}: "
+                f"expected {entry.data!r}, got {data!r}."
+            )
+        self._cursor += 1
+        self._schedule(entry.timestamp)
+        return len(data)
+
+    def _collect(self) -> None:
+        """Move all reads that are due into the input buffer."""
+        now = time.monotonic()
+        while self._pending and self._pending[0][0] <= now:
+            self._buffer += self._pending.popleft()[1]
+
+    def _from_url(self, url: str) -> None:
+        """Load the session and the options from the URL."""
+        parts = urlsplit(url)
+        if parts.scheme != "replay":
+            raise SerialException(
+                f'Expected a URL in the form "replay://<path>[?speed=<factor>]": {url}'
+            )
+        try:
+            options = parse_qs(parts.query)
+            self.speed = float(options.get("speed", ["1"])[0])
+            self.strict = options.get("strict", ["1"])[0] != "0"
+            self.entries = load(parts.netloc + parts.path)
+        except (OSError, ValueError) as err:
+            raise SerialException(f"Cannot replay {url}: {err}") from err
+
+    def _reconfigure_port(self) -> None:
+        """Nothing to configure, the baud rate only matters on a real link."""
+
+    def _schedule(self, reference: float) -> None:
+        """Schedule all reads up to the next recorded write.
+
+        :param reference: Timestamp in the recording that corresponds to now.
+        """
+        now = time.monotonic()
+        while self._cursor < len(self.entries):
+            entry = self.entries[self._cursor]
+            if entry.direction != READ:
+                break
+            delay = (entry.timestamp - reference) / self.speed if self.speed else 0
+            self._pending.append((now + max(delay, 0), entry.data))
+            self._cursor += 1
@@ -1,15 +1,50 @@
 """Class to communicate with device via serial."""
 
+import queue
+import threading
 import time
+import warnings
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, List, Tuple
 
 import serial
 
+from . import framing
+from .metrics import (
+    OUTCOME_ERROR,
+    OUTCOME_MALFORMED,
+    OUTCOME_OK,
+    OUTCOME_TIMEOUT,
+    CallTiming,
+    CommMetrics,
+    command_name,
+)
+from .recorder import READ, WRITE, TrafficRecorder
+
+# serve `replay://` URLs with `controller.protocol_replay`
+if __package__ not in serial.protocol_handler_packages:
+    serial.protocol_handler_packages.append(__package__)
+
 
 class DevComm:
     """Class to communicate with the Arduino."""
 
+    # lines that start with this prefix are unsolicited events, not replies
+    EVENT_PREFIX = "!"
+    # time in seconds after which an idle I/O worker checks for events
+    EVENT_POLL_INTERVAL = 0.05
+
     def __init__(
-        self, port: str, baudrate: int = 9600, timeout: int = 3, dummy: bool = False
+        self,
+        port: str,
+        baudrate: int = 9600,
+        timeout: int = 3,
+        dummy: bool = False,
+        pipeline_window: int = 64,
+        threaded: bool = False,
+        ready_timeout: float = 5,
+        recorder: TrafficRecorder = None,
     ) -> None:
         """Initialize communication with the device.
 
@@ -18,14 +53,103 @@ class DevComm:
         :param timeout: Timeout in seconds.
         :param dummy: Do not communicate over serial but print send and use dummy values
             for receive.
+        :param pipeline_window: Maximum number of bytes that are sent to the device in
+            pipelined mode before waiting for a reply. Defaults to the size of the
+            Arduino serial receive buffer. Only queries are paced: commands without
+            a reply are written right away if no query is outstanding.
+        :param threaded: Start a background I/O worker that owns the serial port.
+            See `start_worker` for details.
+        :param ready_timeout: Maximum time in seconds to wait for the device to
+            answer after opening the port. `None` skips the readiness check.
+        :param recorder: Record all traffic with the device, see `controller.recorder`.
+
+        :raises TimeoutError: The device did not answer within `ready_timeout`.
         """
         self.terminator = "\n"
         self.dummy = dummy
+        self.pipeline_window = pipeline_window
+
+        # commands and replies are binary frames instead of text, see `framing`
+        self.binary_mode = False
+        # encoded bytes of frequently sent commands in text and in binary mode
+        self._precompiled = ({}, {})
+
+        # the device pushes unsolicited events, see `add_event_callback`
+        self.events_enabled = False
+        self._event_callbacks = []
+        self._pending_events = deque()
+
+        # latency and traffic of all calls, see `controller.metrics`
+        self.metrics = CommMetrics()
+        # every line or frame on the wire is recorded if set
+        self.recorder = recorder
+
+        # all access to the serial port is serialized through this lock
+        self._lock = threading.RLock()
+        self._worker = None
+        self._worker_queue = None
 
         if not dummy:
-            self.dev = serial.Serial(port=port, baudrate=baudrate, timeout=timeout)
+            self.dev = serial.serial_for_url(port, baudrate=baudrate, timeout=timeout)
+            if ready_timeout is not None:
+                self._wait_until_ready(ready_timeout)
+
+        if threaded:
+            self.start_worker()
+
+    def add_event_callback(self, callback: Callable) -> None:
+        """Register a function that is called for every unsolicited event.
+
+        Events are read along with the replies to commands. While the I/O worker
+        is running, it also checks for events whenever it is idle. Otherwise,
+        call `poll_events` to check for events without sending a command.
+        Callbacks are called after the command that read the event has finished,
+        from the thread that sent it or from the I/O worker. They should return
+        quickly.
+
+        :param callback: Function that takes the event as the only argument.
+        """
+        self._event_callbacks.append(callback)
+
+    def poll_events(self) -> None:
+        """Read all events that arrived in the meantime and dispatch them."""
+        self._call(self._read_pending_events)
+
+    def remove_event_callback(self, callback: Callable) -> None:
+        """Remove a function that was registered with `add_event_callback`.
+
+        :param callback: Registered function.
+        """
+        self._event_callbacks.remove(callback)
+
+    @property
+    def threaded(self) -> bool:
+        """Return if the background I/O worker is running."""
+        return self._worker is not None
+
+    def close(self) -> None:
+        """Stop the I/O worker and close the serial port."""
+        self.stop_worker()
+        if not self.dummy:
+            self.dev.close()
 
-        time.sleep(1)
+    def pipeline(self) -> "Pipeline":
+        """Return a new pipeline to queue commands and send them back-to-back.
+
+        :return: Empty pipeline for this device.
+
+        Example:
+        -------
+            >>> device = DevComm("/dev/ttyACM0")
+            >>> with device.pipeline() as pipe:
+            ...     pipe.sendcmd("DO0 1")
+            ...     pipe.query("DO0?")
+            ...     pipe.query("SWLockout?")
+            >>> pipe.results
+            ['1', '0']
+
+        """
+        return Pipeline(self)
 
     def query(self, cmd: str) -> str:
         """Query the device by sending a given command and returning the answer.
@@ -34,18 +158,486 @@ class DevComm:
 
         :return: Decoded answer.
         """
-        self.sendcmd(cmd)
+        return self._call(self._query, cmd)
+
+    def query_many(self, cmds: List[str]) -> List[str]:
+        """Send several queries back-to-back and return all answers.
+
+        :param cmds: Queries to send.
+
+        :return: Decoded answers in the same order as the queries.
+        """
+        pipe = self.pipeline()
+        for cmd in cmds:
+            pipe.query(cmd)
+        return pipe.execute()
+
+    def sendcmd(self, cmd: str) -> None:
+        """Send a command string to the device.
+
+        :param cmd: Command to send.
+        """
+        self._call(self._write, cmd)
+
+    def start_worker(self) -> None:
+        """Start a background I/O worker that owns the serial port.
+
+        While the worker is running, all commands, queries, and pipelines from any
+        thread are executed by the worker one after the other. Use `submit` to
+        send commands without blocking the calling thread.
+        """
+        if self._worker is not None:
+            return
+        self._worker_queue = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._run_worker,
+            args=(self._worker_queue,),
+            name="DevComm-io",
+            daemon=True,
+        )
+        self._worker.start()
+
+    def stop_worker(self) -> None:
+        """Stop the I/O worker after all submitted commands are executed."""
+        if self._worker is None:
+            return
+        worker, worker_queue = self._worker, self._worker_queue
+        self._worker = None
+        self._worker_queue = None
+        worker_queue.put(None)
+        if worker is not threading.current_thread():
+            worker.join()
+            # execute functions that were submitted while the worker was stopping
+            self._run_worker(worker_queue, block=False)
+
+    def submit(self, cmd: str, expect_reply: bool = True) -> Future:
+        """Submit a command without waiting for it to be executed.
+
+        If the I/O worker is not running, the command is executed right away.
+
+        :param cmd: Command to send.
+        :param expect_reply: Whether the device answers the command.
+
+        :return: Future with the decoded answer, or `None` if no answer is expected.
+
+        Example:
+        -------
+            >>> device = DevComm("/dev/ttyACM0", threaded=True)
+            >>> future = device.submit("SWLockout?")
+            >>> future.result(timeout=5)
+            '0'
+
+        """
+        fn = self._query if expect_reply else self._write
+        future = Future()
+        worker_queue = self._worker_queue
+        if worker_queue is not None:
+            worker_queue.put((future, fn, (cmd,)))
+            return future
+
+        future.set_running_or_notify_cancel()
+        try:
+            with self._lock:
+                future.set_result(fn(cmd))
+        except Exception as err:
+            future.set_exception(err)
+        self._dispatch_events()
+        return future
+
+    def _call(self, fn: Callable, *args):
+        """Execute a function that talks to the device and return its result.
+
+        If the I/O worker is running, the function is executed by the worker and
+        the calling thread waits for the result. Otherwise, it is executed in the
+        calling thread while holding the lock of the serial port.
+
+        :param fn: Function to execute.
+        :param args: Arguments of the function.
+
+        :return: Return value of the function.
+        """
+        worker_queue = self._worker_queue
+        if worker_queue is None or self._worker is threading.current_thread():
+            try:
+                with self._lock:
+                    return fn(*args)
+            finally:
+                self._dispatch_events()
+
+        future = Future()
+        worker_queue.put((future, fn, args))
+        return future.result()
+
+    def _dispatch_events(self) -> None:
+        """Call the registered callbacks for all events that were read."""
+        while self._pending_events:
+            event = self._pending_events.popleft()
+            for callback in list(self._event_callbacks):
+                try:
+                    callback(event)
+                except Exception as err:
+                    warnings.warn(f"Event callback failed: {err!r}", stacklevel=2)
+
+    def _encode(self, cmd: str) -> bytes:
+        """Encode a command for the wire, as text or as binary frame.
+
+        :param cmd: Command to encode.
+
+        :return: Bytes to write.
+        """
+        data = self._precompiled[self.binary_mode].get(cmd)
+        if data is not None:
+            return data
+        if self.binary_mode:
+            return framing.encode_command(cmd)
+        return f"{cmd}{self.terminator}".encode()
+
+    def _execute_pipeline(self, commands: List[Tuple[str, bool]]) -> List[str]:
+        """Write queued commands back-to-back and read the replies in FIFO order.
+
+        :param commands: List of tuples with command and whether a reply is expected.
+
+        :return: Decoded answers of all queries in the order they were queued.
+        """
+        return self._call(self._run_pipeline, commands)
+
+    def _precompile(self, cmds) -> None:
+        """Encode commands once for text and binary mode, see `_encode`.
+
+        :param cmds: Commands that are sent often.
+        """
+        text, binary = self._precompiled
+        for cmd in cmds:
+            text[cmd] = f"{cmd}{self.terminator}".encode()
+            try:
+                binary[cmd] = framing.encode_command(cmd)
+            except ValueError:
+                pass
+
+    def _query(self, cmd: str) -> str:
+        """Send a query and read the answer, the caller must own the port.
+
+        :param cmd: Command to start querying.
+
+        :return: Decoded answer.
+        """
         if self.dummy:
+            self._write(cmd)
             return "0"
+        return self._timed(cmd, self._send_and_read, self._encode(cmd))
+
+    def _parse_event(self, event: str):
+        """Parse an unsolicited event, the caller must own the port.
+
+        :param event: Event without prefix.
+
+        :return: Parsed event, `None` to drop it.
+        """
+        return event
+
+    def _read_pending_events(self) -> None:
+        """Read everything that arrived, the caller must own the port.
+
+        Events are queued for dispatching, stale replies are dropped.
+        """
+        if self.dummy:
+            return
+        while self.dev.in_waiting:
+            self._read_reply()
+
+    def _read_reply(self) -> str:
+        """Read one line or frame from the device and queue it if it is an event.
+
+        :return: Decoded line without the terminator.
+        """
+        if self.binary_mode:
+            frame = framing.read_frame(self.dev)
+            if frame is None:
+                return ""
+            self.metrics.bytes_read += len(frame[1]) + 3
+            if self.recorder is not None:
+                self.recorder.record(READ, framing.encode_frame(*frame))
+            line = framing.decode_reply(*frame)
         else:
-            return self.dev.readline().decode("utf-8").rstrip()
+            data = self.dev.readline()
+            self.metrics.bytes_read += len(data)
+            if self.recorder is not None and data:
+                self.recorder.record(READ, data)
+            line = data.decode("utf-8").rstrip()
 
-    def sendcmd(self, cmd: str) -> None:
-        """Send a command string to the device.
+        if line.startswith(self.EVENT_PREFIX):
+            event = self._parse_event(line[len(self.EVENT_PREFIX) :])
+            if event is not None:
+                self._pending_events.append(event)
+        return line
+
+    def _readline(self) -> str:
+        """Read one reply from the device and decode it.
+
+        In binary mode, the reply frame is translated into the text answer.
+        Unsolicited events are queued and skipped.
+
+        :return: Decoded line without the terminator.
+        """
+        while True:
+            line = self._read_reply()
+            if not line.startswith(self.EVENT_PREFIX):
+                return line
+
+    def _retire_oldest(
+        self, in_flight: List[Tuple[int, bool]], replies: List[str]
+    ) -> List[Tuple[int, bool]]:
+        """Read the reply of the oldest outstanding query in the pipeline.
+
+        :param in_flight: Commands that were sent but not yet retired.
+        :param replies: List to append the reply to.
+
+        :return: Commands that are still in flight.
+        """
+        idx = next(it for it, (_, reply) in enumerate(in_flight) if reply)
+        replies.append(self._readline())
+        return in_flight[idx + 1 :]
+
+    def _run_pipeline(self, commands: List[Tuple[str, bool]]) -> List[str]:
+        """Execute a pipeline, the caller must own the port.
+
+        Commands are written without waiting for replies until `pipeline_window`
+        bytes are in flight. Then, the oldest outstanding reply is read, which
+        retires all commands up to and including that query. Without outstanding
+        queries there is nothing to wait for, and commands are written right away.
+
+        :param commands: List of tuples with command and whether a reply is expected.
+
+        :return: Decoded answers of all queries in the order they were queued.
+        """
+        if self.dummy:
+            replies = []
+            for cmd, expect_reply in commands:
+                self._write(cmd)
+                if expect_reply:
+                    replies.append("0")
+            return replies
+        return self._timed("PIPELINE", self._stream_pipeline, commands)
+
+    def _stream_pipeline(self, commands: List[Tuple[str, bool]]) -> List[str]:
+        """Write a pipeline within the window, the caller must own the port.
+
+        :param commands: List of tuples with command and whether a reply is expected.
+
+        :return: Decoded answers of all queries in the order they were queued.
+        """
+        replies = []
+        in_flight = []  # (number of bytes, expects reply) of unretired commands
+        for cmd, expect_reply in commands:
+            data = self._encode(cmd)
+            while (
+                in_flight
+                and sum(n for n, _ in in_flight) + len(data) > self.pipeline_window
+                and any(reply for _, reply in in_flight)
+            ):
+                in_flight = self._retire_oldest(in_flight, replies)
+            self._send(data)
+            in_flight.append((len(data), expect_reply))
+
+        while any(reply for _, reply in in_flight):
+            in_flight = self._retire_oldest(in_flight, replies)
+
+        return replies
+
+    def _run_worker(self, worker_queue: queue.Queue, block: bool = True) -> None:
+        """Execute submitted functions one after the other until stopped.
+
+        :param worker_queue: Queue with tuples of future, function, and arguments.
+            `None` stops the worker.
+        :param block: Wait for new items. If `False`, return once the queue is empty.
+        """
+        while True:
+            try:
+                item = worker_queue.get(
+                    block=block, timeout=self.EVENT_POLL_INTERVAL if block else None
+                )
+            except queue.Empty:
+                if not block:
+                    return
+                if self.events_enabled:
+                    with self._lock:
+                        self._read_pending_events()
+                    self._dispatch_events()
+                continue
+            if item is None:
+                if block:
+                    return
+                continue
+            future, fn, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with self._lock:
+                    future.set_result(fn(*args))
+            except Exception as err:
+                future.set_exception(err)
+            self._dispatch_events()
+
+    def _send(self, data: bytes) -> None:
+        """Write encoded bytes to the device, the caller must own the port.
+
+        :param data: Bytes to write.
+        """
+        self.dev.write(data)
+        self.metrics.bytes_written += len(data)
+        if self.recorder is not None:
+            self.recorder.record(WRITE, data)
+
+    def _send_and_read(self, data: bytes) -> str:
+        """Write an encoded query and read the answer, the caller must own the port.
+
+        :param data: Bytes to write.
+
+        :return: Decoded answer.
+        """
+        self._send(data)
+        return self._readline()
+
+    def _timed(self, cmd: str, fn: Callable, *args):
+        """Execute a call to the device and record its metrics.
+
+        A call times out if it returns an empty reply and is malformed if a
+        reply cannot be decoded.
+
+        :param cmd: Command of the call, used to name it in the metrics.
+        :param fn: Function that talks to the device.
+        :param args: Arguments of the function.
+
+        :return: Return value of the function.
+        """
+        metrics = self.metrics
+        written, read = metrics.bytes_written, metrics.bytes_read
+        outcome = OUTCOME_ERROR
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except (framing.FrameError, UnicodeDecodeError):
+            outcome = OUTCOME_MALFORMED
+            raise
+        else:
+            timed_out = result == "" or (isinstance(result, list) and "" in result)
+            outcome = OUTCOME_TIMEOUT if timed_out else OUTCOME_OK
+            return result
+        finally:
+            metrics.record(
+                CallTiming(
+                    cmd,
+                    command_name(cmd),
+                    time.perf_counter() - start,
+                    outcome,
+                    metrics.bytes_written - written,
+                    metrics.bytes_read - read,
+                )
+            )
+
+    def _wait_until_ready(self, deadline: float) -> None:
+        """Poll the identity of the device until it answers.
+
+        Opening the port can reset the Arduino, which then ignores commands until
+        the firmware has started. The identity is queried with a short, growing
+        backoff until an answer arrives.
+
+        :param deadline: Maximum time in seconds to wait for an answer.
+
+        :raises TimeoutError: The device did not answer in time.
+        """
+        timeout = self.dev.timeout
+        end = time.monotonic() + deadline
+        backoff = 0.1
+        attempts = 0
+        try:
+            while True:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"Device on port {self.dev.port} did not answer "
+                        f"within {deadline} s."
+                    )
+
+                self.dev.timeout = min(2 * backoff, remaining)
+                self.dev.reset_input_buffer()
+                self._send(f"*IDN?{self.terminator}".encode())
+                attempts += 1
+                if self._readline():
+                    break
+                backoff = min(2 * backoff, 0.5)
+
+            # discard late answers to earlier attempts
+            if attempts > 1:
+                while self._readline():
+                    pass
+        finally:
+            self.dev.timeout = timeout
+
+    def _write(self, cmd: str) -> None:
+        """Write a command to the device, the caller must own the port.
 
         :param cmd: Command to send.
         """
         if self.dummy:
             print(f"Sending: {cmd}")
         else:
-            self.dev.write(f"{cmd}{self.terminator}".encode())
+            self._timed(cmd, self._send, self._encode(cmd))
+
+
+class Pipeline:
+    """Queue of commands that are sent to the device back-to-back.
+
+    Commands are only queued until the pipeline is executed, either by calling
+    `execute` or by leaving the `with` block. Replies are matched to the queued
+    queries in FIFO order and are available in `results`.
+    """
+
+    def __init__(self, parent: DevComm) -> None:
+        """Initialize an empty pipeline.
+
+        :param parent: Device to send the commands to.
+        """
+        self._parent = parent
+        self._queue = []
+        self.results = []
+
+    def __enter__(self) -> "Pipeline":
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        """Execute the pipeline if no exception occurred."""
+        if exc_type is None:
+            self.execute()
+
+    def __len__(self) -> int:
+        """Return the number of queued commands."""
+        return len(self._queue)
+
+    def execute(self) -> List[str]:
+        """Send all queued commands and collect the replies.
+
+        :return: Decoded answers of all queries in the order they were queued.
+        """
+        queue, self._queue = self._queue, []
+        self.results = self._parent._execute_pipeline(queue)
+        return self.results
+
+    def query(self, cmd: str) -> int:
+        """Queue a query.
+
+        :param cmd: Query to send.
+
+        :return: Index of the answer in `results` after execution.
+        """
+        idx = sum(reply for _, reply in self._queue)
+        self._queue.append((cmd, True))
+        return idx
+
+    def sendcmd(self, cmd: str) -> None:
+        """Queue a command that expects no reply.
+
+        :param cmd: Command to send.
+        """
+        self._queue.append((cmd, False))
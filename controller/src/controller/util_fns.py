@@ -3,7 +3,9 @@
 ProxyList is taken from InstrumentKit: https://github.com/Galvant/InstrumentKit
 """
 
+import re
 from enum import Enum, IntEnum
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
 
 
 class ProxyList:
@@ -34,6 +36,8 @@ class ProxyList:
         self._parent = parent
         self._proxy_cls = proxy_cls
         self._valid_set = valid_set
+        # proxies are created once per key and reused afterwards
+        self._proxies = {}
 
         # FIXME: This only checks the next level up the chain!
         if hasattr(valid_set, "__bases__"):
@@ -46,10 +50,19 @@ class ProxyList:
     def __iter__(self):
         """Iterate."""
         for idx in self._valid_set:
-            yield self._proxy_cls(self._parent, idx)
+            if self._isenum:
+                yield self._proxy_cls(self._parent, idx)
+            else:
+                yield self[idx]
 
     def __getitem__(self, idx):
         """Get an individual item."""
+        try:
+            return self._proxies[idx]
+        except (KeyError, TypeError):
+            pass
+
+        key = idx
         # If we have an enum, try to normalize by using getitem. This will
         # allow for things like 'x' to be used instead of enum.x.
         if self._isenum:
@@ -66,8 +79,342 @@ class ProxyList:
         else:
             if idx not in self._valid_set:
                 raise IndexError(f"Index out of range. Must be in {self._valid_set}.")
-        return self._proxy_cls(self._parent, idx)
+        proxy = self._proxy_cls(self._parent, idx)
+        self._proxies[key] = proxy
+        return proxy
 
     def __len__(self):
         """Length of the valid set."""
         return len(self._valid_set)
+
+
+def mask_commands(
+    values: int, mask: int, num_channels: int, mask_command: bool
+) -> List[str]:
+    """Return the commands that set the channels in the mask.
+
+    :param values: Bitmask with the states.
+    :param mask: Bitmask with the channels to set, not empty.
+    :param num_channels: Number of available channels.
+    :param mask_command: Whether the firmware knows the mask command.
+
+    :return: One mask command, or one command per channel for firmware that
+        does not know the mask command.
+    """
+    if mask_command:
+        if mask == (1 << num_channels) - 1:
+            return [f"MASKDOut {values:X}"]
+        return [f"MASKDOut {values:X},{mask:X}"]
+    return [
+        f"DO{ch} {values >> ch & 1}" for ch in range(num_channels) if mask >> ch & 1
+    ]
+
+
+def parse_firmware_version(identity: str) -> Tuple[int, int, int]:
+    """Parse the firmware version from the identity string of the box.
+
+    :param identity: Answer of the box to `*IDN?`.
+
+    :return: Firmware version, e.g., (0, 3, 0). (0, 0, 0) if unknown.
+    """
+    match = re.search(r"Firmware v(\d+)\.(\d+)\.(\d+)", identity)
+    if match is None:
+        return 0, 0, 0
+    return tuple(int(x) for x in match.groups())
+
+
+def parse_states(reply: str) -> List[bool]:
+    """Parse the reply to `ALLDOut?` into a list of states.
+
+    :param reply: Comma separated states, e.g., `1,0,1`.
+
+    :return: States of all channels.
+    """
+    return [bool(int(x)) for x in reply.split(",")]
+
+
+def parse_status(replies: List[str], num_channels: int) -> "DeviceStatus":
+    """Parse the replies to the status queries.
+
+    :param replies: Reply to `STATus?`, or the replies to `ALLDOut?`,
+        `INTERLOCKState?`, and `SWLockout?` for firmware older than `v0.3.0`.
+    :param num_channels: Number of available channels.
+
+    :return: Snapshot of the status of the box.
+    """
+    if len(replies) == 1:
+        states, interlock, software_lockout = replies[0].split(",")
+        mask = StateMask.from_hex(states, num_channels)
+    else:
+        states, interlock, software_lockout = replies
+        mask = StateMask.from_list(parse_states(states)[:num_channels])
+    return DeviceStatus(mask, bool(int(interlock)), bool(int(software_lockout)))
+
+
+def scpi_pattern(token: str) -> "re.Pattern":
+    """Convert a registered SCPI command into a regular expression.
+
+    Upper case letters form the short form of a command, the lower case rest is
+    optional. `#` stands for a numeric suffix. Matching is case-insensitive.
+
+    :param token: Command as registered in the firmware, e.g., `DOut#?`.
+
+    :return: Compiled regular expression that matches the full header.
+    """
+    pattern = ""
+    for part in re.findall(r"[A-Z*]+[a-z]*|#|\?|:", token):
+        if part == "#":
+            pattern += r"(\d+)"
+        elif part in ("?", ":", "*"):
+            pattern += re.escape(part)
+        else:
+            short = part.rstrip("abcdefghijklmnopqrstuvwxyz")
+            rest = part[len(short) :]
+            pattern += re.escape(short.upper())
+            if rest:
+                pattern += f"(?:{rest.upper()})?"
+    return re.compile(f"^{pattern}$")
+
+
+def states_to_mask(
+    states: Union[Dict[int, bool], int], num_channels: int
+) -> Tuple[int, int]:
+    """Convert channel states into a value and a selection bitmask.
+
+    :param states: Dictionary with channel numbers as keys and states as values,
+        or an integer bitmask with the states of all channels (bit n is channel n).
+    :param num_channels: Number of available channels.
+
+    :return: Bitmask with the states and bitmask with the channels to set.
+
+    :raises IndexError: A channel is out of range.
+    :raises ValueError: The integer bitmask has bits set above the last channel.
+    """
+    all_channels = (1 << num_channels) - 1
+    if not isinstance(states, dict):
+        values = int(states)
+        if values & ~all_channels:
+            raise ValueError(
+                f"Bitmask {values:#x} has bits set above channel {num_channels - 1}."
+            )
+        return values, all_channels
+
+    values = 0
+    mask = 0
+    for ch, state in states.items():
+        if ch not in range(num_channels):
+            raise IndexError(f"Index out of range. Must be in {range(num_channels)}.")
+        mask |= 1 << ch
+        values |= int(bool(state)) << ch
+    return values, mask
+
+
+class StateMask:
+    """Immutable set of channel states backed by an integer bitmask.
+
+    Bit n of the integer is the state of channel n. The mask behaves like a
+    read-only list of booleans, but comparing, counting, and diffing states is
+    done on the integer directly.
+
+    :param value: Bitmask with the channel states.
+    :param size: Number of channels.
+
+    Example:
+    -------
+        >>> mask = StateMask(0b101, size=4)
+        >>> list(mask)
+        [True, False, True, False]
+        >>> mask.popcount()
+        2
+        >>> mask.diff(StateMask(0b001, size=4))
+        [2]
+
+    """
+
+    __slots__ = ("_value", "_size")
+
+    def __init__(self, value: int = 0, size: int = 16) -> None:
+        """Initialize the mask."""
+        self._size = int(size)
+        self._value = int(value) & ((1 << self._size) - 1)
+
+    @classmethod
+    def from_hex(cls, value: str, size: int = 16) -> "StateMask":
+        """Create a mask from a hexadecimal string, e.g., the answer to `MASKDOut?`.
+
+        :param value: Hexadecimal bitmask.
+        :param size: Number of channels.
+
+        :return: New mask.
+        """
+        return cls(int(value, 16), size)
+
+    @classmethod
+    def from_list(cls, states: Iterable) -> "StateMask":
+        """Create a mask from a list of states.
+
+        :param states: States of all channels, starting with channel 0.
+
+        :return: New mask with as many channels as states are given.
+        """
+        value = 0
+        size = 0
+        for it, state in enumerate(states):
+            value |= int(bool(state)) << it
+            size += 1
+        return cls(value, size)
+
+    @property
+    def size(self) -> int:
+        """Return the number of channels."""
+        return self._size
+
+    @property
+    def value(self) -> int:
+        """Return the bitmask as an integer."""
+        return self._value
+
+    def __eq__(self, other) -> bool:
+        """Compare with another mask, a list of states, or an integer."""
+        if isinstance(other, StateMask):
+            return self._value == other._value and self._size == other._size
+        if isinstance(other, int):
+            return self._value == other
+        if isinstance(other, (list, tuple)):
+            return self.to_list() == [bool(state) for state in other]
+        return NotImplemented
+
+    def __getitem__(self, idx: int) -> bool:
+        """Get the state of a channel."""
+        if isinstance(idx, slice):
+            return self.to_list()[idx]
+        if idx < 0:
+            idx += self._size
+        if not 0 <= idx < self._size:
+            raise IndexError(f"Index out of range. Must be in {range(self._size)}.")
+        return bool(self._value >> idx & 1)
+
+    def __hash__(self) -> int:
+        """Hash the mask like its integer, to which it compares equal."""
+        return hash(self._value)
+
+    def __index__(self) -> int:
+        """Return the bitmask as an integer."""
+        return self._value
+
+    def __int__(self) -> int:
+        """Return the bitmask as an integer."""
+        return self._value
+
+    def __iter__(self):
+        """Iterate over the states of all channels."""
+        for it in range(self._size):
+            yield bool(self._value >> it & 1)
+
+    def __len__(self) -> int:
+        """Return the number of channels."""
+        return self._size
+
+    def __repr__(self) -> str:
+        """Represent the mask."""
+        return f"StateMask(0x{self._value:X}, size={self._size})"
+
+    def __xor__(self, other) -> "StateMask":
+        """Return a mask with all channels that differ between two masks."""
+        return StateMask(self._value ^ int(other), self._size)
+
+    __rxor__ = __xor__
+
+    def diff(self, other) -> List[int]:
+        """Return the channels whose states differ from another mask.
+
+        :param other: Mask or integer bitmask to compare with.
+
+        :return: Sorted list of channel numbers.
+        """
+        return (self ^ other).on_channels()
+
+    def on_channels(self) -> List[int]:
+        """Return the channels that are on.
+
+        :return: Sorted list of channel numbers.
+        """
+        return [it for it in range(self._size) if self._value >> it & 1]
+
+    def popcount(self) -> int:
+        """Return the number of channels that are on."""
+        return bin(self._value).count("1")
+
+    def to_list(self) -> List[bool]:
+        """Return the states as a list of booleans."""
+        return list(self)
+
+
+class DeviceStatus(NamedTuple):
+    """Snapshot of the channel states and the safety states of the box.
+
+    :param states: States of all channels.
+    :param interlock: Whether the interlock is triggered.
+    :param software_lockout: Whether the software lockout is active.
+    """
+
+    states: StateMask
+    interlock: bool
+    software_lockout: bool
+
+    @property
+    def locked(self) -> bool:
+        """Return if channels cannot be switched by software."""
+        return self.interlock or self.software_lockout
+
+
+class DeviceEvent(NamedTuple):
+    """Unsolicited event that the box sends when its status changes.
+
+    :param source: What changed the status: `RF` for the remote, `INTERLOCK` for
+        the interlock, `LOCKOUT` for the software lockout, or `PROGRAM` when the
+        pulse program finished.
+    :param status: Status of the box after the change.
+    """
+
+    source: str
+    status: DeviceStatus
+
+
+class ProgramProgress(NamedTuple):
+    """Progress of the pulse program on the box.
+
+    :param running: Whether the program is running.
+    :param step: Index of the next step of the current run.
+    :param cycle: Number of completed runs.
+    :param length: Number of steps of the program.
+    :param repeat: Number of runs, 0 if the program runs until it is aborted.
+    """
+
+    running: bool
+    step: int
+    cycle: int
+    length: int
+    repeat: int
+
+    @property
+    def finished(self) -> bool:
+        """Return if the program completed all of its runs."""
+        return not self.running and 0 < self.repeat <= self.cycle
+
+
+class StepTiming(NamedTuple):
+    """Planned and actual time of a step of a sequence.
+
+    :param planned: Time in seconds from the start of the sequence at which the
+        step should be sent.
+    :param actual: Time in seconds from the start at which it was sent.
+    """
+
+    planned: float
+    actual: float
+
+    @property
+    def error(self) -> float:
+        """Return how late the step was sent in seconds."""
+        return self.actual - self.planned
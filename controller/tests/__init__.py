@@ -21,6 +21,13 @@ def expected_communication(command: List = [], response: List = []):  # noqa: B0
     terminator = "\n"
 
     mock_dev = MockSerial()
+    # answer the readiness check when connecting
+    mock_dev.stub(
+        receive_bytes=bytes("*IDN?" + terminator, "utf-8"),
+        send_bytes=bytes(
+            "DigIOBox, Hardware v0.1.0, Firmware v0.3.0" + terminator, "utf-8"
+        ),
+    )
     mock_dev.open()
 
     dev = DigIOBoxComm(mock_dev.port)
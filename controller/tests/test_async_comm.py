@@ -0,0 +1,219 @@
+"""Test asyncio communications with device."""
+
+import asyncio
+from typing import List
+from unittest import mock
+
+import pytest
+
+from controller import AsyncDigIOBoxComm, StateMask
+
+
+def run_with_device(coro_fn, command: List = [], response: List = []):  # noqa: B006
+    """Run a coroutine with a device whose streams are mocked.
+
+    :param coro_fn: Coroutine function that takes the device as argument.
+    :param command: List of commands expected to be sent to device.
+    :param response: List of responses from device.
+
+    :return: Return value of the coroutine.
+    """
+    terminator = "\n"
+
+    async def runner():
+        reader = asyncio.StreamReader()
+        for resp in response:
+            reader.feed_data(bytes(resp + terminator, "utf-8"))
+        writer = mock.MagicMock()
+        writer.drain = mock.AsyncMock()
+
+        dev = AsyncDigIOBoxComm(reader, writer, timeout=0.1)
+        retval = await coro_fn(dev)
+
+        calls = [mock.call(bytes(cmd + terminator, "utf-8")) for cmd in command]
+        writer.write.assert_has_calls(calls, any_order=False)
+        return retval
+
+    return asyncio.run(runner())
+
+
+def test_identify():
+    """Get firmware version."""
+
+    async def fn(dev):
+        return await dev.identify
+
+    assert run_with_device(fn, ["*IDN?"], ["DigIOBox,1.0"]) == "DigIOBox,1.0"
+
+
+def test_states():
+    """Get states of all channels."""
+
+    async def fn(dev):
+        return await dev.states
+
+    assert run_with_device(fn, ["ALLDOut?"], ["1,0,1"]) == [True, False, True]
+
+
+@pytest.mark.parametrize("state", [True, False])
+def test_channel_state(state):
+    """Set/Get channel state."""
+
+    async def fn(dev):
+        await dev.channel[3].set_state(state)
+        return await dev.channel[3].state
+
+    assert run_with_device(fn, [f"DO3 {int(state)}", "DO3?"], [f"{int(state)}"]) == (
+        state
+    )
+
+
+def test_all_off():
+    """Turn all channels off."""
+
+    async def fn(dev):
+        await dev.all_off()
+
+    run_with_device(fn, ["ALLOFF"])
+
+
+@pytest.mark.parametrize("state", [0, 1])
+def test_safety_states(state):
+    """Read state of the interlock and the software lockout."""
+
+    async def fn(dev):
+        return await dev.interlock_state, await dev.software_lockout
+
+    assert run_with_device(
+        fn, ["INTERLOCKState?", "SWLockout?"], [f"{state}", f"{state}"]
+    ) == (bool(state), bool(state))
+
+
+def test_set_states():
+    """Set several channels with one mask command."""
+
+    async def fn(dev):
+        await dev.set_states({0: True, 1: False})
+
+    run_with_device(
+        fn,
+        ["*IDN?", "MASKDOut 1,3"],
+        ["DigIOBox, Hardware v0.1.0, Firmware v0.3.0"],
+    )
+
+
+def test_set_states_old_firmware():
+    """Fall back to individual channel commands on old firmware."""
+
+    async def fn(dev):
+        await dev.set_states({0: True, 1: False})
+
+    run_with_device(
+        fn,
+        ["*IDN?", "DO0 1", "DO1 0"],
+        ["DigIOBox, Hardware v0.1.0, Firmware v0.2.0"],
+    )
+
+
+def test_concurrent_queries():
+    """Match answers to concurrent queries in order."""
+
+    async def fn(dev):
+        return await asyncio.gather(dev.channel[0].state, dev.software_lockout)
+
+    assert run_with_device(fn, ["DO0?", "SWLockout?"], ["1", "0"]) == [True, False]
+
+
+def test_timeout():
+    """Raise a timeout error if the device does not answer."""
+
+    async def fn(dev):
+        return await dev.states
+
+    with pytest.raises(asyncio.TimeoutError):
+        run_with_device(fn)
+
+
+def test_timeout_discards_late_answers():
+    """Do not take late answers to a timed out query as answers to the next one."""
+
+    async def fn(dev):
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.15, dev._reader.feed_data, b"1\n")
+        with pytest.raises(asyncio.TimeoutError):
+            await dev.software_lockout
+        dev._reader.feed_data(b"0\n")
+        return await dev.interlock_state
+
+    assert run_with_device(fn, ["SWLockout?", "INTERLOCKState?"]) is False
+
+
+def test_close():
+    """Wait until the stream is closed."""
+
+    async def fn(dev):
+        writer = dev._writer
+        writer.wait_closed = mock.AsyncMock()
+        await dev.close()
+        writer.close.assert_called_once()
+        writer.wait_closed.assert_awaited_once()
+
+    run_with_device(fn)
+
+
+def test_channel_type_error():
+    """Raise TypeError when channel is not initialized properly."""
+    with pytest.raises(TypeError):
+        _ = AsyncDigIOBoxComm.Channel("foo", 0)
+
+
+def test_dummy(capsys):
+    """Print commands and return dummy answers in dummy mode."""
+
+    async def fn():
+        dev = await AsyncDigIOBoxComm.open("dummy", dummy=True)
+        await dev.channel[0].set_state(True)
+        return await dev.channel[0].state, await dev.identify
+
+    assert asyncio.run(fn()) == (False, "DigIOBox Dummy")
+    assert capsys.readouterr().out == "Sending: DO0 1\nSending: DO0?\n"
+
+
+def test_status_dummy():
+    """Return a status with all channels off in dummy mode."""
+
+    async def fn():
+        dev = await AsyncDigIOBoxComm.open("dummy", dummy=True)
+        return await dev.status()
+
+    assert asyncio.run(fn()) == (StateMask(0, 16), False, False)
+
+
+def test_state_mask():
+    """Get states of all channels as a hexadecimal mask."""
+
+    async def fn(dev):
+        return await dev.state_mask
+
+    mask = run_with_device(
+        fn,
+        ["*IDN?", "MASKDOut?"],
+        ["DigIOBox, Hardware v0.1.0, Firmware v0.3.0", "5"],
+    )
+    assert mask.on_channels() == [0, 2]
+
+
+def test_status():
+    """Read states and safety states with one query."""
+
+    async def fn(dev):
+        return await dev.status()
+
+    status = run_with_device(
+        fn,
+        ["*IDN?", "STATus?"],
+        ["DigIOBox, Hardware v0.1.0, Firmware v0.3.0", "5,1,0"],
+    )
+    assert status.states.on_channels() == [0, 2]
+    assert status.interlock
+    assert not status.software_lockout
@@ -1,7 +1,18 @@
 """Test communications with device."""
 
+from unittest import mock
+
 import pytest
 
+from controller import (
+    DeviceEvent,
+    DeviceStatus,
+    DigIOBoxComm,
+    ProgramProgress,
+    StateMask,
+    framing,
+)
+
 from . import expected_communication
 
 # PROPERTIES #
@@ -20,6 +31,22 @@ def test_num_channels_default():
         assert dev.num_channels == 16
 
 
+@pytest.mark.parametrize(
+    "identity,version",
+    [
+        ("DigIOBox, Hardware v0.1.0, Firmware v0.2.0", (0, 2, 0)),
+        ("DigIOBox, Hardware v0.1.0, Firmware v0.3.0", (0, 3, 0)),
+        ("DigIOBox, 1.0", (0, 0, 0)),
+    ],
+)
+def test_firmware_version(identity, version):
+    """Parse the firmware version from the identity string and cache it."""
+    with expected_communication(command=["*IDN?"], response=[identity]) as dev:
+        assert dev.firmware_version == version
+        assert dev.firmware_version == version
+        assert dev.dev.write.call_count == 1
+
+
 def test_identify():
     """Get firmware version."""
     with expected_communication(
@@ -54,6 +81,38 @@ def test_states():
         ]
 
 
+def test_state_mask():
+    """Get states of all channels as a hexadecimal mask."""
+    with expected_communication(
+        ["*IDN?", "MASKDOut?"],
+        ["DigIOBox, Hardware v0.1.0, Firmware v0.3.0", "8005"],
+    ) as dev:
+        mask = dev.state_mask
+        assert mask.on_channels() == [0, 2, 15]
+        assert len(mask) == 16
+
+
+def test_state_mask_old_firmware():
+    """Convert the list of all states to a mask on old firmware."""
+    with expected_communication(
+        ["*IDN?", "ALLDOut?"],
+        [
+            "DigIOBox, Hardware v0.1.0, Firmware v0.2.0",
+            "1,0,1,0,0,0,0,0,0,0,0,0,0,0,0,1",
+        ],
+    ) as dev:
+        assert dev.state_mask == StateMask(0x8005, 16)
+
+
+def test_set_states_state_mask():
+    """Set all channels from a state mask."""
+    with expected_communication(
+        ["*IDN?", "MASKDOut 8005"],
+        ["DigIOBox, Hardware v0.1.0, Firmware v0.3.0"],
+    ) as dev:
+        dev.set_states(StateMask(0x8005, 16))
+
+
 # METHODS #
 
 
@@ -63,6 +122,288 @@ def test_all_off():
         dev.all_off()
 
 
+def test_negotiate_baudrate():
+    """Switch to the fastest baud rate up to the given maximum."""
+    with expected_communication(
+        command=["*IDN?", "BAUDrate:LIST?", "BAUDrate 57600", "BAUDrate?"],
+        response=[
+            "DigIOBox, Hardware v0.1.0, Firmware v0.3.0",
+            "9600,57600,115200",
+            "57600",
+            "57600",
+        ],
+    ) as dev:
+        assert dev.negotiate_baudrate(57600) == 57600
+        assert dev.baudrate == 57600
+
+
+def test_negotiate_baudrate_fallback():
+    """Fall back to a slower rate if the box does not answer at the new one."""
+    with expected_communication(
+        command=[
+            "*IDN?",
+            "BAUDrate:LIST?",
+            "BAUDrate 115200",
+            "BAUDrate?",
+            "BAUDrate 57600",
+            "BAUDrate?",
+        ],
+        response=[
+            "DigIOBox, Hardware v0.1.0, Firmware v0.3.0",
+            "9600,57600,115200",
+            "115200",
+            "",
+            "57600",
+            "57600",
+        ],
+    ) as dev:
+        assert dev.negotiate_baudrate(115200) == 57600
+        assert dev.baudrate == 57600
+
+
+def test_negotiate_baudrate_old_firmware():
+    """Stay at the current baud rate with old firmware."""
+    with expected_communication(
+        command=["*IDN?"], response=["DigIOBox, Hardware v0.1.0, Firmware v0.2.0"]
+    ) as dev:
+        assert dev.negotiate_baudrate(115200) == 9600
+        assert dev.dev.write.call_count == 1
+
+
+def test_binary_mode_corrupted_reply():
+    """Repeat a query once if the reply frame is corrupted."""
+    with expected_communication() as dev:
+        dev.binary_mode = True
+        reply = framing.encode_frame(framing.OP_GET_DIG_IO, b"\x01")
+        dev.dev.read = mock.MagicMock(
+            side_effect=[reply[:2], reply[2:-1] + b"\x00", reply[:2], reply[2:]]
+        )
+        dev.dev.reset_input_buffer = mock.MagicMock()
+        assert dev.channel[3].state
+        dev.dev.write.assert_has_calls([mock.call(framing.encode_command("DO3?"))] * 2)
+        assert dev.metrics.malformed == 1
+        assert dev.metrics.latency["DO#?"].count == 2
+
+
+def test_events():
+    """Enable events and pass them on as parsed status snapshots."""
+    with expected_communication(
+        command=["*IDN?", "EVENTs 1", "SWLockout?", "EVENTs 0"],
+        response=[
+            "DigIOBox, Hardware v0.1.0, Firmware v0.3.0",
+            "!LOCKOUT 5,0,1",
+            "!RF malformed",
+            "1",
+        ],
+    ) as dev:
+        dev.cache_timeout = 10
+        events = []
+        dev.add_event_callback(events.append)
+        assert dev.enable_events()
+        assert dev.software_lockout
+        assert events == [
+            DeviceEvent("LOCKOUT", DeviceStatus(StateMask(5, 16), False, True))
+        ]
+        assert dev.channel[2].state  # from the cache
+        dev.disable_events()
+        assert not dev.events_enabled
+
+
+def test_events_old_firmware():
+    """Do not enable events with old firmware."""
+    with expected_communication(
+        command=["*IDN?"], response=["DigIOBox, Hardware v0.1.0, Firmware v0.2.0"]
+    ) as dev:
+        assert not dev.enable_events()
+        assert dev.dev.write.call_count == 1
+
+
+@pytest.mark.parametrize(
+    "states,cmd",
+    [
+        ({0: True, 3: True, 4: False}, "MASKDOut 9,19"),
+        ({15: True}, "MASKDOut 8000,8000"),
+        (0b101, "MASKDOut 5"),
+        (0xFFFF, "MASKDOut FFFF"),
+    ],
+)
+def test_set_states(states, cmd):
+    """Set several channels with one mask command."""
+    with expected_communication(
+        command=["*IDN?", cmd],
+        response=["DigIOBox, Hardware v0.1.0, Firmware v0.3.0"],
+    ) as dev:
+        dev.set_states(states)
+
+
+def test_set_states_old_firmware():
+    """Fall back to individual channel commands on old firmware."""
+    with expected_communication(
+        command=["*IDN?", "DO0 1", "DO3 1", "DO4 0"],
+        response=["DigIOBox, Hardware v0.1.0, Firmware v0.2.0"],
+    ) as dev:
+        dev.set_states({4: False, 0: True, 3: True})
+
+
+def test_set_states_empty():
+    """Send nothing if no channel is selected."""
+    with expected_communication() as dev:
+        dev.set_states({})
+        dev.dev.write.assert_not_called()
+
+
+def test_set_states_index_error():
+    """Raise IndexError if a channel is out of range."""
+    with expected_communication() as dev:
+        with pytest.raises(IndexError):
+            dev.set_states({16: True})
+
+
+def test_set_states_value_error():
+    """Raise ValueError if a bitmask has bits set above the last channel."""
+    with expected_communication() as dev:
+        with pytest.raises(ValueError):
+            dev.set_states(0x1FFFF)
+
+
+def test_apply_mask_atomic():
+    """Switch channels with one mask command and read the skew bound once."""
+    with expected_communication(
+        command=["*IDN?", "MASKDOut 9,19", "MASKDOut:SKEW?"],
+        response=["DigIOBox, Hardware v0.1.0, Firmware v0.3.0", "3750"],
+    ) as dev:
+        dev.cache_timeout = 10
+        dev.apply_mask_atomic({0: True, 3: True, 4: False})
+        assert dev._cached_states([0, 3, 4]) == [True, True, False]
+        assert dev.switching_skew == pytest.approx(3.75e-6)
+        assert dev.switching_skew == pytest.approx(3.75e-6)  # cached
+
+
+def test_apply_mask_atomic_old_firmware():
+    """Raise OSError instead of switching one channel after the other."""
+    with expected_communication(
+        command=["*IDN?"], response=["DigIOBox, Hardware v0.1.0, Firmware v0.2.0"]
+    ) as dev:
+        with pytest.raises(OSError):
+            dev.apply_mask_atomic({0: True, 1: True})
+        with pytest.raises(OSError):
+            dev.apply_mask_atomic({})
+        with pytest.raises(OSError):
+            _ = dev.switching_skew
+        assert dev.dev.write.call_count == 1
+
+
+def test_run_sequence():
+    """Send pre-encoded steps at their offsets and report the timing."""
+    with expected_communication(
+        command=["*IDN?", "MASKDOut 1,1", "MASKDOut 2,3", "MASKDOut 0"],
+        response=["DigIOBox, Hardware v0.1.0, Firmware v0.3.0"],
+    ) as dev:
+        dev.cache_timeout = 10
+        steps = [(0, {0: True}), (0.01, {0: False, 1: True}), (0.01, {}), (0.02, 0)]
+        timings = dev.run_sequence(steps)
+        assert [timing.planned for timing in timings] == [0, 0.01, 0.01, 0.02]
+        assert all(timing.error >= 0 for timing in timings)
+        assert timings[-1].actual >= 0.02
+        assert dev._cached_states(range(16)) == [False] * 16
+
+
+def test_run_sequence_old_firmware():
+    """Send one command per channel and step with old firmware."""
+    with expected_communication(
+        command=["*IDN?"], response=["DigIOBox, Hardware v0.1.0, Firmware v0.2.0"]
+    ) as dev:
+        dev.run_sequence([(0, {0: True, 1: False})])
+        assert dev.dev.write.call_args[0][0] == b"DO0 1\nDO1 0\n"
+
+
+def test_run_sequence_unsorted():
+    """Refuse steps with decreasing offsets before sending anything."""
+    with expected_communication() as dev:
+        with pytest.raises(ValueError):
+            dev.run_sequence([(1, {0: True}), (0, {0: False})])
+        dev.dev.write.assert_not_called()
+
+
+def test_upload_program():
+    """Upload a pulse program in one pipeline and verify it."""
+    with expected_communication(
+        command=[
+            "*IDN?",
+            "PROGram:CLEar",
+            "PROGram:ADD 0,1,1",
+            "PROGram:ADD 5,0,1",
+            "PROGram:ADD 95,0,0",
+            "PROGram:REPeat 10",
+            "PROGram?",
+        ],
+        response=["DigIOBox, Hardware v0.1.0, Firmware v0.3.0", "0,0,0,3,10"],
+    ) as dev:
+        dev.upload_program([(0, {0: True}), (5, {0: False}), (95, {})], repeat=10)
+
+
+def test_upload_program_rejected():
+    """Raise OSError if the box did not store all steps."""
+    with expected_communication(
+        command=[
+            "*IDN?",
+            "PROGram:CLEar",
+            "PROGram:ADD 10,FFFF,FFFF",
+            "PROGram:REPeat 1",
+            "PROGram?",
+        ],
+        response=["DigIOBox, Hardware v0.1.0, Firmware v0.3.0", "0,0,0,0,1"],
+    ) as dev:
+        with pytest.raises(OSError):
+            dev.upload_program([(10, 0xFFFF)])
+
+
+@pytest.mark.parametrize(
+    "steps,repeat",
+    [
+        ([(0, 1)] * 33, 1),
+        ([(-1, 1)], 1),
+        ([(2**32, 1)], 1),
+        ([(2_147_484, 1)], 1),
+        ([(0, 1)], 70000),
+    ],
+)
+def test_upload_program_invalid(steps, repeat):
+    """Refuse programs that the box cannot store before sending anything."""
+    with expected_communication() as dev:
+        with pytest.raises(ValueError):
+            dev.upload_program(steps, repeat)
+        dev.dev.write.assert_not_called()
+
+
+def test_upload_program_old_firmware():
+    """Raise OSError if the firmware does not know pulse programs."""
+    with expected_communication(
+        command=["*IDN?"], response=["DigIOBox, Hardware v0.1.0, Firmware v0.2.0"]
+    ) as dev:
+        with pytest.raises(OSError):
+            dev.upload_program([(0, 1)])
+
+
+def test_program_control():
+    """Start and abort the program and read its progress."""
+    with expected_communication(
+        command=["PROGram:RUN", "PROGram?", "PROGram:ABORt"],
+        response=["1,1,3,2,0"],
+    ) as dev:
+        dev.start_program()
+        progress = dev.program_progress()
+        assert progress == ProgramProgress(True, 1, 3, 2, 0)
+        assert not progress.finished
+        dev.abort_program()
+
+
+def test_program_progress_dummy():
+    """Report an idle program in dummy mode."""
+    dev = DigIOBoxComm("dummy", dummy=True)
+    assert dev.program_progress() == ProgramProgress(False, 0, 0, 0, 0)
+
+
 @pytest.mark.parametrize("state", [0, 1])
 def test_interlock_state(state):
     """Read state of the interlock."""
@@ -72,6 +413,56 @@ def test_interlock_state(state):
         assert dev.interlock_state == bool(state)
 
 
+@pytest.mark.parametrize("interlock", [0, 1])
+@pytest.mark.parametrize("lockout", [0, 1])
+def test_status(interlock, lockout):
+    """Read states and safety states with one query."""
+    with expected_communication(
+        command=["*IDN?", "STATus?"],
+        response=[
+            "DigIOBox, Hardware v0.1.0, Firmware v0.3.0",
+            f"8005,{interlock},{lockout}",
+        ],
+    ) as dev:
+        status = dev.status()
+        assert status.states == StateMask(0x8005, 16)
+        assert status.interlock == bool(interlock)
+        assert status.software_lockout == bool(lockout)
+        assert status.locked == bool(interlock or lockout)
+
+
+def test_status_old_firmware():
+    """Read states and safety states with a pipeline on old firmware."""
+    with expected_communication(
+        command=["*IDN?", "ALLDOut?", "INTERLOCKState?", "SWLockout?"],
+        response=[
+            "DigIOBox, Hardware v0.1.0, Firmware v0.2.0",
+            "1,0,1,0,0,0,0,0,0,0,0,0,0,0,0,1",
+            "0",
+            "1",
+        ],
+    ) as dev:
+        assert dev.status() == (StateMask(0x8005, 16), False, True)
+
+
+def test_status_dummy():
+    """Return a status with all channels off in dummy mode."""
+    dev = DigIOBoxComm("dummy", dummy=True)
+    assert dev.status() == (StateMask(0, 16), False, False)
+
+
+def test_status_updates_cache():
+    """Refresh the state cache with the status query."""
+    with expected_communication(
+        command=["*IDN?", "STATus?"],
+        response=["DigIOBox, Hardware v0.1.0, Firmware v0.3.0", "2,0,0"],
+    ) as dev:
+        dev.cache_timeout = 10
+        dev.status()
+        assert dev.channel[1].state
+        assert dev.states == [False, True] + [False] * 14
+
+
 @pytest.mark.parametrize("state", [0, 1])
 def test_software_lockout(state):
     """Read state of software lockout."""
@@ -99,3 +490,103 @@ def test_channel_state(state, channel):
     ) as dev:
         dev.channel[channel].state = state
         assert dev.channel[channel].state == state
+
+
+def test_channel_cached():
+    """Create channel objects once per number of channels."""
+    with expected_communication() as dev:
+        channels = dev.channel
+        assert dev.channel is channels
+        assert dev.channel[3] is channels[3]
+        assert list(dev.channel)[3] is channels[3]
+        assert not hasattr(channels[3], "__dict__")
+        with pytest.raises(IndexError):
+            _ = dev.channel[16]
+
+        dev.num_channels = 20
+        assert dev.channel is not channels
+        assert len(dev.channel) == 20
+        assert dev.channel[19] is dev.channel[19]
+
+
+def test_channel_precompiled():
+    """Encode the commands of a channel once for text and binary mode."""
+    with expected_communication(command=["DO3 1"]) as dev:
+        channel = dev.channel[3]
+        assert dev._encode("DO3 1") is dev._encode("DO3 1")
+        channel.state = True
+        dev.binary_mode = True
+        assert dev._encode("DO3?") == framing.encode_command("DO3?")
+        assert dev._encode("DO3?") is dev._encode("DO3?")
+
+
+# STATE CACHE #
+
+
+def test_cache_disabled_by_default():
+    """Query the device on every read if the cache is disabled."""
+    with expected_communication(
+        command=["DO0 1", "DO0?", "DO0?"], response=["1", "1"]
+    ) as dev:
+        assert dev.cache_timeout is None
+        dev.channel[0].state = True
+        assert dev.channel[0].state
+        assert dev.channel[0].state
+
+
+def test_cache_write_through():
+    """Serve reads from the cache after writes."""
+    with expected_communication(command=["DO0 1", "MASKDOut 0,6"]) as dev:
+        dev.cache_timeout = 10
+        dev._firmware_version = (0, 3, 0)
+        dev.channel[0].state = True
+        assert dev.channel[0].state
+        dev.set_states({1: False, 2: False})
+        assert not dev.channel[2].state
+        assert dev.dev.readline.call_count == 0
+
+
+def test_cache_states_refresh():
+    """Refresh the cache of all channels with one read of all states."""
+    with expected_communication(
+        command=["ALLDOut?", "ALLOFF"], response=[",".join(["1", "0"] * 8)]
+    ) as dev:
+        dev.cache_timeout = 10
+        assert dev.states == [True, False] * 8
+        assert dev.channel[2].state
+        assert not dev.channel[3].state
+        assert dev.states == [True, False] * 8
+        dev.all_off()
+        assert dev.states == [False] * 16
+        assert dev.dev.readline.call_count == 1
+
+
+def test_cache_partial_states():
+    """Query all states if not every channel is cached."""
+    with expected_communication(
+        command=["DO0 1", "ALLDOut?"], response=[",".join(["1"] * 16)]
+    ) as dev:
+        dev.cache_timeout = 10
+        dev.channel[0].state = True
+        assert dev.states == [True] * 16
+
+
+def test_cache_timeout(mocker):
+    """Query the device again once the cached state is outdated."""
+    monotonic = mocker.patch("time.monotonic", return_value=100.0)
+    with expected_communication(command=["DO0 1", "DO0?"], response=["0"]) as dev:
+        dev.cache_timeout = 0.5
+        dev.channel[0].state = True
+        monotonic.return_value = 100.4
+        assert dev.channel[0].state
+        monotonic.return_value = 100.6
+        assert not dev.channel[0].state
+
+
+def test_cache_invalidate():
+    """Query the device after the cache was invalidated."""
+    with expected_communication(command=["DO0 1", "DO0?"], response=["0"]) as dev:
+        dev.cache_timeout = 10
+        dev.channel[0].state = True
+        dev.invalidate_cache()
+        assert not dev.channel[0].state
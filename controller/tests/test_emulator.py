@@ -0,0 +1,322 @@
+"""Test the firmware emulator with the regular serial interface."""
+
+import sys
+import threading
+
+import pytest
+
+from controller import DigIOBoxComm
+
+if sys.platform == "win32":
+    pytest.skip("Pseudo-terminals are not available.", allow_module_level=True)
+
+from controller.emulator import DigOutBoxEmulator  # noqa: E402
+
+
+@pytest.fixture
+def emulator():
+    """Emulator without byte timing."""
+    emu = DigOutBoxEmulator(baudrate=None, enable_interlock=True)
+    emu.set_interlock(False)
+    yield emu
+    emu.close()
+
+
+@pytest.fixture
+def device(emulator):
+    """Device connected to the emulator."""
+    dev = DigIOBoxComm(emulator.port, timeout=1)
+    yield dev
+    dev.close()
+
+
+def test_identify(emulator, device):
+    """Answer the identity query."""
+    assert device.identify == emulator.identity
+    assert device.firmware_version == (0, 3, 0)
+
+
+def test_channel_state(emulator, device):
+    """Set and get a single channel."""
+    device.channel[3].state = True
+    assert device.channel[3].state
+    assert emulator.states[3]
+    assert emulator.outputs[3] == 0  # inverted output
+
+
+def test_set_states_and_mask(emulator, device):
+    """Set several channels and read them back in all formats."""
+    device.set_states({0: True, 2: True})
+    assert device.state_mask.on_channels() == [0, 2]
+    assert device.states == [True, False, True] + [False] * 13
+    device.all_off()
+    assert device.state_mask == 0
+
+
+def test_apply_mask_atomic(emulator, device):
+    """Switch several channels at once and report the skew bound."""
+    device.apply_mask_atomic({1: True, 4: True})
+    device.query("*IDN?")  # wait until the emulator handled the command
+    assert emulator.states[:5] == [False, True, False, False, True]
+    assert emulator.outputs[1] == 0  # inverted output
+    emulator.switching_skew = 3750
+    assert device.switching_skew == pytest.approx(3.75e-6)
+
+
+def test_status(emulator, device):
+    """Read the status with one query."""
+    emulator.press_remote(5)
+    emulator.press_remote(-2)
+    status = device.status()
+    assert status.states.on_channels() == [5]
+    assert not status.interlock
+    assert status.software_lockout
+
+
+def test_software_lockout(emulator, device):
+    """Ignore set commands while the software lockout is active."""
+    emulator.press_remote(-2)
+    device.channel[0].state = True
+    device.set_states(0xFFFF)
+    assert not any(device.states)
+    assert device.software_lockout
+
+
+def test_interlock(emulator, device):
+    """Turn all channels off and ignore set commands when interlocked."""
+    device.set_states(0b11)
+    assert device.state_mask == 0b11
+    emulator.set_interlock(True)
+    assert device.interlock_state
+    assert device.state_mask == 0
+    device.channel[0].state = True
+    assert not device.channel[0].state
+
+
+def test_scpi_forms(emulator, device):
+    """Accept short and long forms of commands in any case."""
+    assert device.query("alldo?") == device.query("ALLDOut?")
+    device.sendcmd("dout1 1")
+    assert device.query("DO1?") == "1"
+    assert device.query("INTERLOCKS?") == "0"
+    assert device.query("swl?") == "0"
+
+
+def test_malformed_parameters(emulator, device):
+    """Ignore commands with malformed numbers and keep answering."""
+    device.sendcmd("MASKDOut zz")
+    device.sendcmd("PROGram:ADD 10,zz")
+    assert device.query("*IDN?").startswith("DigIOBox")
+    assert not any(emulator.states)
+    assert emulator.program == []
+
+
+def test_old_firmware():
+    """Ignore commands that the emulated firmware does not know."""
+    with DigOutBoxEmulator(firmware=(0, 2, 0), baudrate=None) as emu:
+        dev = DigIOBoxComm(emu.port, timeout=1)
+        dev.set_states({1: True, 2: True})
+        assert "DO1 1" in emu.received
+        assert dev.status().states.on_channels() == [1, 2]
+        dev.close()
+
+
+def test_boot_time():
+    """Wait for the emulated Arduino to boot when connecting."""
+    with DigOutBoxEmulator(baudrate=None, boot_time=0.3) as emu:
+        dev = DigIOBoxComm(emu.port, timeout=1)
+        assert emu.received.count("*IDN?") >= 1
+        assert dev.query("DO0?") == "0"
+        dev.close()
+
+
+def test_transfer_time():
+    """Compute the time on the wire from the baud rate."""
+    with DigOutBoxEmulator(baudrate=9600) as emu:
+        assert emu.transfer_time(96) == pytest.approx(0.1)
+    with DigOutBoxEmulator(baudrate=None) as emu:
+        assert emu.transfer_time(96) == 0
+
+
+def test_negotiate_baudrate(emulator):
+    """Switch both sides to a faster baud rate and back when closing."""
+    dev = DigIOBoxComm(emulator.port, timeout=1, max_baudrate=115200)
+    assert dev.baudrate == emulator.baudrate == 115200
+    dev.channel[2].state = True
+    assert dev.channel[2].state
+    dev.close()
+    assert emulator.baudrate == 9600
+
+
+def test_negotiate_baudrate_link_limit():
+    """Use the fastest baud rate that the link can carry."""
+    with DigOutBoxEmulator(baudrate=None, max_link_baudrate=57600) as emu:
+        dev = DigIOBoxComm(emu.port, timeout=1)
+        assert dev.negotiate_baudrate(250000) == 57600
+        assert emu.baudrate == 57600
+        dev.close()
+
+
+def test_baudrate_reverts_after_reset(emulator):
+    """Fall back to the default baud rate if the box was reset."""
+    dev = DigIOBoxComm(emulator.port, timeout=0.5, max_baudrate=115200)
+    emulator.reset()
+    assert dev.identify == emulator.identity
+    assert dev.baudrate == 9600
+    dev.close()
+
+
+def test_binary_mode(emulator):
+    """Talk to the box with binary frames, transparently for the user."""
+    dev = DigIOBoxComm(emulator.port, timeout=1, binary=True)
+    assert dev.binary_mode and emulator.binary_mode
+    assert dev.identify == emulator.identity
+    dev.channel[1].state = True
+    assert dev.channel[1].state
+    dev.set_states({4: True, 5: True})
+    assert dev.state_mask.on_channels() == [1, 4, 5]
+    assert dev.states == emulator.states
+    status = dev.status()
+    assert status.states == 0b110010
+    assert not status.locked
+    assert not dev.interlock_state and not dev.software_lockout
+    dev.all_off()
+    assert not any(dev.states)
+    assert isinstance(emulator.received[-1], bytes)
+
+    dev.close()
+    assert not emulator.binary_mode
+
+
+def test_binary_mode_negotiated_baudrate(emulator):
+    """Combine the binary mode with a faster baud rate."""
+    dev = DigIOBoxComm(emulator.port, timeout=1, max_baudrate=115200, binary=True)
+    assert dev.binary_mode and dev.baudrate == 115200
+    assert dev.negotiate_baudrate(57600) == 115200
+    assert dev.binary_mode
+    dev.channel[0].state = True
+    assert dev.channel[0].state and emulator.states[0]
+    dev.close()
+    assert not emulator.binary_mode and emulator.baudrate == 9600
+
+
+def test_binary_mode_reverts_after_reset(emulator):
+    """Fall back to text mode if the box was reset."""
+    dev = DigIOBoxComm(emulator.port, timeout=0.5, binary=True)
+    emulator.reset()
+    assert dev.identify == emulator.identity
+    assert not dev.binary_mode
+    dev.close()
+
+
+def test_binary_mode_old_firmware():
+    """Stay in text mode with old firmware."""
+    with DigOutBoxEmulator(firmware=(0, 2, 0), baudrate=None) as emu:
+        dev = DigIOBoxComm(emu.port, timeout=0.5, binary=True)
+        assert not dev.binary_mode
+        dev.close()
+
+
+def test_events(emulator, device):
+    """Report changes by the remote and the interlock to the callbacks."""
+    events = []
+    received = threading.Event()
+    device.add_event_callback(lambda event: (events.append(event), received.set()))
+    assert device.enable_events()
+    assert device.query("EVENTs?") == "1"
+
+    emulator.press_remote(3)
+    device.start_worker()  # the idle worker reads the event
+    assert received.wait(timeout=2)
+    device.stop_worker()
+    assert events[0].source == "RF"
+    assert events[0].status.states.on_channels() == [3]
+
+    emulator.set_interlock(True)
+    for _ in range(200):
+        device.poll_events()
+        if len(events) > 1:
+            break
+        threading.Event().wait(0.01)
+    assert events[-1].source == "INTERLOCK"
+    assert events[-1].status.interlock and not any(events[-1].status.states)
+
+    device.disable_events()
+    assert device.query("EVENTs?") == "0"
+
+
+def test_events_binary_mode(emulator):
+    """Report events as frames in binary mode."""
+    dev = DigIOBoxComm(emulator.port, timeout=1, binary=True, threaded=True)
+    events = []
+    received = threading.Event()
+    dev.add_event_callback(lambda event: (events.append(event), received.set()))
+    assert dev.enable_events()
+    emulator.press_remote(-2)
+    assert received.wait(timeout=2)
+    assert events[0].source == "LOCKOUT" and events[0].status.software_lockout
+    assert dev.software_lockout
+    dev.close()
+
+
+def wait_for_program(device, timeout=2):
+    """Poll the progress of the pulse program until it stops running."""
+    for _ in range(int(timeout / 0.01)):
+        progress = device.program_progress()
+        if not progress.running:
+            return progress
+        threading.Event().wait(0.01)
+    return progress
+
+
+def test_program(emulator, device):
+    """Run a pulse program on the box and report its completion."""
+    events = []
+    device.add_event_callback(events.append)
+    assert device.enable_events()
+    device.upload_program([(0, {0: True}), (10, {0: False, 1: True})], repeat=3)
+    assert emulator.program == [(0, 1, 1), (10, 2, 3)]
+
+    device.start_program()
+    progress = wait_for_program(device)
+    assert progress.finished and progress.cycle == 3
+    assert emulator.states[:2] == [False, True]
+    device.poll_events()
+    assert events[-1].source == "PROGRAM"
+    assert events[-1].status.states.on_channels() == [1]
+
+
+def test_program_safety(emulator, device):
+    """Abort the pulse program with the interlock and refuse to start it locked."""
+    device.upload_program([(0, {0: True}), (10, {0: False})], repeat=0)
+    device.start_program()
+    assert device.program_progress().running
+    emulator.set_interlock(True)
+    assert not wait_for_program(device).running
+    assert not any(emulator.states)
+
+    emulator.set_interlock(False)
+    emulator.press_remote(-2)
+    device.start_program()
+    assert not device.program_progress().running
+
+
+def test_program_max_delay(emulator, device):
+    """Ignore program entries with a delay the box cannot schedule."""
+    device.sendcmd("PROGram:CLEar")
+    device.sendcmd(f"PROGram:ADD {device.PROGRAM_MAX_DELAY},1,1")
+    device.sendcmd(f"PROGram:ADD {device.PROGRAM_MAX_DELAY + 1},0,1")
+    assert emulator.program == [(device.PROGRAM_MAX_DELAY, 1, 1)]
+
+
+def test_program_binary_mode(emulator):
+    """Upload and run a pulse program with binary frames."""
+    dev = DigIOBoxComm(emulator.port, timeout=1, binary=True)
+    assert dev.binary_mode
+    dev.upload_program([(1, 0b101)], repeat=2)
+    dev.start_program()
+    progress = wait_for_program(dev)
+    assert progress == (False, 0, 2, 1, 2)
+    assert emulator.states[:3] == [True, False, True]
+    dev.abort_program()
+    dev.close()
@@ -0,0 +1,140 @@
+"""Test controlling several boxes at once."""
+
+import threading
+from unittest import mock
+
+import pytest
+
+from controller import DigIOBoxComm, DigIOBoxFleet
+
+
+def mock_box(name: str) -> mock.MagicMock:
+    """Create a mocked box whose state reads return its name."""
+    box = mock.MagicMock(spec=DigIOBoxComm)
+    type(box).states = mock.PropertyMock(return_value=name)
+    box.status.return_value = f"{name} status"
+    return box
+
+
+@pytest.fixture
+def fleet():
+    """Fleet with two mocked boxes."""
+    return DigIOBoxFleet({"a": mock_box("a"), "b": mock_box("b")})
+
+
+def test_container(fleet):
+    """Access boxes by name."""
+    assert len(fleet) == 2
+    assert list(fleet) == fleet.names == ["a", "b"]
+    assert "a" in fleet
+    assert "c" not in fleet
+
+    box = fleet.remove("b")
+    assert fleet.names == ["a"]
+    fleet.add("b", box)
+    with pytest.raises(ValueError):
+        fleet.add("b", box)
+
+
+def test_channel_addressing(fleet):
+    """Access channels by box name and channel number."""
+    assert fleet["a"] is not fleet["b"]
+    ch = fleet["b", 3]
+    assert ch is fleet["b"].channel[3]
+    with pytest.raises(KeyError):
+        _ = fleet["c", 3]
+
+
+def test_states_and_status(fleet):
+    """Read states of all boxes."""
+    assert fleet.states() == {"a": "a", "b": "b"}
+    assert fleet.status() == {"a": "a status", "b": "b status"}
+
+
+def test_set_states(fleet):
+    """Group state changes per box and send one command per box."""
+    fleet.set_states({("a", 0): True, ("b", 1): False, ("a", 2): False})
+    fleet["a"].set_states.assert_called_once_with({0: True, 2: False})
+    fleet["b"].set_states.assert_called_once_with({1: False})
+
+    with pytest.raises(KeyError):
+        fleet.set_states({("c", 0): True})
+
+
+def test_all_off_and_close(fleet):
+    """Turn off and close all boxes."""
+    fleet.all_off()
+    fleet.close()
+    for name in fleet:
+        fleet[name].all_off.assert_called_once()
+        fleet[name].close.assert_called_once()
+
+
+def test_map_parallel(fleet):
+    """Call all boxes from separate threads at the same time."""
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fn(box):
+        barrier.wait()  # fails if the boxes are called one after the other
+        return box
+
+    assert fleet.map(fn) == {"a": fleet["a"], "b": fleet["b"]}
+
+
+def test_executor_reused(fleet):
+    """Keep the threads between calls and stop them when closing."""
+    fleet.states()
+    executor = fleet._executor
+    fleet.status()
+    assert fleet._executor is executor
+    fleet.close()
+    assert fleet._executor is None
+    assert executor._shutdown
+
+
+def test_map_exception(fleet):
+    """Raise exceptions of calls to a box."""
+    fleet["b"].all_off.side_effect = OSError
+    with pytest.raises(OSError):
+        fleet.all_off()
+    fleet["a"].all_off.assert_called_once()
+
+
+def test_from_ports(mocker):
+    """Connect to all boxes by port."""
+    comm = mocker.patch("controller.fleet.DigIOBoxComm")
+    fleet = DigIOBoxFleet.from_ports({"a": "/dev/a", "b": "/dev/b"}, timeout=1)
+    assert fleet.names == ["a", "b"]
+    comm.assert_any_call("/dev/a", timeout=1)
+    comm.assert_any_call("/dev/b", timeout=1)
+
+
+def test_from_ports_failure(mocker):
+    """Close the boxes that connected if another box fails to connect."""
+    box = mock_box("a")
+
+    def connect(port):
+        if port == "/dev/b":
+            raise OSError("no box")
+        return box
+
+    mocker.patch("controller.fleet.DigIOBoxComm", side_effect=connect)
+    with pytest.raises(OSError):
+        DigIOBoxFleet.from_ports({"a": "/dev/a", "b": "/dev/b"})
+    box.close.assert_called_once()
+
+
+def test_from_serial_numbers(mocker):
+    """Find the ports of boxes by USB serial number."""
+    ports = [
+        mock.MagicMock(serial_number="123", device="/dev/a"),
+        mock.MagicMock(serial_number=None, device="/dev/b"),
+    ]
+    mocker.patch("controller.fleet.list_ports.comports", return_value=ports)
+    comm = mocker.patch("controller.fleet.DigIOBoxComm")
+
+    DigIOBoxFleet.from_serial_numbers({"a": "123"})
+    comm.assert_called_once_with("/dev/a")
+
+    with pytest.raises(OSError):
+        DigIOBoxFleet.from_serial_numbers({"b": "456"})
@@ -0,0 +1,104 @@
+"""Test the binary framed protocol."""
+
+import io
+
+import pytest
+
+from controller import framing
+
+
+def test_crc8():
+    """Calculate the CRC-8 with polynomial 0x07."""
+    assert framing.crc8(b"123456789") == 0xF4
+    assert framing.crc8(b"") == 0
+
+
+@pytest.mark.parametrize(
+    "cmd,opcode,payload",
+    [
+        ("*IDN?", framing.OP_IDENTIFY, b""),
+        ("DO3?", framing.OP_GET_DIG_IO, b"\x03"),
+        ("DOut12 1", framing.OP_SET_DIG_IO, b"\x0c\x01"),
+        ("ALLDOut?", framing.OP_GET_ALL_DIG_IO, b""),
+        ("MASKDOut?", framing.OP_GET_MASK_DIG_IO, b""),
+        ("MASKDOut 9,19", framing.OP_SET_MASK_DIG_IO, b"\x09\0\0\0\x19\0\0\0"),
+        ("MASKDOut 5", framing.OP_SET_MASK_DIG_IO, b"\x05\0\0\0\xff\xff\xff\xff"),
+        ("MASKDOut:SKEW?", framing.OP_SWITCHING_SKEW, b""),
+        ("ALLOFF", framing.OP_ALL_OFF, b""),
+        ("INTERLOCKS?", framing.OP_INTERLOCK_STATE, b""),
+        ("SWLockout?", framing.OP_SW_LOCKOUT, b""),
+        ("STAT?", framing.OP_STATUS, b""),
+        ("EVENTs 1", framing.OP_EVENTS, b"\x01"),
+        ("PROGram?", framing.OP_PROGRAM_STATE, b""),
+        ("PROG:CLE", framing.OP_PROGRAM_CLEAR, b""),
+        (
+            "PROGram:ADD 1000,1,3",
+            framing.OP_PROGRAM_ADD,
+            b"\xe8\x03\0\0\x01\0\0\0\x03\0\0\0",
+        ),
+        ("PROGram:REPeat 300", framing.OP_PROGRAM_REPEAT, b"\x2c\x01"),
+        ("PROGram:RUN", framing.OP_PROGRAM_RUN, b""),
+        ("PROGram:ABORt", framing.OP_PROGRAM_ABORT, b""),
+    ],
+)
+def test_encode_command(cmd, opcode, payload):
+    """Translate SCPI commands into frames of fixed size."""
+    frame = framing.encode_command(cmd)
+    assert frame[0] == framing.SYNC
+    assert frame[1] == opcode
+    assert frame[2:-1] == payload
+    assert len(payload) == framing.REQUEST_SIZE[opcode]
+    assert frame[-1] == framing.crc8(frame[1:-1])
+
+
+def test_encode_command_unknown():
+    """Raise ValueError for commands without binary equivalent."""
+    with pytest.raises(ValueError):
+        framing.encode_command("BAUDrate 115200")
+
+
+@pytest.mark.parametrize(
+    "opcode,payload,answer",
+    [
+        (
+            framing.OP_IDENTIFY,
+            bytes([0, 1, 0, 0, 3, 0]),
+            "DigIOBox, Hardware v0.1.0, Firmware v0.3.0",
+        ),
+        (framing.OP_GET_DIG_IO, b"\x01", "1"),
+        (framing.OP_GET_ALL_DIG_IO, b"\x05\0\0\0\x04", "1,0,1,0"),
+        (framing.OP_GET_MASK_DIG_IO, b"\x01\x80\0\0", "8001"),
+        (framing.OP_INTERLOCK_STATE, b"\x00", "0"),
+        (framing.OP_SW_LOCKOUT, b"\x01", "1"),
+        (framing.OP_STATUS, b"\x05\0\0\0\x00\x01", "5,0,1"),
+        (framing.OP_EVENT, b"\x05\0\0\0\x00\x01\x03", "!LOCKOUT 5,0,1"),
+        (framing.OP_SWITCHING_SKEW, b"\xa6\x0e\0\0", "3750"),
+        (framing.OP_PROGRAM_STATE, b"\x01\x02\x2c\x01\x04\0\0", "1,2,300,4,0"),
+    ],
+)
+def test_read_frame(opcode, payload, answer):
+    """Read reply frames and translate them into the answer of the SCPI command."""
+    dev = io.BytesIO(framing.encode_frame(opcode, payload))
+    frame = framing.read_frame(dev)
+    assert frame == (opcode, payload)
+    assert framing.decode_reply(*frame) == answer
+
+
+def test_read_frame_timeout():
+    """Return None if nothing arrived."""
+    assert framing.read_frame(io.BytesIO()) is None
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"1\r\n",  # text instead of a frame
+        bytes([framing.SYNC, 0x42, 0, 0]),  # unknown opcode
+        framing.encode_frame(framing.OP_STATUS, b"\x05\0\0\0\x00\x01")[:-2],
+        framing.encode_frame(framing.OP_GET_DIG_IO, b"\x01")[:-1] + b"\x00",
+    ],
+)
+def test_read_frame_corrupted(data):
+    """Raise FrameError for incomplete or corrupted frames."""
+    with pytest.raises(framing.FrameError):
+        framing.read_frame(io.BytesIO(data))
@@ -0,0 +1,71 @@
+"""Test the latency and traffic metrics."""
+
+import pytest
+
+from controller import metrics
+
+
+@pytest.mark.parametrize(
+    "cmd,name",
+    [
+        ("DO3 1", "DO#"),
+        ("DOut12?", "DOUT#?"),
+        ("*IDN?", "*IDN?"),
+        ("MASKDO 9,19", "MASKDO"),
+        ("  stat?", "STAT?"),
+    ],
+)
+def test_command_name(cmd, name):
+    """Strip numeric suffixes and parameters from commands."""
+    assert metrics.command_name(cmd) == name
+
+
+def test_latency_histogram():
+    """Count latencies in buckets and estimate percentiles."""
+    histogram = metrics.LatencyHistogram(buckets=(0.001, 0.01, 0.1))
+    assert histogram.mean is None
+    assert histogram.percentile(0.5) is None
+
+    for duration in (0.0005, 0.005, 0.006, 0.05, 0.5):
+        histogram.add(duration)
+    assert histogram.counts == [1, 2, 1, 1]
+    assert histogram.count == 5
+    assert histogram.min == 0.0005 and histogram.max == 0.5
+    assert histogram.mean == pytest.approx(0.5615 / 5)
+    assert histogram.percentile(0.5) == 0.01
+    assert histogram.percentile(0.8) == 0.1
+    assert histogram.percentile(1.0) == 0.5
+    assert histogram.to_dict()["counts"] == [1, 2, 1, 1]
+
+
+def test_comm_metrics():
+    """Record calls per command name and count their outcomes."""
+    comm_metrics = metrics.CommMetrics()
+    timings = []
+    comm_metrics.add_hook(timings.append)
+
+    for outcome in ("ok", "ok", "timeout", "malformed", "error"):
+        comm_metrics.record(metrics.CallTiming("DO1?", "DO#?", 0.01, outcome, 5, 3))
+    comm_metrics.record(metrics.CallTiming("ALLOFF", "ALLOFF", 0.001, "ok", 7, 0))
+
+    assert comm_metrics.calls == 6
+    assert comm_metrics.latency["DO#?"].count == 5
+    assert comm_metrics.latency["ALLOFF"].count == 1
+    assert comm_metrics.timeouts == comm_metrics.malformed == comm_metrics.errors == 1
+    assert len(timings) == 6
+    assert comm_metrics.to_dict()["latency"]["ALLOFF"]["count"] == 1
+
+    comm_metrics.remove_hook(timings.append)
+    comm_metrics.reset()
+    comm_metrics.record(metrics.CallTiming("ALLOFF", "ALLOFF", 0.001, "ok", 7, 0))
+    assert comm_metrics.calls == 1
+    assert len(timings) == 6
+
+
+def test_comm_metrics_hook_error():
+    """Warn about failing hooks and keep recording."""
+    comm_metrics = metrics.CommMetrics()
+    comm_metrics.add_hook(lambda timing: 1 / 0)
+    with pytest.warns(UserWarning):
+        comm_metrics.record(metrics.CallTiming("ALLOFF", "ALLOFF", 0.001, "ok", 7, 0))
+    assert comm_metrics.calls == 1
@@ -0,0 +1,105 @@
+"""Test recording and replaying the traffic with the device."""
+
+import sys
+import time
+
+import pytest
+import serial
+from controller.recorder import READ, WRITE, TrafficEntry, TrafficRecorder, load
+
+from controller import DigIOBoxComm
+
+
+def session(path, entries):
+    """Save a session with the given entries and return its replay URL."""
+    recorder = TrafficRecorder()
+    recorder.entries.extend(TrafficEntry(*entry) for entry in entries)
+    recorder.save(path)
+    return f"replay://{path}"
+
+
+def test_recorder_ring_buffer(tmp_path):
+    """Keep the newest entries in memory and all entries in the log file."""
+    path = tmp_path / "session.digrec"
+    with TrafficRecorder(maxlen=2, path=path) as recorder:
+        recorder.record(WRITE, b"DO0?\n")
+        recorder.record(READ, b"1\r\n")
+        recorder.record(WRITE, b"DO1?\n")
+    assert [entry.data for entry in recorder.entries] == [b"1\r\n", b"DO1?\n"]
+
+    entries = load(path)
+    assert [entry.direction for entry in entries] == [WRITE, READ, WRITE]
+    assert entries[0].timestamp <= entries[1].timestamp <= entries[2].timestamp
+    assert entries[1:] == list(recorder.entries)
+
+
+def test_load_invalid(tmp_path):
+    """Refuse to load files that are not recorded sessions."""
+    path = tmp_path / "invalid.digrec"
+    path.write_bytes(b"DO0?\n")
+    with pytest.raises(ValueError):
+        load(path)
+
+
+def test_replay(tmp_path):
+    """Answer writes with the reads that followed them in the recording."""
+    url = session(
+        tmp_path / "session.digrec",
+        [
+            (0.0, WRITE, b"*IDN?\n"),
+            (0.1, READ, b"DigIOBox, Hardware v0.1.0, Firmware v0.3.0\r\n"),
+            (0.2, WRITE, b"DO3?\n"),
+            (0.3, READ, b"1\r\n"),
+        ],
+    )
+    dev = DigIOBoxComm(url + "?speed=0", timeout=1)
+    assert dev.channel[3].state
+    dev.close()
+
+
+def test_replay_timing(tmp_path):
+    """Delay reads by the recorded time, divided by the speed."""
+    entries = [(0, WRITE, b"DO3?\n"), (60, READ, b"1")]
+    url = session(tmp_path / "session.digrec", entries)
+    port = serial.serial_for_url(url + "?speed=2", timeout=0)
+    start = time.monotonic()
+    port.write(b"DO3?\n")
+    assert port.in_waiting == 0
+    assert port.read(1) == b""
+    assert port._pending[0][0] - start == pytest.approx(30, abs=1)
+    port.close()
+
+
+def test_replay_diverged(tmp_path):
+    """Raise if the host writes something else than in the recording."""
+    url = session(tmp_path / "session.digrec", [(0, WRITE, b"DO3?\n")])
+    port = serial.serial_for_url(url)
+    with pytest.raises(serial.SerialException):
+        port.write(b"DO4?\n")
+    port.close()
+
+    port = serial.serial_for_url(url + "?strict=0")
+    port.write(b"DO4?\n")
+    port.write(b"DO5?\n")
+    port.close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Pseudo-terminals not available")
+@pytest.mark.parametrize("binary", [False, True])
+def test_record_and_replay(tmp_path, binary):
+    """Replay a session that was recorded with the emulator."""
+    from controller.emulator import DigOutBoxEmulator
+
+    def run(port, recorder=None):
+        dev = DigIOBoxComm(port, timeout=1, binary=binary, recorder=recorder)
+        dev.set_states({1: True, 4: True})
+        results = [dev.state_mask, dev.status(), dev.channel[4].state]
+        dev.close()
+        return results
+
+    path = tmp_path / "session.digrec"
+    with DigOutBoxEmulator(baudrate=None) as emulator:
+        with TrafficRecorder(path=path) as recorder:
+            recorded = run(emulator.port, recorder)
+
+    assert run(f"replay://{path}?speed=0") == recorded
@@ -0,0 +1,234 @@
+"""Test the serial transport of the device."""
+
+import threading
+from unittest import mock
+
+import pytest
+from controller.serial_comm import DevComm
+from mock_serial import MockSerial
+
+from . import expected_communication
+
+
+def test_query_many():
+    """Send several queries back-to-back and read answers in order."""
+    with expected_communication(
+        command=["DO0?", "DO1?", "SWLockout?"], response=["1", "0", "1"]
+    ) as dev:
+        assert dev.query_many(["DO0?", "DO1?", "SWLockout?"]) == ["1", "0", "1"]
+
+
+def test_pipeline_context_manager():
+    """Mix commands and queries in a pipeline, execute when leaving context."""
+    with expected_communication(
+        command=["DO3 1", "DO3?", "ALLOFF", "DO3?"], response=["1", "0"]
+    ) as dev:
+        with dev.pipeline() as pipe:
+            pipe.sendcmd("DO3 1")
+            idx_on = pipe.query("DO3?")
+            pipe.sendcmd("ALLOFF")
+            idx_off = pipe.query("DO3?")
+            assert len(pipe) == 4
+        assert pipe.results[idx_on] == "1"
+        assert pipe.results[idx_off] == "0"
+        assert len(pipe) == 0
+
+
+def test_pipeline_not_executed_on_exception():
+    """Do not send anything if the pipeline context raises."""
+    with expected_communication() as dev:
+        try:
+            with dev.pipeline() as pipe:
+                pipe.sendcmd("DO3 1")
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        dev.dev.write.assert_not_called()
+
+
+def test_pipeline_window():
+    """Read outstanding replies before the window of bytes in flight overflows."""
+    with expected_communication(
+        command=["DO0?", "DO1?", "DO2?"], response=["1", "0", "1"]
+    ) as dev:
+        dev.pipeline_window = 10  # fits two queries of 5 bytes
+
+        manager = mock.Mock()
+        manager.attach_mock(dev.dev.write, "write")
+        manager.attach_mock(dev.dev.readline, "readline")
+
+        assert dev.query_many(["DO0?", "DO1?", "DO2?"]) == ["1", "0", "1"]
+        assert [call[0] for call in manager.mock_calls] == [
+            "write",
+            "write",
+            "readline",
+            "write",
+            "readline",
+            "readline",
+        ]
+
+
+def test_pipeline_window_commands_only():
+    """Write commands without replies right away, there is nothing to wait for."""
+    with expected_communication(command=["DO0 1", "DO1 1", "DO2 1"]) as dev:
+        dev.pipeline_window = 6  # fits one command of 6 bytes
+
+        with dev.pipeline() as pipe:
+            for ch in range(3):
+                pipe.sendcmd(f"DO{ch} 1")
+        assert dev.dev.write.call_count == 3
+        dev.dev.readline.assert_not_called()
+
+
+def test_pipeline_dummy(capsys):
+    """Print commands and return dummy answers in dummy mode."""
+    dev = DevComm("dummy", dummy=True)
+    assert dev.query_many(["DO0?", "DO1?"]) == ["0", "0"]
+    assert capsys.readouterr().out == "Sending: DO0?\nSending: DO1?\n"
+
+
+def test_submit_without_worker():
+    """Execute submitted commands right away if no worker is running."""
+    with expected_communication(command=["DO0?", "ALLOFF"], response=["1"]) as dev:
+        assert not dev.threaded
+        future = dev.submit("DO0?")
+        assert future.done()
+        assert future.result() == "1"
+        assert dev.submit("ALLOFF", expect_reply=False).result() is None
+
+
+def test_submit_exception():
+    """Set exceptions of failing commands on the future."""
+    with expected_communication() as dev:
+        dev.dev.readline.side_effect = OSError("port gone")
+        future = dev.submit("DO0?")
+        assert isinstance(future.exception(), OSError)
+
+
+def test_worker():
+    """Execute commands from several threads through the I/O worker."""
+    with expected_communication(
+        command=["DO0?", "DO1 1", "DO2?", "DO3?"], response=["1", "0", "1"]
+    ) as dev:
+        dev.start_worker()
+        assert dev.threaded
+
+        futures = [dev.submit("DO0?"), dev.submit("DO1 1", expect_reply=False)]
+        assert dev.query("DO2?") == "0"
+        assert [future.result(timeout=5) for future in futures] == ["1", None]
+
+        result = []
+        thread = threading.Thread(target=lambda: result.append(dev.query("DO3?")))
+        thread.start()
+        thread.join(timeout=5)
+        assert result == ["1"]
+
+        dev.stop_worker()
+        assert not dev.threaded
+
+
+def test_worker_pipeline():
+    """Execute pipelines through the I/O worker."""
+    with expected_communication(command=["DO0?", "DO1?"], response=["1", "0"]) as dev:
+        dev.start_worker()
+        assert dev.query_many(["DO0?", "DO1?"]) == ["1", "0"]
+        dev.close()
+        assert not dev.threaded
+
+
+def test_events():
+    """Skip events when reading replies and pass them to the callbacks."""
+    with expected_communication(
+        command=["DO0?", "DO1?"], response=["!RF 1,0,0", "1", "!RF 0,0,0", "0"]
+    ) as dev:
+        events = []
+        dev.add_event_callback(events.append)
+        assert dev.query("DO0?") == "1"
+        assert [event.source for event in events] == ["RF"]
+
+        dev.remove_event_callback(events.append)
+        assert dev.query("DO1?") == "0"
+        assert len(events) == 1
+
+
+def test_events_callback_error():
+    """Warn about failing callbacks without losing the reply."""
+    with expected_communication(command=["DO0?"], response=["!RF 1,0,0", "1"]) as dev:
+        dev.add_event_callback(mock.MagicMock(side_effect=RuntimeError))
+        with pytest.warns(UserWarning):
+            assert dev.query("DO0?") == "1"
+
+
+def test_metrics():
+    """Record latency and traffic of queries, commands, and pipelines."""
+    with expected_communication(
+        command=["DO0?", "DO1 1", "DO2?", "DO3?", "DO4?"], response=["1", "", "0", "1"]
+    ) as dev:
+        dev.metrics.reset()
+        timings = []
+        dev.metrics.add_hook(timings.append)
+
+        dev.query("DO0?")
+        dev.sendcmd("DO1 1")
+        dev.query("DO2?")
+        dev.query_many(["DO3?", "DO4?"])
+
+        names = ["DO#?", "DO#", "DO#?", "PIPELINE"]
+        assert [timing.name for timing in timings] == names
+        assert [timing.outcome for timing in timings] == ["ok", "ok", "timeout", "ok"]
+        assert timings[0].bytes_written == 5 and timings[0].bytes_read == 2
+        assert dev.metrics.latency["DO#?"].count == 2
+        assert dev.metrics.timeouts == 1
+        assert dev.metrics.bytes_written == 5 + 6 + 5 + 10
+        assert dev.metrics.bytes_read == 2 + 1 + 2 + 2
+
+
+def test_ready_first_attempt():
+    """Connect as soon as the device answers the identity query."""
+    mock_dev = MockSerial()
+    stub = mock_dev.stub(receive_bytes=b"*IDN?\n", send_bytes=b"DigIOBox\n")
+    mock_dev.open()
+
+    dev = DevComm(mock_dev.port, timeout=3)
+    assert stub.calls == 1
+    assert dev.dev.timeout == 3
+    dev.close()
+
+
+def test_ready_retry():
+    """Retry the identity query until the device answers."""
+    mock_dev = MockSerial()
+    stub = mock_dev.stub(
+        receive_bytes=b"*IDN?\n",
+        send_fn=lambda calls: b"DigIOBox\n" if calls > 2 else b"",
+    )
+    mock_dev.open()
+
+    dev = DevComm(mock_dev.port)
+    assert stub.calls == 3
+    dev.close()
+
+
+def test_ready_timeout():
+    """Raise a TimeoutError if the device never answers."""
+    mock_dev = MockSerial()
+    mock_dev.open()
+
+    with pytest.raises(TimeoutError):
+        DevComm(mock_dev.port, ready_timeout=0.3)
+
+
+def test_ready_skip():
+    """Do not talk to the device when the readiness check is skipped."""
+    mock_dev = MockSerial()
+    stub = mock_dev.stub(receive_bytes=b"*IDN?\n", send_bytes=b"DigIOBox\n")
+    mock_dev.open()
+
+    DevComm(mock_dev.port, ready_timeout=None).close()
+    assert not stub.called
+
+
+def test_dummy_does_not_wait(mock_time):
+    """Do not sleep when connecting in dummy mode."""
+    DevComm("dummy", dummy=True)
+    mock_time.assert_not_called()
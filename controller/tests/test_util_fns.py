@@ -0,0 +1,112 @@
+"""Test utility functions and classes."""
+
+import pytest
+from controller.util_fns import (
+    mask_commands,
+    parse_status,
+    scpi_pattern,
+    states_to_mask,
+)
+
+from controller import StateMask
+
+
+def test_state_mask_from_list():
+    """Create a mask from a list and convert it back."""
+    states = [True, False, True, True]
+    mask = StateMask.from_list(states)
+    assert int(mask) == 0b1101
+    assert mask.value == 0b1101
+    assert len(mask) == mask.size == 4
+    assert mask.to_list() == states
+    assert list(mask) == states
+    assert mask == states
+
+
+def test_state_mask_from_hex():
+    """Create a mask from a hexadecimal string."""
+    mask = StateMask.from_hex("8001", size=16)
+    assert mask.on_channels() == [0, 15]
+    assert mask == 0x8001
+
+
+def test_state_mask_truncate():
+    """Drop bits that are outside the number of channels."""
+    assert int(StateMask(0x1FFFF, size=16)) == 0xFFFF
+
+
+def test_state_mask_indexing():
+    """Index the mask like a list."""
+    mask = StateMask(0b0101, size=4)
+    assert mask[0]
+    assert not mask[1]
+    assert mask[-2]
+    assert mask[1:3] == [False, True]
+    with pytest.raises(IndexError):
+        _ = mask[4]
+
+
+def test_state_mask_popcount_and_diff():
+    """Count channels that are on and diff two masks."""
+    mask = StateMask(0b1011, size=4)
+    other = StateMask(0b0110, size=4)
+    assert mask.popcount() == 3
+    assert mask ^ other == StateMask(0b1101, size=4)
+    assert mask.diff(other) == [0, 2, 3]
+    assert mask.diff(0b1011) == []
+
+
+def test_state_mask_hashable():
+    """Use equal masks as identical dictionary keys."""
+    assert len({StateMask(3, 4), StateMask(3, 4), StateMask(3, 5)}) == 2
+    assert hash(StateMask(3, 4)) == hash(3)
+    assert {3: "on"}[StateMask(3, 4)] == "on"
+    assert repr(StateMask(10, 4)) == "StateMask(0xA, size=4)"
+
+
+def test_states_to_mask():
+    """Convert dictionaries and bitmasks, reject bits above the last channel."""
+    assert states_to_mask({0: True, 2: False}, 4) == (0b001, 0b101)
+    assert states_to_mask(0b1010, 4) == (0b1010, 0b1111)
+    with pytest.raises(IndexError):
+        states_to_mask({4: True}, 4)
+    with pytest.raises(ValueError):
+        states_to_mask(0b10000, 4)
+
+
+@pytest.mark.parametrize(
+    "values,mask,mask_command,cmds",
+    [
+        (0b101, 0b111, True, ["MASKDOut 5,7"]),
+        (0b101, 0xFFFF, True, ["MASKDOut 5"]),
+        (0b101, 0b110, False, ["DO1 0", "DO2 1"]),
+    ],
+)
+def test_mask_commands(values, mask, mask_command, cmds):
+    """Build one mask command or one command per channel."""
+    assert mask_commands(values, mask, 16, mask_command) == cmds
+
+
+@pytest.mark.parametrize(
+    "replies",
+    [["5,1,0"], ["1,0,1,0", "1", "0"]],
+)
+def test_parse_status(replies):
+    """Parse the status query or the individual queries of old firmware."""
+    status = parse_status(replies, 4)
+    assert status == (StateMask(0b101, 4), True, False)
+
+
+@pytest.mark.parametrize(
+    "header,match",
+    [
+        ("DO3?", True),
+        ("DOUT12?", True),
+        ("DOU3?", False),
+        ("DO?", False),
+        ("DO3", False),
+    ],
+)
+def test_scpi_pattern(header, match):
+    """Match short and long forms of a command with numeric suffix."""
+    assert (scpi_pattern("DOut#?").match(header) is not None) == match
@@ -37,9 +37,10 @@ from group_setup import GroupSetup
 from pyqtconfig import ConfigDialog, ConfigManager
 from qtpy import QtCore, QtGui, QtWidgets
 from widgets import ChannelWidget, TimerSpinBox
+from worker import DeviceWorker
 
 import controller
-from controller import DigIOBoxComm
+from controller import DeviceStatus, DigIOBoxComm
 
 
 class DigOutBoxController(QtWidgets.QMainWindow):
@@ -72,13 +73,16 @@ class DigOutBoxController(QtWidgets.QMainWindow):
         self.settings = None
         self.init_local_profile()
 
-        # communication handler
+        # communication handler, only used by the worker once it runs
         self.comm = None
+        self.identity = None
 
         # statusbar
         self.statusbar = self.statusBar()
         self.statusbartime = 3000  # time in ms to display messages
         self.setStatusBar(self.statusbar)
+        self.poll_rate_label = QtWidgets.QLabel()
+        self.statusbar.addPermanentWidget(self.poll_rate_label)
 
         # read hardware configuration
         self.hw_config = None
@@ -104,10 +108,24 @@ class DigOutBoxController(QtWidgets.QMainWindow):
         self.channel_widgets_individual = []
         self.channel_widgets_grouped = []
         self.group_widgets = []
+        # hardware channel -> widgets that show it, see `load_channels`
+        self._widget_index = {}
+        # last status read and channels set since then, see `update_status`
+        self._last_status = None
+        self._dirty = set()
+
+        # worker thread that owns the device
+        self.worker = DeviceWorker(self.comm, parent=self)
+        self.worker.status_read.connect(self.update_status)
+        self.worker.failed.connect(
+            lambda msg: self.statusbar.showMessage(msg, self.statusbartime)
+        )
+        self.worker.poll_rate.connect(self.show_poll_rate)
+
         self.load_file()
 
         # automatic read
-        self.read_timer = QtCore.QTimer(self)
+        self.worker.start()
         self.automatic_read()
 
     def init_comm(self):
@@ -126,6 +144,7 @@ class DigOutBoxController(QtWidgets.QMainWindow):
                 self.dummy = True
                 self.setWindowTitle(f"{self.window_title} (DEMO MODE)")
                 self.comm = DigIOBoxComm("dummy", dummy=True)
+                self.identity = self.comm.identify
                 return
 
         # open connection and check for correct device
@@ -134,6 +153,7 @@ class DigOutBoxController(QtWidgets.QMainWindow):
             identity = self.comm.identify
             if "DigIOBox" not in identity:
                 raise OSError
+            self.identity = identity
             self.comm.num_channels = len(self.hw_config)
         except:  # noqa
             QtWidgets.QMessageBox.warning(
@@ -357,19 +377,27 @@ class DigOutBoxController(QtWidgets.QMainWindow):
             f"Help can be found on GitHub:\n"
             f"https://github.com/galactic-forensics/DigOutBox\n\n"
             f"If you have issues, please report them on GitHub.\n\n"
-            f"{self.comm.identify}\n"
+            f"{self.identity}\n"
             f"GUI version: {self.version}\n"
             f"Interface version: {controller.__version__}",
         )
 
     def automatic_read(self):
-        """Thread out a timer to read the status of all channels and set statuses."""
-        self.read_all()
+        """Set how often the worker reads the status of all channels and read now.
+
+        The setting is the longest time between reads, the worker reads faster after
+        activity, see `DeviceWorker`.
+        """
         if self.settings.get("Activate automatic read"):
-            self.read_timer.timeout.connect(self.read_all)
-            self.read_timer.start(self.settings.get("Time between reads (s)") * 1000)
+            self.worker.set_interval(self.settings.get("Time between reads (s)"))
         else:
-            self.read_timer.stop()
+            self.worker.set_interval(None)
+
+    def changeEvent(self, event):
+        """Pause the automatic read while the window is minimized."""
+        if event.type() == QtCore.QEvent.Type.WindowStateChange:
+            self.worker.set_paused(self.isMinimized())
+        super().changeEvent(event)
 
     def clean_up_groups(self):
         """Clean up groups to make sure that all channels that are in groupsexist.
@@ -386,6 +414,12 @@ class DigOutBoxController(QtWidgets.QMainWindow):
         for group in to_del:
             del self.channel_groups[group]
 
+    def closeEvent(self, event):
+        """Stop the worker and close the connection when the window is closed."""
+        self.worker.stop()
+        self.comm.close()
+        super().closeEvent(event)
+
     def config_channels(self):
         """Configure the channels."""
         dialog = ChannelSetup(
@@ -413,6 +447,11 @@ class DigOutBoxController(QtWidgets.QMainWindow):
         """
         pass
 
+    def hideEvent(self, event):
+        """Pause the automatic read while the window is hidden."""
+        self.worker.set_paused(True)
+        super().hideEvent(event)
+
     def load_channels(self):
         """Load the channels into the GUI."""
         # fill channel widgets
@@ -424,7 +463,6 @@ class DigOutBoxController(QtWidgets.QMainWindow):
                     ChannelWidget(
                         channel=key,
                         hw_channel=[self.channels[key]["hw_channel"]],
-                        comm=self.comm,
                         controller=self,
                     )
                 )
@@ -433,7 +471,6 @@ class DigOutBoxController(QtWidgets.QMainWindow):
                     ChannelWidget(
                         channel=key,
                         hw_channel=[self.channels[key]["hw_channel"]],
-                        comm=self.comm,
                         controller=self,
                     )
                 )
@@ -448,11 +485,39 @@ class DigOutBoxController(QtWidgets.QMainWindow):
                 ChannelWidget(
                     channel=key,
                     hw_channel=hw_channel,
-                    comm=self.comm,
                     controller=self,
                     channel_names=self.channel_groups[key],
                 )
             )
+
+        # link groups and their channels, such that a channel only updates its groups
+        channel_widgets = {
+            widget.channel: widget
+            for widget in itertools.chain(
+                self.channel_widgets_individual, self.channel_widgets_grouped
+            )
+        }
+        for widget in self.group_widgets:
+            widget.members = [
+                channel_widgets[ch] for ch in self.channel_groups[widget.channel]
+            ]
+            widget.members_on = sum(member.is_on is True for member in widget.members)
+            for member in widget.members:
+                member.groups.append(widget)
+
+        # index the widgets by hardware channel, such that a read only updates the
+        # widgets of channels that changed
+        self._widget_index = {}
+        for widget in itertools.chain(
+            self.channel_widgets_individual,
+            self.channel_widgets_grouped,
+            self.group_widgets,
+        ):
+            for hw_ch in widget.hw_channel:
+                self._widget_index.setdefault(int(hw_ch), []).append(widget)
+        self._last_status = None
+        self._dirty = set()
+
         self.build_ui()
 
     def load_file(self, ask_fname: bool = False):
@@ -499,22 +564,12 @@ class DigOutBoxController(QtWidgets.QMainWindow):
             self.save()
 
     def read_all(self):
-        """Read the status of all channels and set the status indicators accordingly."""
-        if self.dummy:
-            read = [0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1]
-        else:
-            read = self.comm.states
+        """Let the worker read the status of all channels.
 
-        # now set the status indicators for each channel
-        for ch in itertools.chain(
-            self.channel_widgets_individual,
-            self.channel_widgets_grouped,
-            self.group_widgets,
-        ):
-            ch.set_status_from_read(read)
-
-        # software lockout
-        self.lockouts()
+        The status indicators are set when the worker emits the result, see
+        `update_status`.
+        """
+        self.worker.read()
 
     def save(self, ask_fname: bool = False):
         """Save the current configuration to default json file.
@@ -562,12 +617,19 @@ class DigOutBoxController(QtWidgets.QMainWindow):
     def set_all_channels(self, state: bool):
         """Turn all channels on or off."""
         if state:
-            for ch in itertools.chain(
-                self.channel_widgets_individual, self.channel_widgets_grouped
-            ):
-                ch.is_on = state
+            channel_widgets = list(
+                itertools.chain(
+                    self.channel_widgets_individual, self.channel_widgets_grouped
+                )
+            )
+            self.set_states(
+                {int(it): True for ch in channel_widgets for it in ch.hw_channel}
+            )
+            for ch in channel_widgets:
+                ch.set_status_custom(True)
         else:
-            self.comm.all_off()
+            self.worker.all_off()
+            self._dirty.update(self._widget_index)
             for ch in itertools.chain(
                 self.channel_widgets_individual,
                 self.channel_widgets_grouped,
@@ -575,13 +637,66 @@ class DigOutBoxController(QtWidgets.QMainWindow):
             ):
                 ch.set_status_custom(False)
 
-    def lockouts(self):
-        """Activate/deactivate buttons depending on software lockout state."""
-        if self.dummy:
-            status = False
+    def set_states(self, states: dict):
+        """Request the states of several channels from the worker.
+
+        The worker collects the requests of rapid clicks and sends them at once.
+
+        :param states: Dictionary with hardware channel numbers as keys and states
+            as values.
+        """
+        self._dirty.update(int(ch) for ch in states)
+        self.worker.set_states(states)
+
+    def showEvent(self, event):
+        """Resume the automatic read when the window is shown."""
+        self.worker.set_paused(False)
+        super().showEvent(event)
+
+    def show_poll_rate(self, rate: float):
+        """Show the measured rate of automatic reads in the statusbar.
+
+        :param rate: Reads per second, 0 if the automatic read is off or paused.
+        """
+        if rate > 0:
+            self.poll_rate_label.setText(f"Reads: {rate:.1f}/s")
+        else:
+            self.poll_rate_label.setText("Reads: off")
+
+    def update_status(self, status: DeviceStatus):
+        """Set the status indicators and lockouts from a status read by the worker.
+
+        Only the widgets of channels that changed since the last read, or that were
+        set from the GUI in the meantime, are updated. The lockouts are only toggled
+        if the lock state changed.
+
+        :param status: `DeviceStatus` of the box.
+        """
+        previous = self._last_status
+        self._last_status = status
+
+        if previous is None:
+            changed = set(self._widget_index)
         else:
-            status = self.comm.interlock_state or self.comm.software_lockout
+            changed = set(status.states.diff(previous.states))
+        changed |= self._dirty
+        self._dirty = set()
 
+        widgets = dict.fromkeys(
+            widget for ch in changed for widget in self._widget_index.get(ch, ())
+        )
+        for widget in widgets:
+            widget.set_status_from_read(status.states)
+
+        # software lockout
+        if previous is None or previous.locked != status.locked:
+            self.lockouts(status.locked)
+
+    def lockouts(self, status: bool):
+        """Activate/deactivate buttons depending on software lockout state.
+
+        :param status: Whether the interlock or the software lockout is active.
+        """
         buttons_to_toggle = [self.all_on_button]  # non-widget buttons to toggle
 
         for button in buttons_to_toggle:
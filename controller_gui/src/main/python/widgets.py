@@ -1,12 +1,9 @@
 """Provide some home-made Qt widgets."""
 
-import itertools
-from typing import Union
+from typing import Sequence, Union
 
 from qtpy import QtCore, QtGui, QtWidgets
 
-from controller import DigIOBoxComm
-
 
 class ChannelWidget(QtWidgets.QWidget):
     """Channel and group widget that allows to turn an individual channel on or off."""
@@ -15,7 +12,6 @@ class ChannelWidget(QtWidgets.QWidget):
         self,
         channel: str,
         hw_channel: list[str],
-        comm: DigIOBoxComm,
         parent=None,
         controller=None,
         is_on: bool = None,
@@ -26,7 +22,6 @@ class ChannelWidget(QtWidgets.QWidget):
         :param channel: Channel name.
         :param hw_channel: List of hardware channels, e.g. ["7", "10"] or ["3"] for a
             single channel.
-        :param comm: Communication object.
         :param parent: Parent widget.
         :param controller: Controller object.
         :param is_on: Whether the channel is currently on.
@@ -47,9 +42,15 @@ class ChannelWidget(QtWidgets.QWidget):
             self.channel_names = [channel]
 
         self.hw_channel = hw_channel
-        self.comm = comm
         self.controller = controller
 
+        # channel widgets of a group and groups of a channel, set by the controller
+        self.members = []
+        self.groups = []
+        # number of members that are on, kept up to date by the members
+        self.members_on = 0
+        self._is_on = None
+
         # status indicator
         self.status_indicator = StatusIndicator()
 
@@ -70,7 +71,7 @@ class ChannelWidget(QtWidgets.QWidget):
 
     @is_on.setter
     def is_on(self, value: Union[bool, None]):
-        self._is_on = value
+        self._set_state(value)
         self.set_status()
 
     def init_ui(self):
@@ -116,63 +117,57 @@ class ChannelWidget(QtWidgets.QWidget):
 
     def set_status(self):
         """Set the font color depending on the channel status."""
-        self.status_indicator.set_status(self.is_on)
+        state = self.is_on
+        self.status_indicator.set_status(state)
 
         # send command
-        if self.is_on is not None:
-            for it in self.hw_channel:
-                ch = self.comm.channel[it]
-                ch.state = self.is_on
-
-        # update the status of the channels if a group of lasers was changed in state
-        if len(self.hw_channel) > 1:
-            for other_channel in itertools.chain(
-                self.controller.channel_widgets_individual,
-                self.controller.channel_widgets_grouped,
-            ):
-                other_channel.set_status_custom(self.is_on, self.channel_names)
+        if state is not None:
+            self.controller.set_states({int(it): state for it in self.hw_channel})
 
-        # update grouped channels
-        for other_channel in self.controller.group_widgets:
-            other_channel.set_status_group()
+        # update the status of the channels if a group of lasers was changed in state,
+        # the channels update their groups (and this one) on the way
+        for member in self.members:
+            member.set_status_custom(state)
 
-    def set_status_custom(self, state: Union[bool, str], ch_check: list[str] = None):
+    def set_status_custom(self, state: Union[bool, str]):
         """Set the status light without sending any commands.
 
         :param state: State to set the status to. Can be True, False, None, or "mixed".
-        :param ch_check: If set, only sets the indicator if the ch_check list contains
-            this channel's name.
         """
-        if ch_check is not None:
-            if self.channel not in ch_check:
-                return
         self.status_indicator.set_status(state)
-        self._is_on = state
+        self._set_state(state)
 
     def set_status_group(self):
-        """Automatically check group status in comparison with individual channels."""
-        if len(self.hw_channel) > 1:
-            states = []
-            for other_ch in itertools.chain(
-                self.controller.channel_widgets_individual,
-                self.controller.channel_widgets_grouped,
-            ):
-                if other_ch.channel in self.channel_names:
-                    states.append(other_ch.is_on)
+        """Set the group status from the number of members that are on."""
+        if not self.members:
+            return
 
-            if all(states):
-                state = True
-            elif not any(states):
-                state = False
-            else:
-                state = "mixed"
+        if self.members_on == len(self.members):
+            state = True
+        elif self.members_on == 0:
+            state = False
+        else:
+            state = "mixed"
 
-            self.set_status_custom(state)
+        self.set_status_custom(state)
+
+    def _set_state(self, state: Union[bool, str, None]):
+        """Store the state and update the groups if the channel turned on or off.
+
+        :param state: New state.
+        """
+        was_on = self._is_on is True
+        self._is_on = state
+        if was_on != (state is True):
+            for group in self.groups:
+                group.members_on += 1 if state is True else -1
+                group.set_status_group()
 
-    def set_status_from_read(self, all_states: list[int]):
+    def set_status_from_read(self, all_states: Sequence[int]):
         """Set the status from the read all list of values.
 
-        :param all_states: List of the states of all channels as integers.
+        :param all_states: States of all channels, e.g., a list of integers or a
+            `StateMask`.
         """
         try:
             states = [bool(all_states[int(it)]) for it in self.hw_channel]
@@ -186,17 +181,18 @@ class ChannelWidget(QtWidgets.QWidget):
             return
 
         self.set_status_custom(state)
-        pass
 
 
-class TimerSpinBox(QtWidgets.QSpinBox):
-    """QSpinBox for timer with min 1, max of 999."""
+class TimerSpinBox(QtWidgets.QDoubleSpinBox):
+    """QDoubleSpinBox for timer with min 0.1, max of 999, and steps of 0.1."""
 
     def __init__(self, parent=None):
         """Initialize the spin box with new settings."""
         super().__init__(parent)
-        self.setMinimum(1)
+        self.setDecimals(1)
+        self.setMinimum(0.1)
         self.setMaximum(999)
+        self.setSingleStep(0.1)
 
 
 class StatusIndicator(QtWidgets.QWidget):
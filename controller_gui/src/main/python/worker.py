@@ -0,0 +1,253 @@
+"""Background worker that owns the DigOutBox."""
+
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Union
+
+from qtpy import QtCore
+
+from controller import DigIOBoxComm
+
+# priorities of the queued items, lower goes first
+_URGENT = 0
+_NORMAL = 1
+_STOP = 2
+
+# time in seconds to keep reading fast after activity or a change
+FAST_HOLD = 1.0
+
+
+class DeviceWorker(QtCore.QThread):
+    """Thread that owns the device, polls its status, and executes commands.
+
+    All communication with the box happens in this thread, such that a slow or
+    unplugged box never blocks the user interface. Commands are queued with
+    `submit` and executed in order, urgent commands go first. In between, the
+    status of the box is read and emitted with `status_read`.
+
+    Reads are scheduled adaptively: for `FAST_HOLD` seconds after a command or a
+    read that found a change, the status is read every `fastest` seconds. After
+    that, every read without a change doubles the time to the next read, up to
+    `interval` seconds. Periodic reads stop while
+    the worker is paused. The measured read rate is emitted with `poll_rate`.
+
+    Channel states requested with `set_states` are collected for `coalesce`
+    seconds and then sent with one command, only the last requested state of each
+    channel is sent. `all_off` drops the collected states and jumps the queue.
+    """
+
+    # emitted with the `DeviceStatus` after every read
+    status_read = QtCore.Signal(object)
+    # emitted with an error message if a command or a read failed
+    failed = QtCore.Signal(str)
+    # emitted with the measured number of reads per second, 0 if reads stopped
+    poll_rate = QtCore.Signal(float)
+
+    def __init__(
+        self,
+        comm: DigIOBoxComm,
+        interval: Union[float, None] = None,
+        fastest: float = 0.1,
+        coalesce: float = 0.05,
+        parent=None,
+    ):
+        """Initialize the worker, call `start` to run it.
+
+        :param comm: Communication object, which must not be used by other threads
+            while the worker runs.
+        :param interval: Longest time between reads in seconds, `None` to only read
+            on request.
+        :param fastest: Time between reads in seconds after activity.
+        :param coalesce: Time in seconds to collect channel states before they are
+            sent.
+        :param parent: Parent object.
+        """
+        super().__init__(parent)
+        self.comm = comm
+        self.coalesce = coalesce
+        self.fastest = fastest
+        self._interval = interval
+        self._current = interval
+        self._fast_until = 0.0
+        self._paused = False
+        self._last_status = None
+        self._read_times = deque(maxlen=10)
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+
+        # channel states that were requested but not sent yet
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flush_at = None
+
+    def all_off(self):
+        """Turn all channels off before anything else that is queued.
+
+        Channel states that were requested but not sent yet are dropped.
+        """
+        with self._lock:
+            self._pending = {}
+            self._flush_at = None
+        self.submit(self.comm.all_off, urgent=True)
+        self.submit(self._activity)
+
+    def read(self):
+        """Request a read of the status as soon as the queued commands are done."""
+        self.submit(self._read)
+
+    def set_interval(self, interval: Union[float, None]):
+        """Set the longest time between reads.
+
+        :param interval: Longest time between reads in seconds, `None` to only read
+            on request.
+        """
+        self.submit(self._set_interval, interval)
+
+    def set_paused(self, paused: bool):
+        """Pause or resume the periodic reads, e.g., while the window is hidden.
+
+        :param paused: Whether to pause the periodic reads.
+        """
+        self.submit(self._set_paused, paused)
+
+    def set_states(self, states: Dict[int, bool]):
+        """Request channel states, which are sent after the coalescing time.
+
+        :param states: Dictionary with hardware channel numbers as keys and states
+            as values.
+        """
+        with self._lock:
+            if self._flush_at is None:
+                self._flush_at = time.monotonic() + self.coalesce
+            self._pending.update(states)
+        # wake up the worker such that it waits for the new deadlines
+        self.submit(self._activity)
+
+    def stop(self):
+        """Stop the worker after the queued commands and wait for it."""
+        self._put(_STOP, None)
+        self.wait()
+
+    def submit(self, fn: Callable, *args, urgent: bool = False):
+        """Queue a function call that talks to the box.
+
+        :param fn: Function to call in the worker thread, e.g., a method of `comm`.
+        :param args: Arguments to call the function with.
+        :param urgent: Execute the call before all non-urgent queued calls.
+        """
+        self._put(_URGENT if urgent else _NORMAL, (fn, args))
+
+    def run(self):
+        """Execute queued commands, send requested states, and read periodically."""
+        self._next_read = time.monotonic()
+        while True:
+            try:
+                _, _, item = self._queue.get(timeout=self._timeout())
+            except queue.Empty:
+                item = ()
+            if item is None:
+                self._call(self._flush)
+                return
+
+            if item:
+                self._call(*item)
+            if self._flush_at is not None and time.monotonic() >= self._flush_at:
+                self._call(self._flush)
+            if self._polling() and time.monotonic() >= self._next_read:
+                self._call(self._read)
+
+    def _activity(self):
+        """Read fast after a command."""
+        if self._interval is None:
+            return
+        self._fast_until = time.monotonic() + FAST_HOLD
+        self._current = min(self.fastest, self._interval)
+        self._next_read = min(self._next_read, time.monotonic() + self._current)
+
+    def _call(self, fn: Callable, args: tuple = ()):
+        """Call a function and report errors with `failed`."""
+        try:
+            fn(*args)
+        except Exception as err:
+            self.failed.emit(f"Communication with the DigOutBox failed: {err}")
+
+    def _flush(self):
+        """Send the requested channel states."""
+        with self._lock:
+            states = self._pending
+            self._pending = {}
+            self._flush_at = None
+        if states:
+            self.comm.set_states(states)
+
+    def _put(self, priority: int, item):
+        """Put an item in the queue, items of equal priority keep their order."""
+        self._queue.put((priority, next(self._order), item))
+
+    def _polling(self) -> bool:
+        """Return whether the status is read periodically."""
+        return self._interval is not None and not self._paused
+
+    def _read(self):
+        """Send the requested states, read the status of the box, and emit it.
+
+        The time to the next read is adapted depending on whether the status changed.
+        """
+        self._flush()
+        now = time.monotonic()
+        if self._interval is not None:
+            # do not retry right away if the read fails
+            self._next_read = now + self._current
+        status = self.comm.status()
+
+        if self._interval is not None:
+            if status != self._last_status:
+                self._fast_until = now + FAST_HOLD
+            if now < self._fast_until:
+                self._current = min(self.fastest, self._interval)
+            else:
+                self._current = min(2 * self._current, self._interval)
+            self._next_read = now + self._current
+        self._last_status = status
+        self.status_read.emit(status)
+
+        self._read_times.append(now)
+        if self._polling() and len(self._read_times) > 1:
+            elapsed = self._read_times[-1] - self._read_times[0]
+            self.poll_rate.emit((len(self._read_times) - 1) / max(elapsed, 1e-6))
+
+    def _set_interval(self, interval: Union[float, None]):
+        """Set the longest time between reads and read right away."""
+        self._interval = interval
+        self._current = None if interval is None else min(self.fastest, interval)
+        self._restart_rate()
+        self._read()
+
+    def _set_paused(self, paused: bool):
+        """Pause or resume the periodic reads, read right away when resuming."""
+        if paused == self._paused:
+            return
+        self._paused = paused
+        self._restart_rate()
+        if not paused and self._interval is not None:
+            self._current = min(self.fastest, self._interval)
+            self._read()
+
+    def _restart_rate(self):
+        """Forget the read times and emit a rate of 0 if reads stopped."""
+        self._read_times.clear()
+        if not self._polling():
+            self.poll_rate.emit(0.0)
+
+    def _timeout(self) -> Union[float, None]:
+        """Return the time until the next flush or read, `None` if none is due."""
+        deadlines = [self._flush_at]
+        if self._polling():
+            deadlines.append(self._next_read)
+        deadlines = [it for it in deadlines if it is not None]
+        if not deadlines:
+            return None
+        return max(min(deadlines) - time.monotonic(), 0)
@@ -0,0 +1,1171 @@
+/*
+ * Firmware v030 for DigIOBox
+ */
+#include <Arduino.h>
+#include <RCSwitch.h>
+// the program commands need more tokens and commands than the parser defaults
+#define SCPI_MAX_TOKENS 20
+#define SCPI_MAX_COMMANDS 25
+#include <Vrekrer_scpi_parser.h>
+#include "config.h"
+
+SCPI_Parser DigIOBox;
+RCSwitch myRemote = RCSwitch();
+
+// Functions for SCPI Communication
+void Identify(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void GetAllDigIO(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void GetDigIO(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void GetMaskDigIO(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void GetStatus(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void GetBaudRate(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void GetBaudRateList(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void SetBaudRate(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void SerialError(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void SetBinaryMode(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void GetEvents(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void SetEvents(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void GetSwitchingSkew(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void GetProgram(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void ClearProgram(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void AddProgramEntry(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void SetProgramRepeat(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void RunProgram(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void AbortProgram(SCPI_C commands, SCPI_P parameters, Stream& interface);
+
+// Functions for binary communication
+void ProcessBinary();
+void ExecuteFrame();
+int FramePayloadSize(byte opcode);
+byte FrameChecksum(byte* data, int length);
+void SendFrame(byte opcode, byte* payload, int length);
+void SetDigIO(SCPI_C commands, SCPI_P parameters, Stream& interface);
+void SetMaskDigIO(SCPI_C commands, SCPI_P parameters, Stream& interface);
+
+// General functions
+void ListenForRemote();
+int GetChannel(int ch);
+void SetChannel(int ch, int state);
+void AllOff();
+unsigned long AllChannelsMask();
+unsigned long GetAllChannels();
+void ChangeBaudRate(unsigned long rate);
+void SendEvent();
+void CheckBaudRate();
+void StartProgram();
+void StepProgram();
+void ApplyMask(unsigned long values, unsigned long mask);
+void SetupPorts();
+int PortIndex(int pin);
+unsigned long SwitchingSkew();
+
+// Interlock variable: True if currently triggered
+bool IsInterlocked = true;
+
+// Software lockout active?
+bool SoftwareLockoutToggle = false;
+int SoftwareLockoutCounter = 0;
+unsigned long SoftwareLockoutClock = 0;
+
+// Serial baud rates: the box always starts at the default rate and the host can
+// switch to any of the supported rates.
+const unsigned long DefaultBaudRate = 9600;
+const unsigned long BaudRates[] = {9600, 19200, 38400, 57600, 115200, 250000};
+const int numOfBaudRates = sizeof(BaudRates) / sizeof(BaudRates[0]);
+// A new rate must be confirmed with BAUDrate? within this time (ms),
+// otherwise the box reverts to the default rate.
+const unsigned long BaudRateRevertTime = 1000;
+unsigned long BaudRate = DefaultBaudRate;
+bool BaudRatePending = false;
+unsigned long BaudRateClock = 0;
+
+// Events: if enabled, state changes that the host did not cause are reported
+// unsolicited as soon as no command is processed, see SendEvent()
+bool EventsEnabled = false;
+volatile byte PendingEvent = 0;  // source of the last unreported change, 0 if none
+const byte EventRF = 1;
+const byte EventInterlock = 2;
+const byte EventLockout = 3;
+const byte EventProgram = 4;
+
+// Pulse program: a list of entries that are executed from loop() without the
+// host, see StepProgram(). Every entry sets the channels in its mask to its
+// values, delay milliseconds after the previous entry (or after the start).
+struct ProgramEntry {
+  unsigned long delay;
+  unsigned long values;
+  unsigned long mask;
+};
+const int ProgramMaxLength = 32;
+// Longest delay of an entry in ms: StepProgram compares micros() as a signed
+// difference, which only holds for intervals below 2^31 us
+const unsigned long ProgramMaxDelay = 2147483;
+ProgramEntry Program[ProgramMaxLength];
+int ProgramLength = 0;
+unsigned int ProgramRepeat = 1;  // number of runs, 0 to run until aborted
+volatile bool ProgramRunning = false;  // cleared by the interlock, see AllOff()
+int ProgramStep = 0;  // index of the next entry
+unsigned int ProgramCycle = 0;  // number of completed runs
+unsigned long ProgramDue = 0;  // micros() at which the next entry is due
+
+// Direct port access: all outputs that ApplyMask() switches are written with
+// back-to-back port register writes while interrupts are disabled, see
+// SetupPorts(). Output ports come first, followed by ports with LEDs only.
+const int MaxPorts = 2 * numOfChannels;
+volatile uint8_t* PortRegisters[MaxPorts];
+int NumOfPorts = 0;
+int NumOfDOutPorts = 0;
+byte DOutPort[numOfChannels];  // index into PortRegisters
+byte DOutBit[numOfChannels];
+byte LedPort[numOfChannels];
+byte LedBit[numOfChannels];
+// CPU cycles per port register write in ApplyMask(): load pointer, load
+// value, store, and loop overhead
+const unsigned long SwitchCycles = 12;
+
+// Binary mode: frames of sync byte, opcode, fixed-size payload, and CRC-8
+bool BinaryMode = false;
+const byte FrameSync = 0xA5;
+const int FrameMaxLength = 15;
+const unsigned long FrameTimeout = 100;  // ms to receive a full frame
+byte BinaryFrame[FrameMaxLength];
+int BinaryFrameLength = 0;
+unsigned long BinaryFrameClock = 0;
+
+// Opcodes of the binary mode, replies use the opcode of the request
+const byte OpIdentify = 0x01;       // reply: hardware and firmware version (6 bytes)
+const byte OpGetDigIO = 0x10;       // payload: channel, reply: state
+const byte OpSetDigIO = 0x11;       // payload: channel, state
+const byte OpGetAllDigIO = 0x12;    // reply: states mask (4 bytes), number of channels
+const byte OpGetMaskDigIO = 0x13;   // reply: states mask (4 bytes)
+const byte OpSetMaskDigIO = 0x14;   // payload: values (4 bytes), mask (4 bytes)
+const byte OpAllOff = 0x15;
+const byte OpInterlockState = 0x16; // reply: interlock state
+const byte OpSWLockout = 0x17;      // reply: software lockout state
+const byte OpStatus = 0x18;         // reply: states mask (4 bytes), interlock, software lockout
+const byte OpEvents = 0x19;         // payload: 1 to enable events, 0 to disable
+const byte OpProgramClear = 0x30;
+const byte OpProgramAdd = 0x31;     // payload: delay, values, mask (4 bytes each)
+const byte OpProgramRepeat = 0x32;  // payload: repeat (2 bytes)
+const byte OpProgramRun = 0x33;
+const byte OpProgramAbort = 0x34;
+const byte OpProgramState = 0x35;   // reply: running, step, cycle (2 bytes), length, repeat (2 bytes)
+const byte OpSwitchingSkew = 0x36;  // reply: skew in ns (4 bytes)
+const byte OpExit = 0x1F;           // reply: empty frame, then back to SCPI
+const byte OpEvent = 0x20;          // unsolicited: states mask (4 bytes), interlock, software lockout, source
+
+
+void setup() {
+
+  // SCPI Setup
+  DigIOBox.RegisterCommand(F("*IDN?"), &Identify);
+  DigIOBox.RegisterCommand(F("DOut#?"), &GetDigIO);
+  DigIOBox.RegisterCommand(F("DOut#"), &SetDigIO);
+  DigIOBox.RegisterCommand(F("ALLDOut?"), &GetAllDigIO);
+  DigIOBox.RegisterCommand(F("MASKDOut?"), &GetMaskDigIO);
+  DigIOBox.RegisterCommand(F("MASKDOut"), &SetMaskDigIO);
+  DigIOBox.RegisterCommand(F("MASKDOut:SKEW?"), &GetSwitchingSkew);  // returns skew bound in ns
+  DigIOBox.RegisterCommand(F("ALLOFF"), &AllOff);
+  DigIOBox.RegisterCommand(F("INTERLOCKState?"), &GetInterlockState);  // returns 1 if interlocked
+  DigIOBox.RegisterCommand(F("SWLockout?"), &GetSoftwareLockoutState);  // returns 1 if software is locked
+  DigIOBox.RegisterCommand(F("STATus?"), &GetStatus);  // returns states mask, interlock, software lockout
+  DigIOBox.RegisterCommand(F("BAUDrate?"), &GetBaudRate);  // returns current baud rate, confirms a new one
+  DigIOBox.RegisterCommand(F("BAUDrate:LIST?"), &GetBaudRateList);  // returns supported baud rates
+  DigIOBox.RegisterCommand(F("BAUDrate"), &SetBaudRate);
+  DigIOBox.RegisterCommand(F("BINary"), &SetBinaryMode);  // switch to binary frames
+  DigIOBox.RegisterCommand(F("EVENTs?"), &GetEvents);  // returns 1 if events are enabled
+  DigIOBox.RegisterCommand(F("EVENTs"), &SetEvents);
+  DigIOBox.RegisterCommand(F("PROGram?"), &GetProgram);  // returns running,step,cycle,length,repeat
+  DigIOBox.RegisterCommand(F("PROGram:CLEar"), &ClearProgram);
+  DigIOBox.RegisterCommand(F("PROGram:ADD"), &AddProgramEntry);
+  DigIOBox.RegisterCommand(F("PROGram:REPeat"), &SetProgramRepeat);
+  DigIOBox.RegisterCommand(F("PROGram:RUN"), &RunProgram);
+  DigIOBox.RegisterCommand(F("PROGram:ABORt"), &AbortProgram);
+  DigIOBox.SetErrorHandler(&SerialError);
+
+  // Output and LED setups
+  for (int it = 0; it < numOfChannels; it++) {
+    pinMode(DOut[it], OUTPUT);
+    pinMode(LedPins[it], OUTPUT);
+  }
+  SetupPorts();
+
+  // RF Remote setup
+  myRemote.setPulseLength(185);
+  myRemote.setRepeatTransmit(5);
+
+  // Start serial console
+  Serial.begin(DefaultBaudRate);
+
+  // Put the switches into the off position
+  AllOff();
+
+  // Interlock setup
+  if (EnableInterlock == true) {
+    pinMode(InterlockPin, INPUT_PULLUP);
+    attachInterrupt(digitalPinToInterrupt(InterlockPin), interlock, CHANGE);
+    // check interlock status and activate / deactivate remote
+    interlock();
+  }
+  else {
+    myRemote.enableReceive(RFInterrupt);
+    IsInterlocked = false;
+  }
+}
+
+
+void loop() {
+  // only work when interlocked is pulled down
+  if (BinaryMode) {
+    ProcessBinary();
+  }
+  else {
+    DigIOBox.ProcessInput(Serial, "\n");
+  }
+  CheckBaudRate();
+  ListenForRemote();
+  if (ProgramRunning) {
+    StepProgram();
+  }
+  if (EventsEnabled && PendingEvent != 0) {
+    SendEvent();
+  }
+}
+
+
+void interlock() {
+  // Turn all channels off and disable remote
+  if (digitalRead(InterlockPin) == HIGH) {
+    if (debug == true) {
+      Serial.println("Interlock triggered.");
+    }
+
+    AllOff();
+    myRemote.disableReceive();
+    IsInterlocked = true;
+    PendingEvent = EventInterlock;
+
+  }
+  // Turn remote back on.
+  else {
+    if (debug == true) {
+      Serial.println("Interlock not triggered.");
+    }
+
+    myRemote.enableReceive(RFInterrupt);
+    IsInterlocked = false;
+    PendingEvent = EventInterlock;
+  }
+}
+
+void software_lockout() {
+  // Lock the software out with the remote
+  if (not SoftwareLockoutToggle) {
+    SoftwareLockoutToggle = true;
+    if (debug == true) {
+      Serial.println("Software lockout activated.");
+    }
+  }
+  else {
+    if (debug == true) {
+      Serial.print("Software lockout counter: ");
+      Serial.println(SoftwareLockoutCounter);
+    }
+    // this is the first click
+    if (SoftwareLockoutCounter == 0) {
+      SoftwareLockoutCounter++;
+      SoftwareLockoutClock = millis();
+    }
+    // this is the second click
+    else {
+      // click was not in time
+      if (millis() - SoftwareLockoutClock > SoftwareLockoutDoubleClickTime) {
+        if (debug == true) {
+          Serial.println("Assuming this is the first click.");
+        }
+        SoftwareLockoutCounter = 1;
+        SoftwareLockoutClock = millis();
+      }
+      // second click -> deactivate SoftwareLockout
+      else {
+        if (debug == true) {
+          Serial.println("Deactivating software lockout.");
+        }
+        SoftwareLockoutCounter = 0;
+        SoftwareLockoutToggle = false;
+        SoftwareLockoutClock = 0;
+      }
+    }
+  }
+}
+
+
+void Identify(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  interface.print(F("DigIOBox, Hardware "));
+  interface.print(hw_version);
+  interface.print(", Firmware ");
+  interface.println(fw_version);
+}
+
+
+void GetAllDigIO(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // ALLDOut?
+  // Query all logic states of the available DOut pins
+  // Return values are "1" or "0", aranged in a comma separated values list
+  for (int it = 0; it < numOfChannels - 1; it++) {  // all but the last
+    interface.print(GetChannel(it));
+    interface.print(",");
+  }
+  // print the last
+  interface.println(GetChannel(numOfChannels - 1));
+}
+
+
+void GetMaskDigIO(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // MASKDOut?
+  // Query all logic states of the available DOut pins as one hexadecimal
+  // bitmask, bit n is DOut[n].
+  // Example:
+  //  MASKDO?  (Returns 5 if DOut[0] and DOut[2] are HIGH, all others LOW)
+  interface.println(GetAllChannels(), HEX);
+}
+
+
+void GetDigIO(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // DOut<index>?
+  // Queries the logic state of DOut[index] pin
+  // Return values are "1" or "0"
+  // Examples:
+  //  DO4?    (Queries the state of DOut[4] pin)
+  //  DOut1000?  (This does nothing as DOut[1000] does not exists)
+
+  //Get the numeric suffix/index (if any) from the commands
+  String header = String(commands.Last());
+
+  header.toUpperCase();
+
+  int suffix = -1;
+
+  sscanf(header.c_str(),"%*[DO]%u", &suffix);
+
+  //If the suffix is valid, print the pin's logic value to the interface
+  if ( (suffix >= 0) && (suffix < numOfChannels) ) {
+    interface.println(GetChannel(suffix));
+  }
+}
+
+
+void SetDigIO(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // DOut<index> state
+  // Sets the logic state of DOut[index] pin
+  // Valid states are : "HIGH", "LOW", "ON", "OFF", "1" and "0"
+  // and any lowercase/uppercase combinations
+  // Examples:
+  //  DOut4 1  (Sets DOut[4] to HIGH)
+  //  DO0 1  (Sets DOut[0] to HIGH)
+
+  // do nothing if software is locked out
+  if (not SoftwareLockoutToggle) {
+    //Get the numeric suffix/index (if any) from the commands
+    String header = String(commands.Last());
+    header.toUpperCase();
+    int suffix = -1;
+
+    sscanf(header.c_str(),"%*[DO]%u", &suffix);
+
+    //If the suffix is valid,
+    //use the first parameter (if valid) to set the digital Output
+    String first_parameter = String(parameters.First());
+    first_parameter.toUpperCase();
+    if ( (suffix >= 0) && (suffix < numOfChannels) ) {
+      if (first_parameter == "1") {
+        SetChannel(suffix, 1);
+      }
+      else if (first_parameter == "0"){
+        SetChannel(suffix, 0);
+      }
+    }
+  }
+}
+
+
+void SetMaskDigIO(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // MASKDOut values,mask
+  // Sets the logic states of all DOut pins that are selected in mask to the
+  // corresponding bits of values. Bit n of values / mask is DOut[n].
+  // Both parameters are hexadecimal. If no mask is given, all channels are set.
+  // All pins switch together, see MASKDOut:SKEW?.
+  // Examples:
+  //  MASKDO 3  (Sets DOut[0] and DOut[1] to HIGH, all others to LOW)
+  //  MASKDO 1,3  (Sets DOut[0] to HIGH and DOut[1] to LOW, leaves all others)
+
+  // do nothing if software is locked out
+  if (not SoftwareLockoutToggle) {
+    if (parameters.Size() < 1) {
+      return;
+    }
+
+    unsigned long values = strtoul(parameters[0], NULL, 16);
+    unsigned long mask = AllChannelsMask();
+    if (parameters.Size() > 1) {
+      mask = strtoul(parameters[1], NULL, 16);
+    }
+
+    ApplyMask(values, mask);
+  }
+}
+
+
+void GetSwitchingSkew(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // MASKDOut:SKEW?
+  // Query the maximum time in ns between the first and the last output that
+  // switch with one MASKDOut command
+  interface.println(SwitchingSkew());
+}
+
+
+void ListenForRemote() {
+  if (myRemote.available()) {
+    // read remote value
+    long received_value = myRemote.getReceivedValue();
+    int channel = -3;  // no channel
+    // Read channel to be triggered
+    for (int it = 0; it < numOfRemoteButtons; it++) {
+      for (int rt = 0; rt < numOfRemotes; rt++) {
+        if (received_value == RFRemoteCodes[it][rt]){
+          channel = RFChannels[it];
+         break;
+        }
+      }
+     if (channel != -3) {
+       break;
+     }
+    }
+
+    if (debug == true) {
+      Serial.print("Valid RF Remote code received: ");
+      Serial.print(received_value);
+      Serial.print(" / Channel associated: ");
+      Serial.println(channel);
+    }
+
+    // Now toggle if required
+    if (channel == -1) {
+      AllOff();
+      PendingEvent = EventRF;
+    }
+    else if (channel == -2) {
+      software_lockout();
+      PendingEvent = EventLockout;
+      delay(rf_delay);
+    }
+    else if ((channel > -1) && (channel < numOfChannels)) {
+      ToggleRFChannel(channel);
+      PendingEvent = EventRF;
+      delay(rf_delay);
+    }
+
+    // Reset remote connection
+    myRemote.resetAvailable();
+  }
+}
+
+
+int GetChannel(int ch) {
+  // Get the status of a channel, return 0 if off, otherwise on
+  // In order to invert actual channels, we read the LED state here!
+  if (digitalRead(LedPins[ch]) == HIGH) {
+    return 1;
+  }
+  else {
+    return 0;
+  }
+
+}
+
+void GetSoftwareLockoutState(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // Get the state of the SoftwareLockoutToggle. return 0 if off, 1 if on.
+  if (SoftwareLockoutToggle) {
+    interface.println(1);
+  }
+  else {
+    interface.println(0);
+  }
+
+}
+
+void GetStatus(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // STATus?
+  // Query the states of all channels, the interlock, and the software lockout
+  // with one command. Returns the hexadecimal bitmask of all channel states
+  // (see MASKDOut?), followed by the interlock and software lockout states.
+  // Example:
+  //  STAT?  (Returns 5,0,1 if DOut[0] and DOut[2] are HIGH, the interlock is
+  //          not triggered, and the software lockout is active)
+  interface.print(GetAllChannels(), HEX);
+  interface.print(",");
+  interface.print(IsInterlocked ? 1 : 0);
+  interface.print(",");
+  interface.println(SoftwareLockoutToggle ? 1 : 0);
+}
+
+void GetBaudRate(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // BAUDrate?
+  // Query the current baud rate. This also confirms a new baud rate.
+  BaudRatePending = false;
+  interface.println(BaudRate);
+}
+
+void GetBaudRateList(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // BAUDrate:LIST?
+  // Query all supported baud rates as a comma separated list
+  for (int it = 0; it < numOfBaudRates - 1; it++) {  // all but the last
+    interface.print(BaudRates[it]);
+    interface.print(",");
+  }
+  interface.println(BaudRates[numOfBaudRates - 1]);
+}
+
+void SetBaudRate(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // BAUDrate rate
+  // Switch to a new baud rate. The box answers with the rate it will use at the
+  // current rate and then switches. Unsupported rates are answered with the
+  // current rate. The new rate must be confirmed with BAUDrate? at the new rate
+  // within BaudRateRevertTime, otherwise the box reverts to the default rate.
+  // Example:
+  //  BAUD 115200  (Returns 115200 and switches to 115200 baud)
+  if (parameters.Size() < 1) {
+    interface.println(BaudRate);
+    return;
+  }
+
+  unsigned long rate = strtoul(parameters.First(), NULL, 10);
+  bool supported = false;
+  for (int it = 0; it < numOfBaudRates; it++) {
+    if (BaudRates[it] == rate) {
+      supported = true;
+    }
+  }
+  if (not supported) {
+    interface.println(BaudRate);
+    return;
+  }
+
+  interface.println(rate);
+  ChangeBaudRate(rate);
+  BaudRatePending = (rate != DefaultBaudRate);
+  BaudRateClock = millis();
+}
+
+void SerialError(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // Input that cannot be parsed at a negotiated baud rate usually means that
+  // the host talks at another rate, e.g., after it reconnected.
+  // Fall back to the default rate in this case.
+  if (BaudRate != DefaultBaudRate) {
+    ChangeBaudRate(DefaultBaudRate);
+    BaudRatePending = false;
+  }
+}
+
+void SetBinaryMode(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // BINary 1
+  // Switch to the binary mode. The box answers 1 and then only accepts
+  // binary frames. See ProcessBinary() for details.
+  String first_parameter = String(parameters.First());
+  if (first_parameter == "1") {
+    interface.println(1);
+    BinaryFrameLength = 0;
+    BinaryMode = true;
+  }
+}
+
+void GetEvents(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // EVENTs?
+  // Query if events are enabled: 1 if enabled, 0 if disabled
+  interface.println(EventsEnabled ? 1 : 0);
+}
+
+void SetEvents(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // EVENTs state
+  // Enable (1) or disable (0) unsolicited events. See SendEvent() for details.
+  String first_parameter = String(parameters.First());
+  if (first_parameter == "1") {
+    PendingEvent = 0;
+    EventsEnabled = true;
+  }
+  else if (first_parameter == "0") {
+    EventsEnabled = false;
+  }
+}
+
+void GetProgram(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // PROGram?
+  // Query the progress of the pulse program: running (1) or not (0), index of
+  // the next entry, number of completed runs, number of entries, and number of
+  // runs (0 runs until aborted).
+  // Example:
+  //  PROG?  (Returns 1,2,0,4,1 while the third of four entries is pending)
+  interface.print(ProgramRunning ? 1 : 0);
+  interface.print(",");
+  interface.print(ProgramStep);
+  interface.print(",");
+  interface.print(ProgramCycle);
+  interface.print(",");
+  interface.print(ProgramLength);
+  interface.print(",");
+  interface.println(ProgramRepeat);
+}
+
+void ClearProgram(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // PROGram:CLEar
+  // Abort the pulse program and remove all entries
+  ProgramRunning = false;
+  ProgramLength = 0;
+  ProgramStep = 0;
+  ProgramCycle = 0;
+}
+
+void AddProgramEntry(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // PROGram:ADD delay,values,mask
+  // Append an entry to the pulse program: delay in ms after the previous
+  // entry (decimal), states and channels to set as for MASKDOut (hexadecimal).
+  // If no mask is given, all channels are set. Ignored while the program runs,
+  // if the program is full, or if the delay exceeds ProgramMaxDelay.
+  // Example:
+  //  PROG:ADD 100,1,3  (100 ms later: DOut[0] HIGH, DOut[1] LOW)
+  if (ProgramRunning || ProgramLength >= ProgramMaxLength || parameters.Size() < 2) {
+    return;
+  }
+  unsigned long stepDelay = strtoul(parameters[0], NULL, 10);
+  if (stepDelay > ProgramMaxDelay) {
+    return;
+  }
+  ProgramEntry& entry = Program[ProgramLength++];
+  entry.delay = stepDelay;
+  entry.values = strtoul(parameters[1], NULL, 16);
+  entry.mask = AllChannelsMask();
+  if (parameters.Size() > 2) {
+    entry.mask = strtoul(parameters[2], NULL, 16);
+  }
+}
+
+void SetProgramRepeat(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // PROGram:REPeat runs
+  // Set how often the pulse program runs, 0 runs it until it is aborted
+  if (parameters.Size() < 1) {
+    return;
+  }
+
+  if (not ProgramRunning) {
+    ProgramRepeat = strtoul(parameters.First(), NULL, 10);
+  }
+}
+
+void RunProgram(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // PROGram:RUN
+  // Start the pulse program from its first entry
+  StartProgram();
+}
+
+void AbortProgram(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // PROGram:ABORt
+  // Stop the pulse program, the channels keep their current states
+  ProgramRunning = false;
+}
+
+void GetInterlockState(SCPI_C commands, SCPI_P parameters, Stream& interface) {
+  // Get the state of the SoftwareLockoutToggle. return 0 if off, 1 if on.
+  if (IsInterlocked) {
+    interface.println(1);
+  }
+  else {
+    interface.println(0);
+  }
+
+}
+
+void SetChannel(int ch, int state) {
+  // only set a channel if not interlocked
+  if (IsInterlocked == false) {
+    // Set a given channel with the given state
+    if ((state == 0) || (state == 1)) {
+      // states to set
+      int out_state = state;
+      // check if inverted
+      if (DOutInvert[ch] == 1) {
+        out_state = not out_state;
+      }
+
+      // write the states out
+      digitalWrite(DOut[ch], out_state);
+      digitalWrite(LedPins[ch], state);  // LED is always the actual state
+    }
+  }
+}
+
+
+// Turn all channels off, this also aborts the pulse program
+void AllOff() {
+  ProgramRunning = false;
+  ApplyMask(0, AllChannelsMask());
+}
+
+
+// Set all channels in the mask to the corresponding bit of values at once
+// The new port values are calculated first, honoring DOutInvert. Then all
+// port registers are written back-to-back with interrupts disabled, such that
+// all outputs switch within SwitchingSkew(). Nothing is switched while
+// interlocked, even if the interlock triggers during the calculation.
+void ApplyMask(unsigned long values, unsigned long mask) {
+  byte set[MaxPorts];
+  byte clear[MaxPorts];
+  byte next[MaxPorts];
+  for (int it = 0; it < NumOfPorts; it++) {
+    set[it] = 0;
+    clear[it] = 0;
+  }
+
+  for (int it = 0; it < numOfChannels; it++) {
+    if (not bitRead(mask, it)) {
+      continue;
+    }
+    byte state = bitRead(values, it);
+    if (state ^ DOutInvert[it]) {
+      set[DOutPort[it]] |= DOutBit[it];
+    }
+    else {
+      clear[DOutPort[it]] |= DOutBit[it];
+    }
+    // LED is always the actual state
+    if (state) {
+      set[LedPort[it]] |= LedBit[it];
+    }
+    else {
+      clear[LedPort[it]] |= LedBit[it];
+    }
+  }
+
+  uint8_t oldSREG = SREG;
+  noInterrupts();
+  if (IsInterlocked) {
+    SREG = oldSREG;
+    return;
+  }
+  for (int it = 0; it < NumOfPorts; it++) {
+    next[it] = (*PortRegisters[it] & ~clear[it]) | set[it];
+  }
+  for (int it = 0; it < NumOfPorts; it++) {
+    *PortRegisters[it] = next[it];
+  }
+  SREG = oldSREG;
+}
+
+
+// Look up the port registers and bits of all outputs and LEDs
+void SetupPorts() {
+  for (int it = 0; it < numOfChannels; it++) {
+    DOutPort[it] = PortIndex(DOut[it]);
+    DOutBit[it] = digitalPinToBitMask(DOut[it]);
+  }
+  NumOfDOutPorts = NumOfPorts;
+  for (int it = 0; it < numOfChannels; it++) {
+    LedPort[it] = PortIndex(LedPins[it]);
+    LedBit[it] = digitalPinToBitMask(LedPins[it]);
+  }
+}
+
+
+// Index of the output register of a pin in PortRegisters, added if new
+int PortIndex(int pin) {
+  volatile uint8_t* reg = portOutputRegister(digitalPinToPort(pin));
+  for (int it = 0; it < NumOfPorts; it++) {
+    if (PortRegisters[it] == reg) {
+      return it;
+    }
+  }
+  PortRegisters[NumOfPorts] = reg;
+  return NumOfPorts++;
+}
+
+
+// Maximum time in ns between the first and the last output that ApplyMask()
+// switches: one register write per output port after the first
+unsigned long SwitchingSkew() {
+  if (NumOfDOutPorts < 2) {
+    return 0;
+  }
+  return (NumOfDOutPorts - 1) * SwitchCycles * 1000UL / (F_CPU / 1000000UL);
+}
+
+
+// Get the status of all channels as a bitmask, bit n is channel n
+unsigned long GetAllChannels() {
+  unsigned long states = 0;
+  for (int it = 0; it < numOfChannels; it++) {
+    if (GetChannel(it)) {
+      states |= 1UL << it;
+    }
+  }
+  return states;
+}
+
+
+// Mask with one bit set for every available channel
+unsigned long AllChannelsMask() {
+  if (numOfChannels >= 32) {
+    return 0xFFFFFFFFUL;
+  }
+  return (1UL << numOfChannels) - 1;
+}
+
+
+// Read binary frames and execute them
+// A frame consists of the sync byte 0xA5, a one byte opcode, a fixed-size
+// payload that depends on the opcode (multi-byte values are little endian), and
+// a CRC-8 checksum over opcode and payload. Frames with an unknown opcode or a
+// wrong checksum are dropped, as are incomplete frames after FrameTimeout.
+// Any other byte than the sync byte at the start of a frame, e.g., a text
+// command, ends the binary mode.
+void ProcessBinary() {
+  while (Serial.available()) {
+    byte data = Serial.read();
+    if (BinaryFrameLength == 0) {
+      if (data != FrameSync) {
+        BinaryMode = false;
+        return;
+      }
+      BinaryFrameClock = millis();
+    }
+    BinaryFrame[BinaryFrameLength++] = data;
+
+    if (BinaryFrameLength == 2 && FramePayloadSize(BinaryFrame[1]) < 0) {
+      BinaryFrameLength = 0;  // unknown opcode
+    }
+    else if (BinaryFrameLength > 2 && BinaryFrameLength == FramePayloadSize(BinaryFrame[1]) + 3) {
+      ExecuteFrame();
+      BinaryFrameLength = 0;
+      if (not BinaryMode) {
+        return;
+      }
+    }
+  }
+
+  if (BinaryFrameLength > 0 && millis() - BinaryFrameClock > FrameTimeout) {
+    BinaryFrameLength = 0;
+  }
+}
+
+
+// Execute a complete binary frame
+void ExecuteFrame() {
+  byte opcode = BinaryFrame[1];
+  byte* payload = &BinaryFrame[2];
+  int size = FramePayloadSize(opcode);
+  if (FrameChecksum(&BinaryFrame[1], size + 1) != BinaryFrame[size + 2]) {
+    return;
+  }
+
+  byte reply[7];
+  unsigned long states;
+  switch (opcode) {
+    case OpIdentify: {
+      int hw[3] = {0, 0, 0};
+      int fw[3] = {0, 0, 0};
+      sscanf(hw_version, "v%d.%d.%d", &hw[0], &hw[1], &hw[2]);
+      sscanf(fw_version, "v%d.%d.%d", &fw[0], &fw[1], &fw[2]);
+      for (int it = 0; it < 3; it++) {
+        reply[it] = hw[it];
+        reply[it + 3] = fw[it];
+      }
+      SendFrame(opcode, reply, 6);
+      break;
+    }
+    case OpGetDigIO:
+      if (payload[0] < numOfChannels) {
+        reply[0] = GetChannel(payload[0]);
+        SendFrame(opcode, reply, 1);
+      }
+      break;
+    case OpSetDigIO:
+      if ((not SoftwareLockoutToggle) && (payload[0] < numOfChannels)) {
+        SetChannel(payload[0], payload[1]);
+      }
+      break;
+    case OpGetAllDigIO:
+    case OpGetMaskDigIO:
+    case OpStatus:
+      states = GetAllChannels();
+      for (int it = 0; it < 4; it++) {
+        reply[it] = (states >> (8 * it)) & 0xFF;
+      }
+      if (opcode == OpGetAllDigIO) {
+        reply[4] = numOfChannels;
+        SendFrame(opcode, reply, 5);
+      }
+      else if (opcode == OpStatus) {
+        reply[4] = IsInterlocked ? 1 : 0;
+        reply[5] = SoftwareLockoutToggle ? 1 : 0;
+        SendFrame(opcode, reply, 6);
+      }
+      else {
+        SendFrame(opcode, reply, 4);
+      }
+      break;
+    case OpSetMaskDigIO: {
+      if (not SoftwareLockoutToggle) {
+        unsigned long values = 0;
+        unsigned long mask = 0;
+        for (int it = 0; it < 4; it++) {
+          values |= (unsigned long)payload[it] << (8 * it);
+          mask |= (unsigned long)payload[it + 4] << (8 * it);
+        }
+        ApplyMask(values, mask);
+      }
+      break;
+    }
+    case OpAllOff:
+      AllOff();
+      break;
+    case OpInterlockState:
+      reply[0] = IsInterlocked ? 1 : 0;
+      SendFrame(opcode, reply, 1);
+      break;
+    case OpSWLockout:
+      reply[0] = SoftwareLockoutToggle ? 1 : 0;
+      SendFrame(opcode, reply, 1);
+      break;
+    case OpEvents:
+      if (payload[0] == 1) {
+        PendingEvent = 0;
+      }
+      EventsEnabled = payload[0] == 1;
+      break;
+    case OpProgramClear:
+      ProgramRunning = false;
+      ProgramLength = 0;
+      ProgramStep = 0;
+      ProgramCycle = 0;
+      break;
+    case OpProgramAdd:
+      if ((not ProgramRunning) && ProgramLength < ProgramMaxLength) {
+        unsigned long stepDelay = 0;
+        unsigned long values = 0;
+        unsigned long mask = 0;
+        for (int it = 0; it < 4; it++) {
+          stepDelay |= (unsigned long)payload[it] << (8 * it);
+          values |= (unsigned long)payload[it + 4] << (8 * it);
+          mask |= (unsigned long)payload[it + 8] << (8 * it);
+        }
+        if (stepDelay <= ProgramMaxDelay) {
+          ProgramEntry& entry = Program[ProgramLength++];
+          entry.delay = stepDelay;
+          entry.values = values;
+          entry.mask = mask;
+        }
+      }
+      break;
+    case OpProgramRepeat:
+      if (not ProgramRunning) {
+        ProgramRepeat = payload[0] | (payload[1] << 8);
+      }
+      break;
+    case OpProgramRun:
+      StartProgram();
+      break;
+    case OpProgramAbort:
+      ProgramRunning = false;
+      break;
+    case OpProgramState:
+      reply[0] = ProgramRunning ? 1 : 0;
+      reply[1] = ProgramStep;
+      reply[2] = ProgramCycle & 0xFF;
+      reply[3] = ProgramCycle >> 8;
+      reply[4] = ProgramLength;
+      reply[5] = ProgramRepeat & 0xFF;
+      reply[6] = ProgramRepeat >> 8;
+      SendFrame(opcode, reply, 7);
+      break;
+    case OpSwitchingSkew: {
+      unsigned long skew = SwitchingSkew();
+      for (int it = 0; it < 4; it++) {
+        reply[it] = (skew >> (8 * it)) & 0xFF;
+      }
+      SendFrame(opcode, reply, 4);
+      break;
+    }
+    case OpExit:
+      SendFrame(opcode, reply, 0);
+      BinaryMode = false;
+      break;
+  }
+}
+
+
+// Size of the payload of a request frame, -1 for unknown opcodes
+int FramePayloadSize(byte opcode) {
+  switch (opcode) {
+    case OpIdentify:
+    case OpGetAllDigIO:
+    case OpGetMaskDigIO:
+    case OpAllOff:
+    case OpInterlockState:
+    case OpSWLockout:
+    case OpStatus:
+    case OpProgramClear:
+    case OpProgramRun:
+    case OpProgramAbort:
+    case OpProgramState:
+    case OpSwitchingSkew:
+    case OpExit:
+      return 0;
+    case OpGetDigIO:
+    case OpEvents:
+      return 1;
+    case OpSetDigIO:
+    case OpProgramRepeat:
+      return 2;
+    case OpSetMaskDigIO:
+      return 8;
+    case OpProgramAdd:
+      return 12;
+  }
+  return -1;
+}
+
+
+// CRC-8 (polynomial 0x07) of the given bytes
+byte FrameChecksum(byte* data, int length) {
+  byte crc = 0;
+  for (int it = 0; it < length; it++) {
+    crc ^= data[it];
+    for (int bit = 0; bit < 8; bit++) {
+      if (crc & 0x80) {
+        crc = (crc << 1) ^ 0x07;
+      }
+      else {
+        crc <<= 1;
+      }
+    }
+  }
+  return crc;
+}
+
+
+// Send a binary frame with the given opcode and payload
+void SendFrame(byte opcode, byte* payload, int length) {
+  byte frame[FrameMaxLength];
+  frame[0] = FrameSync;
+  frame[1] = opcode;
+  for (int it = 0; it < length; it++) {
+    frame[it + 2] = payload[it];
+  }
+  frame[length + 2] = FrameChecksum(&frame[1], length + 1);
+  Serial.write(frame, length + 3);
+}
+
+
+// Report a state change that the host did not cause
+// Events start with "!", followed by the source of the change (RF, INTERLOCK,
+// LOCKOUT, or PROGRAM when the pulse program finished) and the current status as for STATus?, e.g., "!RF 5,0,0".
+// In binary mode, events are frames with opcode OpEvent.
+void SendEvent() {
+  byte source = PendingEvent;
+  PendingEvent = 0;
+
+  if (BinaryMode) {
+    unsigned long states = GetAllChannels();
+    byte payload[7];
+    for (int it = 0; it < 4; it++) {
+      payload[it] = (states >> (8 * it)) & 0xFF;
+    }
+    payload[4] = IsInterlocked ? 1 : 0;
+    payload[5] = SoftwareLockoutToggle ? 1 : 0;
+    payload[6] = source;
+    SendFrame(OpEvent, payload, 7);
+    return;
+  }
+
+  if (source == EventRF) {
+    Serial.print(F("!RF "));
+  }
+  else if (source == EventInterlock) {
+    Serial.print(F("!INTERLOCK "));
+  }
+  else if (source == EventProgram) {
+    Serial.print(F("!PROGRAM "));
+  }
+  else {
+    Serial.print(F("!LOCKOUT "));
+  }
+  Serial.print(GetAllChannels(), HEX);
+  Serial.print(",");
+  Serial.print(IsInterlocked ? 1 : 0);
+  Serial.print(",");
+  Serial.println(SoftwareLockoutToggle ? 1 : 0);
+}
+
+
+// Switch the serial connection to a new baud rate
+void ChangeBaudRate(unsigned long rate) {
+  Serial.flush();  // send all pending answers at the old rate
+  Serial.end();
+  Serial.begin(rate);
+  BaudRate = rate;
+}
+
+
+// Revert to the default baud rate if a new rate was not confirmed in time
+void CheckBaudRate() {
+  if (BaudRatePending && (millis() - BaudRateClock > BaudRateRevertTime)) {
+    ChangeBaudRate(DefaultBaudRate);
+    BaudRatePending = false;
+  }
+}
+
+
+// Function to toggle via the RF remote. Triggers Channel and LED
+void ToggleRFChannel(int ch) {
+  // Toggle a channel
+  SetChannel(ch, not GetChannel(ch));
+}
+
+
+// Start the pulse program from its first entry, unless it is empty or the
+// channels cannot be switched by software
+void StartProgram() {
+  if (ProgramLength == 0 || IsInterlocked || SoftwareLockoutToggle) {
+    return;
+  }
+  ProgramStep = 0;
+  ProgramCycle = 0;
+  ProgramDue = micros() + Program[0].delay * 1000;
+  ProgramRunning = true;
+}
+
+
+// Execute the next entry of the pulse program if it is due
+// Entries are scheduled relative to the due time of the previous entry, not to
+// the time it was executed, such that delays in loop() do not accumulate.
+// The interlock and the software lockout abort the program.
+void StepProgram() {
+  if (IsInterlocked || SoftwareLockoutToggle) {
+    ProgramRunning = false;
+    return;
+  }
+  if ((long)(micros() - ProgramDue) < 0) {
+    return;
+  }
+
+  ApplyMask(Program[ProgramStep].values, Program[ProgramStep].mask);
+  ProgramStep++;
+  if (ProgramStep >= ProgramLength) {
+    ProgramStep = 0;
+    ProgramCycle++;
+    if (ProgramRepeat != 0 && ProgramCycle >= ProgramRepeat) {
+      ProgramRunning = false;
+      PendingEvent = EventProgram;
+      return;
+    }
+  }
+  ProgramDue += Program[ProgramStep].delay * 1000;
+}